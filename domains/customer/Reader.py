@@ -1,7 +1,156 @@
+import glob
+import hashlib
+import os
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 
-def read_data( file_path):
-    return pd.read_csv(file_path, low_memory=False)
 
-    
\ No newline at end of file
+def _arrow_type(dtype):
+    return pa.string() if isinstance(dtype, pd.StringDtype) else pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def read_with_schema(file_path, schema):
+    """
+    Reads a source CSV with the pyarrow parser, keeping only the schema's columns
+    (unless schema.all_columns) and giving them the declared types, so IDs and
+    codes are read as strings and keep their leading zeros.
+
+    Args:
+        file_path (str): The CSV file.
+        schema (SourceSchema): The source's schema, from source_schemas.
+
+    Returns:
+        pd.DataFrame: The parsed file, with Arrow-backed string columns.
+    """
+    read_options, convert_options = _arrow_csv_options(file_path, schema)
+    table = pa_csv.read_csv(file_path, read_options=read_options, convert_options=convert_options)
+    return _to_pandas(table, schema)
+
+
+def _arrow_csv_options(file_path, schema):
+    # pandas renames repeated headers (STATE, STATE.1, ...), the Arrow parser does not
+    header = pd.read_csv(file_path, nrows=0, encoding=schema.encoding).columns.tolist()
+    missing = [col for col in schema.columns if col not in header]
+    if missing:
+        raise ValueError(f"{schema.name} file {file_path} is missing columns {missing}.")
+
+    read_options = pa_csv.ReadOptions(column_names=header, skip_rows=1, encoding=schema.encoding)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=[] if schema.all_columns else list(schema.columns),
+        column_types={col: _arrow_type(dtype) for col, dtype in schema.columns.items()},
+        null_values=pa_csv.ConvertOptions().null_values + list(schema.na_values),
+        strings_can_be_null=True,
+    )
+    return read_options, convert_options
+
+
+def _to_pandas(table, schema):
+    string_dtype = pd.StringDtype('pyarrow', na_value=float('nan'))
+    df = table.to_pandas(types_mapper={pa.string(): string_dtype, pa.large_string(): string_dtype}.get)
+
+    for col, width in schema.id_widths.items():
+        # only numeric codes lose their leading zeros; IDs like A9106234 stay as they are
+        numeric = df[col].str.fullmatch(r'\d+').fillna(False).astype(bool)
+        df[col] = df[col].mask(numeric, df[col].str.zfill(width))
+    return df
+
+
+def read_in_chunks(file_path, schema, chunk_rows):
+    """
+    Reads a source CSV like read_with_schema, but as a stream of frames of
+    chunk_rows rows, so only one chunk is held in memory at a time. Not cached.
+
+    Columns the schema does not declare are typed from the first block of the
+    file, so schemas with all_columns should declare every column whose values
+    could change type further down.
+
+    Args:
+        file_path (str): The CSV file.
+        schema (SourceSchema): The source's schema, from source_schemas.
+        chunk_rows (int): Rows per chunk; the last chunk may be shorter.
+
+    Yields:
+        pd.DataFrame: The next chunk, indexed from 0.
+    """
+    read_options, convert_options = _arrow_csv_options(file_path, schema)
+    reader = pa_csv.open_csv(file_path, read_options=read_options, convert_options=convert_options)
+    batches, buffered = [], 0
+    for batch in reader:
+        batches.append(batch)
+        buffered += batch.num_rows
+        while buffered >= chunk_rows:
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+            yield _to_pandas(table.slice(0, chunk_rows), schema)
+            batches, buffered = table.slice(chunk_rows).to_batches(), buffered - chunk_rows
+    if buffered:
+        yield _to_pandas(pa.Table.from_batches(batches, schema=reader.schema), schema)
+
+
+CACHE_FORMAT_VERSION = 2
+
+
+def _cache_paths(file_path, schema, cache_dir):
+    # one artifact per (file, schema); the name also carries the CSV's mtime and size
+    source = os.path.abspath(file_path)
+    stat = os.stat(source)
+    schema_key = hashlib.sha256(repr((source, schema, CACHE_FORMAT_VERSION)).encode('utf-8')).hexdigest()[:16]
+    prefix = os.path.join(cache_dir, f"{os.path.basename(source)}.{schema_key}")
+    return prefix, f"{prefix}.{stat.st_mtime_ns}_{stat.st_size}.parquet"
+
+
+def _write_cache(df, prefix, cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except (OSError, ValueError, TypeError, pa.ArrowException) as e:
+        # e.g. object columns mixing numbers and text, which Parquet cannot hold
+        print(f"Warning: Could not cache {cache_path}: {e}")
+        return
+    for stale_path in glob.glob(glob.escape(prefix) + '.*.parquet'):
+        if stale_path != cache_path:
+            os.remove(stale_path)
+
+
+def read_data( file_path, schema=None, use_cache=True, memory_map=False, cache_dir=None):
+    """
+    Reads a CSV file; with a schema, only its columns and with its types.
+
+    The parsed frame is kept as a Parquet copy, keyed by the file's path, mtime
+    and size and by the schema, and later reads of the unchanged file are served
+    from it. If the file has changed, or the copy cannot be read, the CSV is parsed
+    again and the copy replaced.
+
+    Args:
+        file_path (str): The CSV file.
+        schema (SourceSchema): Optional schema from source_schemas.
+        use_cache (bool): Read and write the Parquet copy.
+        memory_map (bool): Memory-map the Parquet copy when reading it.
+        cache_dir (str): Where to keep Parquet copies. Defaults to a '.cache'
+                         directory next to the file.
+
+    Returns:
+        pd.DataFrame: The parsed file.
+    """
+    if use_cache:
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), '.cache')
+        prefix, cache_path = _cache_paths(file_path, schema, cache_dir)
+        if os.path.exists(cache_path):
+            try:
+                return pd.read_parquet(cache_path, memory_map=memory_map)
+            except (OSError, ValueError, pa.ArrowException) as e:
+                print(f"Warning: Could not read cached {cache_path}, parsing the CSV: {e}")
+
+    if schema is None:
+        df = pd.read_csv(file_path, low_memory=False)
+    else:
+        df = read_with_schema(file_path, schema)
+
+    if use_cache:
+        _write_cache(df, prefix, cache_path)
+    return df
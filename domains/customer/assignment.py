@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+from domains.customer.entity_clustering import cluster_rows
+
+# blocks whose dense score matrix has at most this many cells are solved exactly
+MAX_BLOCK_CELLS = 250_000
+
+
+def _best_per_group(groups, scores):
+    # position of the best scoring edge of every group; ties go to the first edge
+    order = np.lexsort((-scores, groups))
+    sorted_groups = groups[order]
+    first_of_group = np.ones(len(order), dtype=bool)
+    first_of_group[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    return order[first_of_group]
+
+
+def _solve_exactly(left, right, scores):
+    # positions of the edges of one block's optimal assignment
+    left_ids, left_codes = np.unique(left, return_inverse=True)
+    right_ids, right_codes = np.unique(right, return_inverse=True)
+    # every real edge outweighs any score gain, so the most pairs are assigned first,
+    # then the best total score; missing edges stay at 0 and are dropped below
+    offset = (scores.max() - scores.min()) * min(len(left_ids), len(right_ids)) + 1.0
+    values = np.zeros((len(left_ids), len(right_ids)))
+    edge_at = np.full(values.shape, -1, dtype=np.int64)
+    values[left_codes, right_codes] = scores - scores.min() + offset
+    edge_at[left_codes, right_codes] = np.arange(len(scores))
+    rows, cols = linear_sum_assignment(values, maximize=True)
+    edges = edge_at[rows, cols]
+    return edges[edges >= 0]
+
+
+def _solve_greedily(left, right, scores):
+    # best edge first, taken while both ends are free: a maximal matching with at
+    # least half the optimal total score
+    _, left_codes = np.unique(left, return_inverse=True)
+    _, right_codes = np.unique(right, return_inverse=True)
+    left_taken = np.zeros(left_codes.max() + 1, dtype=bool)
+    right_taken = np.zeros(right_codes.max() + 1, dtype=bool)
+    chosen = []
+    for edge in np.argsort(-scores, kind='stable'):
+        if not left_taken[left_codes[edge]] and not right_taken[right_codes[edge]]:
+            left_taken[left_codes[edge]] = right_taken[right_codes[edge]] = True
+            chosen.append(edge)
+    return np.asarray(chosen, dtype=np.int64)
+
+
+def assign_one_to_one(left_ids, right_ids, scores, max_block_cells=MAX_BLOCK_CELLS):
+    """
+    Picks a one-to-one assignment between left and right entities (e.g. Focus and
+    NCES schools) from scored candidate edges.
+
+    The edges are split into connected blocks (see entity_clustering) and every
+    block is solved on its own, so no matrix over all entities is ever built.
+    Blocks with a single left or right entity take their best edge, in one
+    vectorized pass. Other blocks of up to max_block_cells cells are solved with
+    scipy's linear_sum_assignment, assigning as many pairs as possible and then
+    maximizing the total score; bigger blocks fall back to a greedy pass, best
+    edge first, which still leaves no assignable pair unassigned and keeps at
+    least half the optimal score.
+
+    Edges with a missing score count as scoring the lowest. Repeated (left, right)
+    edges are allowed; only the best scoring copy can be chosen.
+
+    Args:
+        left_ids (array-like): The left entity of every edge.
+        right_ids (array-like): The right entity of every edge.
+        scores (array-like): The score of every edge; higher is better.
+        max_block_cells (int): Largest block (left x right entities) solved exactly.
+
+    Returns:
+        np.ndarray: True for the edges in the assignment.
+    """
+    left_codes, _ = pd.factorize(np.asarray(left_ids, dtype=object))
+    right_codes, right_uniques = pd.factorize(np.asarray(right_ids, dtype=object))
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores):
+        scores = np.where(np.isnan(scores), np.nanmin(scores, initial=0.0) - 1.0, scores)
+    chosen = np.zeros(len(scores), dtype=bool)
+
+    # the best copy of every (left, right) edge stands for the pair
+    paired = np.flatnonzero((left_codes >= 0) & (right_codes >= 0))
+    pair_codes = left_codes[paired].astype(np.int64) * len(right_uniques) + right_codes[paired]
+    usable = paired[_best_per_group(pair_codes, scores[paired])]
+    left_codes, right_codes, scores = left_codes[usable], right_codes[usable], scores[usable]
+    edges = pd.DataFrame({'left': left_codes, 'right': right_codes})
+
+    blocks = cluster_rows(edges, ['left', 'right'])
+    n_left = edges['left'].groupby(blocks).transform('nunique').to_numpy()
+    n_right = edges['right'].groupby(blocks).transform('nunique').to_numpy()
+
+    simple = (n_left == 1) | (n_right == 1)
+    simple_edges = np.flatnonzero(simple)
+    chosen[usable[simple_edges[_best_per_group(blocks[simple], scores[simple])]]] = True
+
+    contested = np.flatnonzero(~simple)
+    contested = contested[np.argsort(blocks[contested], kind='stable')]
+    block_starts = np.flatnonzero(np.r_[True, np.diff(blocks[contested]) != 0]) if len(contested) else []
+    for start, stop in zip(block_starts, list(block_starts[1:]) + [len(contested)]):
+        block = contested[start:stop]
+        if n_left[block[0]] * n_right[block[0]] <= max_block_cells:
+            picked = _solve_exactly(left_codes[block], right_codes[block], scores[block])
+        else:
+            picked = _solve_greedily(left_codes[block], right_codes[block], scores[block])
+        chosen[usable[block[picked]]] = True
+    return chosen
@@ -0,0 +1,251 @@
+import sys
+sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
+
+import argparse
+import functools
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+from domains.customer.generate_delta import content_delta_outputs
+from domains.customer.id_allocator import load_existing_ids
+from domains.customer.instrumentation import count_rows, finish_run_report, new_run_report, stage
+from domains.customer.prettify_schools import school_prettifier
+from domains.customer.quarantine_ledger import quarantined_rows
+from domains.customer.Reader import read_data
+from domains.customer.school_mastering import QUARANTINE_REASONS, best_matches, flag_pairs, load_focus_data, \
+    load_nces_data, normalize_pair_names, pair_focus_with_nces, quarantine_canadian_schools, \
+    quarantine_duplicate_matches, score_pairs, standardize_pair_names, with_focus_rows, with_nces_rows
+from domains.customer.source_schemas import SCHOOL_EXPORT_SCHEMA
+from domains.customer.synthetic_data import generate_sources
+
+# Times and memory-profiles the school mastering stages on synthetic sources
+# (see synthetic_data), and compares the results with a baseline JSON file.
+
+STAGES = ['read', 'geo_join', 'normalize', 'standardize', 'score', 'quarantine', 'prettify', 'delta']
+# a stage regresses when it takes this much longer (or more memory) than in the baseline
+TOLERANCE = 0.25
+# smaller differences are noise at any tolerance
+MIN_SECONDS = 0.05
+MIN_MB = 1.0
+
+
+def ensure_sources(directory, rows, seed):
+    """
+    Returns the synthetic sources in directory, generating them first unless
+    they are already there for these rows and seed.
+    """
+    manifest_path = os.path.join(directory, 'synthetic_manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['rows'] == rows and manifest['seed'] == seed:
+            return manifest
+    generate_sources(rows, directory, seed=seed)
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _read_sources(paths):
+    focus_data = load_focus_data(paths['focus'])
+    nces_data, nces_index = load_nces_data(paths['nces'])
+    export = read_data(paths['school_export'], schema=SCHOOL_EXPORT_SCHEMA)
+    return focus_data, nces_data, nces_index, export
+
+
+def _pair(focus_data, nces_data, nces_index):
+    # what match_focus_to_nces does before scoring
+    focus_data, canada_ledger = quarantine_canadian_schools(focus_data)
+    pairs, joined_gdf = pair_focus_with_nces(focus_data, nces_data, nces_index)
+    return pairs, joined_gdf, focus_data, canada_ledger
+
+
+def _quarantine(focus_data, nces_data, pairs, joined_gdf, scored, canada_ledger):
+    # what master_schools does once the pairs are scored
+    ledger = with_focus_rows(focus_data, nces_data, pairs, joined_gdf, flag_pairs(scored))
+    ledger = pd.concat([canada_ledger, ledger], ignore_index=True)[ledger.columns]
+    quarantine_duplicate_matches(ledger)
+    quarantined = with_nces_rows(quarantined_rows(ledger, QUARANTINE_REASONS), nces_data)
+    schools = with_nces_rows(best_matches(ledger), nces_data).drop(columns=['quarantine_flags']).reset_index(drop=True)
+    return schools, quarantined
+
+
+def _prettify(schools, paths):
+    return school_prettifier(schools, existing_ids=load_existing_ids(paths['school_export']), deterministic_ids=True,
+                             export_file=paths['school_export'], intermediate_file=paths['intermediate'])
+
+
+def measure_stage(report, name, func, *args, trace_memory=False, profile_dir=None, **kwargs):
+    """
+    Runs one stage as a stage of report (see instrumentation.stage) and, with
+    trace_memory, also records the peak of the memory Python and numpy
+    allocated during it, as peak_mb.
+
+    Args:
+        report (dict): The run report the stage's record goes to.
+        name (str): The stage name.
+        func (callable): The stage.
+        trace_memory (bool): Trace allocations; this slows the stage down.
+        profile_dir (str): Profile the stage into this directory, or None.
+
+    Returns:
+        The stage's result.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    with stage(report, name, rows_in=count_rows(args[0]), profile_dir=profile_dir) as record:
+        result = func(*args, **kwargs)
+        record['rows_out'] = count_rows(result)
+    if trace_memory:
+        record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+    memory = f"{record['peak_mb']:10.1f} MB" if trace_memory else f"{record['peak_rss_mb']:10.0f} MB RSS"
+    print(f"  {name:<12} {record['wall_seconds']:8.2f}s {record['rows_out']:>10} rows {memory}")
+    return result
+
+
+def run_stages(paths, trace_memory=False, profile_dir=None):
+    """
+    Runs every stage of STAGES once, each on the output of the one before, from
+    a cold read (the Parquet and spatial index caches are cleared first).
+
+    Returns:
+        list: The stages' records (see measure_stage).
+    """
+    shutil.rmtree(os.path.join(os.path.dirname(os.path.abspath(paths['focus'])), '.cache'), ignore_errors=True)
+    report = new_run_report('benchmark stages')
+    measure = functools.partial(measure_stage, report, trace_memory=trace_memory, profile_dir=profile_dir)
+    focus_data, nces_data, nces_index, export = measure('read', _read_sources, paths)
+    pairs, joined_gdf, focus_data, canada_ledger = measure('geo_join', _pair, focus_data, nces_data, nces_index)
+    normalized = measure('normalize', normalize_pair_names, joined_gdf)
+    standardized = measure('standardize', standardize_pair_names, normalized)
+    scored = measure('score', score_pairs, standardized)
+    schools, _ = measure('quarantine', _quarantine, focus_data, nces_data, pairs, joined_gdf, scored, canada_ledger)
+    pretty = measure('prettify', _prettify, schools, paths)
+    with tempfile.TemporaryDirectory() as directory:
+        measure('delta', content_delta_outputs, pretty, export, directory, 'benchmark')
+    return report['stages']
+
+
+def run_benchmark(rows, data_dir, seed=0, repeat=1, trace_memory=True, profile_dir=None):
+    """
+    Benchmarks the stages on synthetic sources of rows NCES schools.
+
+    Args:
+        rows (int): NCES schools to generate.
+        data_dir (str): Where the synthetic sources are (or are generated).
+        seed (int): Generator seed.
+        repeat (int): Timed runs; every stage keeps its fastest.
+        trace_memory (bool): Also run once with allocation tracing, for the
+                             stages' peak memory.
+        profile_dir (str): Also run once with cProfile, for one '<stage>.prof'
+                           file per stage in this directory.
+
+    Returns:
+        dict: A run report (see instrumentation) with the source row counts,
+              and per stage the metrics of its fastest run, plus peak_mb.
+    """
+    manifest = ensure_sources(data_dir, rows, seed)
+    paths = {name: os.path.join(data_dir, file_name) for name, file_name in manifest['files'].items()}
+    results = new_run_report('benchmark', rows=rows, seed=seed, repeat=repeat)
+    results['sources'] = manifest['counts']
+
+    fastest = {}
+    for run in range(repeat):
+        print(f"Timed run {run + 1} of {repeat}:")
+        for record in run_stages(paths):
+            if record['stage'] not in fastest or record['wall_seconds'] < fastest[record['stage']]['wall_seconds']:
+                fastest[record['stage']] = record
+    if trace_memory:
+        print("Memory run:")
+        for record in run_stages(paths, trace_memory=True):
+            fastest[record['stage']]['peak_mb'] = record['peak_mb']
+    if profile_dir:
+        print("Profiled run:")
+        for record in run_stages(paths, profile_dir=profile_dir):
+            fastest[record['stage']]['profile'] = record['profile']
+    results['stages'] = list(fastest.values())
+    return finish_run_report(results)
+
+
+def find_regressions(results, baseline, tolerance=TOLERANCE):
+    """
+    Compares benchmark results with a baseline of the same rows and seed, on
+    every stage's wall seconds and peak_mb.
+
+    Args:
+        results (dict): From run_benchmark.
+        baseline (dict): Earlier results.
+        tolerance (float): How much slower (or bigger) than the baseline, as a
+                           fraction, a stage can get before it regresses.
+
+    Returns:
+        list: One message per regressed stage and measurement.
+
+    Raises:
+        ValueError: If the baseline was taken on other sources.
+    """
+    settings, base_settings = results['settings'], baseline['settings']
+    if (base_settings['rows'], base_settings['seed']) != (settings['rows'], settings['seed']):
+        raise ValueError(f"The baseline is for {base_settings['rows']} rows with seed {base_settings['seed']}, "
+                         f"not {settings['rows']} rows with seed {settings['seed']}.")
+    base_records = {record['stage']: record for record in baseline['stages']}
+    regressions = []
+    for record in results['stages']:
+        name, base = record['stage'], base_records.get(record['stage'])
+        if base is None:
+            continue
+        for measurement, noise in (('wall_seconds', MIN_SECONDS), ('peak_mb', MIN_MB)):
+            if measurement not in record or measurement not in base:
+                continue
+            now, before = record[measurement], base[measurement]
+            if now > before * (1 + tolerance) and now - before > noise:
+                regressions.append(f"{name}: {measurement} {before} -> {now} (+{(now / before - 1) * 100:.0f}%)"
+                                   if before else f"{name}: {measurement} {before} -> {now}")
+        if record['rows_out'] != base['rows_out']:
+            print(f"Warning: {name} gave {record['rows_out']} rows, {base['rows_out']} in the baseline")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the school mastering stages on synthetic sources.")
+    parser.add_argument('--rows', type=int, default=10_000, help="NCES schools to generate (10k to 5M).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=None,
+                        help="Where to keep the synthetic sources (default: benchmark_data/<rows>).")
+    parser.add_argument('--repeat', type=int, default=1, help="Timed runs; every stage keeps its fastest.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the allocation tracing run.")
+    parser.add_argument('--profile-dir', default=None,
+                        help="Profile every stage with cProfile, one .prof file per stage in this directory.")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="Earlier results to compare with.")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="How much slower or bigger a stage can get, as a fraction, before it regresses.")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Write the results over --baseline instead of comparing with it.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.rows, args.data_dir or os.path.join('benchmark_data', str(args.rows)),
+                            seed=args.seed, repeat=args.repeat, trace_memory=not args.no_memory,
+                            profile_dir=args.profile_dir)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}: {results['total_wall_seconds']:.2f}s over {len(results['stages'])} stages, "
+          f"max RSS {results['max_rss_mb']:.0f} MB")
+
+    if args.baseline and (args.update_baseline or not os.path.exists(args.baseline)):
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote baseline {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
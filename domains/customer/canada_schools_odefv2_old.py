@@ -2,7 +2,7 @@ import pandas as pd
 from unidecode import unidecode
 from domains.customer.Reader import read_data
 from domains.customer.geo_matching import create_geodataframe_from_lat_lon, join_geodataframes_by_lat_lon_columns
-from domains.customer.name_similarity_scoring import add_similarity_score
+from domains.customer.name_similarity_scoring import add_similarity_scores
 from domains.customer.normalize_names import normalize_dataframe_columns
 
 BASE_PATH = '/Users/kirtanshah/Documents/'
@@ -51,10 +51,12 @@ columns_to_process = ['FOCUS_SCHOOL_DISTRICT_NAME_without_accent', 'FOCUS_SCHOOL
 normalized_df = normalize_dataframe_columns(joined_gdf, columns_to_process)
 
 # FOCUS_SCHOOL_DISTRICT_NAME_without_accent_standardized	FOCUS_SCHOOL_NAME_without_accent_standardized	ODEF_Facility_Name_without_accent_standardized	ODEF_Authority_Name_without_accent_standardized
-sim_sn_focus_df = add_similarity_score(normalized_df, 'FOCUS_SCHOOL_NAME_without_accent_standardized', 'ODEF_Facility_Name_without_accent_standardized',
-                                       'focus_odef_school_name_similarity')
-final_focus_df = add_similarity_score(sim_sn_focus_df, 'FOCUS_SCHOOL_DISTRICT_NAME_without_accent_standardized', 'ODEF_Authority_Name_without_accent_standardized',
-                                      'focus_odef_district_name_similarity')
+final_focus_df = add_similarity_scores(normalized_df, [
+    ('FOCUS_SCHOOL_NAME_without_accent_standardized', 'ODEF_Facility_Name_without_accent_standardized',
+     'focus_odef_school_name_similarity'),
+    ('FOCUS_SCHOOL_DISTRICT_NAME_without_accent_standardized', 'ODEF_Authority_Name_without_accent_standardized',
+     'focus_odef_district_name_similarity'),
+])
 
 filtered_df = final_focus_df[final_focus_df['focus_odef_school_name_similarity'] >= 50]
 print(len(filtered_df))
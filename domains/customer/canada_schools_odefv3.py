@@ -1,9 +1,12 @@
 import pandas as pd
 from unidecode import unidecode
 from domains.customer.Reader import read_data
-from domains.customer.geo_matching import create_geodataframe_from_lat_lon, join_geodataframes_by_lat_lon_columns
-from domains.customer.name_similarity_scoring import add_similarity_score
+from domains.customer.distinct_values import apply_to_distinct
+from domains.customer.geo_matching import join_dataframes_by_lat_lon_radius
+from domains.customer.name_similarity_scoring import add_similarity_scores
 from domains.customer.normalize_names import normalize_dataframe_columns
+from domains.customer.source_schemas import FOCUS_SCHEMA, ODEF_SCHEMA
+from domains.customer.spatial_index import load_or_build_spatial_index
 
 import hashlib
 import numpy as np
@@ -24,30 +27,31 @@ def create_authority_hash_12char(row):
 BASE_PATH = '/Users/kirtanshah/Documents/'
 
 focus_data = read_data(BASE_PATH +
-    'DataFiles/FOCUS_SCHOOLS_DISTRICTS.csv')
+    'DataFiles/FOCUS_SCHOOLS_DISTRICTS.csv', schema=FOCUS_SCHEMA)
 focus_data = focus_data.add_prefix('FOCUS_')
 canada_state_abbvs = ['AB', 'BC', 'MB', 'NB', 'NL', 'NT', 'NS', 'NU', 'ON', 'PE', 'QC', 'SK', 'YT', 'QB','PQ']
 canada_records = focus_data.loc[(focus_data['FOCUS_STATE'].isin(canada_state_abbvs))]
 print("Count of canada records in Focus classic: ")
 print(len(canada_records))
-odef_file_data = pd.read_csv(BASE_PATH + "DataFiles/odef_v3.csv", na_values='..', encoding='utf-8')
+ODEF_FILE = BASE_PATH + "DataFiles/odef_v3.csv"
+odef_file_data = read_data(ODEF_FILE, schema=ODEF_SCHEMA)
 odef_file_data = odef_file_data.add_prefix('ODEF_')
 
 # print(odef_file_data.head())
 odef_file_data[['ODEF_Longitude', 'ODEF_Latitude']] = odef_file_data['ODEF_geometry'].str.extract(r'POINT \(([-0-9.]+) ([-0-9.]+)\)').astype(float)
 
-
-focus_geodf = create_geodataframe_from_lat_lon(canada_records, lat_col='FOCUS_ADDRESS_LATITUDE',
-                                               lon_col='FOCUS_ADDRESS_LONGITUDE')
-odef_geodf = create_geodataframe_from_lat_lon(odef_file_data, lat_col='ODEF_Latitude', lon_col='ODEF_Longitude')
+odef_index = load_or_build_spatial_index(
+    ODEF_FILE, lat_col='Latitude', lon_col='Longitude',
+    read_coordinates=lambda path: (odef_file_data['ODEF_Latitude'], odef_file_data['ODEF_Longitude']))
 
 DISTANCE = 100
 
-joined_gdf = join_geodataframes_by_lat_lon_columns(focus_geodf, odef_geodf,
-                                                   left_lat='FOCUS_ADDRESS_LATITUDE',
-                                                   left_lon='FOCUS_ADDRESS_LONGITUDE',
-                                                   right_lat='ODEF_Latitude',
-                                                   right_lon='ODEF_Longitude', how='inner', distance=DISTANCE)
+joined_gdf = join_dataframes_by_lat_lon_radius(canada_records, odef_file_data,
+                                               left_lat='FOCUS_ADDRESS_LATITUDE',
+                                               left_lon='FOCUS_ADDRESS_LONGITUDE',
+                                               right_lat='ODEF_Latitude',
+                                               right_lon='ODEF_Longitude', how='inner', distance=DISTANCE,
+                                               right_index=odef_index)
 
 print("Count of records matched based on proximity check")
 print(len(joined_gdf))
@@ -57,7 +61,8 @@ columns_to_unidecode = ['FOCUS_SCHOOL_DISTRICT_NAME', 'FOCUS_SCHOOL_NAME', 'ODEF
 for col in columns_to_unidecode:
     if col in joined_gdf.columns:
         new_col_name = f"{col}_without_accent"
-        joined_gdf[new_col_name] = joined_gdf[col].apply(lambda x: unidecode(x) if pd.notna(x) and isinstance(x, str) else x)
+        joined_gdf[new_col_name] = apply_to_distinct(joined_gdf[col], lambda x: unidecode(x) if pd.notna(x) and isinstance(x, str) else x,
+                                                     cache_name='unidecode')
     else:
         print(f"Warning: Column '{col}' not found in DataFrame.")
 
@@ -68,10 +73,12 @@ columns_to_process = ['FOCUS_SCHOOL_DISTRICT_NAME_without_accent', 'FOCUS_SCHOOL
 normalized_df = normalize_dataframe_columns(joined_gdf, columns_to_process)
 
 # FOCUS_SCHOOL_DISTRICT_NAME_without_accent_standardized	FOCUS_SCHOOL_NAME_without_accent_standardized	ODEF_Facility_Name_without_accent_standardized	ODEF_Authority_Name_without_accent_standardized
-sim_sn_focus_df = add_similarity_score(normalized_df, 'FOCUS_SCHOOL_NAME_without_accent_standardized', 'ODEF_facility_name_without_accent_standardized',
-                                       'focus_odef_school_name_similarity')
-final_focus_df = add_similarity_score(sim_sn_focus_df, 'FOCUS_SCHOOL_DISTRICT_NAME_without_accent_standardized', 'ODEF_authority_name_without_accent_standardized',
-                                      'focus_odef_district_name_similarity')
+final_focus_df = add_similarity_scores(normalized_df, [
+    ('FOCUS_SCHOOL_NAME_without_accent_standardized', 'ODEF_facility_name_without_accent_standardized',
+     'focus_odef_school_name_similarity'),
+    ('FOCUS_SCHOOL_DISTRICT_NAME_without_accent_standardized', 'ODEF_authority_name_without_accent_standardized',
+     'focus_odef_district_name_similarity'),
+])
 
 final_focus_df['authority_hash_12'] = final_focus_df.apply(create_authority_hash_12char, axis=1)
 
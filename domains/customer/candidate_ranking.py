@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+# score column -> weight; similarities are 0-100, zip_code_match 0/1 and distance is scored
+# 1 at 0 m down to 0 at max_distance
+DEFAULT_WEIGHTS = {
+    'focus_nces_school_name_similarity': 0.5,
+    'focus_nces_district_name_similarity': 0.15,
+    'focus_nces_city_name_similarity': 0.1,
+    'focus_nces_state_name_similarity': 0.05,
+    'zip_code_match': 0.1,
+    'actual_distance_m': 0.1,
+}
+
+SIMILARITY_SCALE = 100.0
+
+
+def composite_match_score(df, weights=None, max_distance=100):
+    """
+    Weighted score in [0, 1] of every candidate pair, computed on plain float
+    arrays. Missing inputs (e.g. no NCES district name) score 0.
+
+    Args:
+        df (pd.DataFrame): Candidate pairs with the columns named in weights.
+        weights (dict): Column -> weight; defaults to DEFAULT_WEIGHTS.
+        max_distance (float): Distance (in meters) that scores 0.
+
+    Returns:
+        np.ndarray: The score of every row, NaN where the weights sum to 0.
+    """
+    if weights is None:
+        weights = DEFAULT_WEIGHTS
+
+    score = np.zeros(len(df))
+    for col, weight in weights.items():
+        values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        if col == 'actual_distance_m':
+            values = 1.0 - np.clip(values, 0.0, max_distance) / max_distance
+        elif col != 'zip_code_match':
+            values = values / SIMILARITY_SCALE
+        score += weight * np.nan_to_num(values, nan=0.0)
+
+    total = sum(weights.values())
+    return score / total if total else np.full(len(df), np.nan)
+
+
+def top_candidates(group_ids, scores, k=1):
+    """
+    Positions of the k highest-scoring rows of every group, without sorting the
+    rows themselves: only the compact group-code and score arrays are used.
+
+    For k=1 the best row of each group is found with a groupby-argmax (a
+    scatter-max of the scores, then the first row reaching it); ties go to the
+    earliest row. NaN scores rank last.
+
+    Args:
+        group_ids (array-like): The group (e.g. Focus school ID) of every row.
+        scores (array-like): The score of every row.
+        k (int): How many rows to keep per group.
+
+    Returns:
+        np.ndarray: Row positions, ordered by sorted group id and then rank.
+    """
+    codes, uniques = pd.factorize(np.asarray(group_ids), sort=True)
+    scores = np.asarray(scores, dtype=np.float64)
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    n_groups = len(uniques)
+    valid = codes >= 0
+    positions = np.flatnonzero(valid)
+    codes, scores = codes[valid], scores[valid]
+
+    if k == 1:
+        best_scores = np.full(n_groups, -np.inf)
+        np.maximum.at(best_scores, codes, scores)
+        reaches_best = scores == best_scores[codes]
+        first_best = np.full(n_groups, len(positions))
+        np.minimum.at(first_best, codes[reaches_best], np.flatnonzero(reaches_best))
+        return positions[first_best[first_best < len(positions)]]
+
+    # stable lexsort: by group, then score descending, then row order
+    order = np.lexsort((-scores, codes))
+    group_starts = np.searchsorted(codes[order], np.arange(n_groups))
+    rank = np.arange(len(order)) - group_starts[codes[order]]
+    return positions[order[rank < k]]
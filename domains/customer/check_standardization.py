@@ -0,0 +1,72 @@
+import sys
+sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
+
+import os
+import pandas as pd
+
+from domains.customer.Reader import read_data
+from domains.customer.normalize_names import normalize_dataframe_columns
+from domains.customer.standardize_district_terms import DISTRICT_ABBREVIATION_MAP, DISTRICT_COMMON_TERMS
+from domains.customer.standardize_school_terms import SCHOOL_ABBREVIATION_MAP, SCHOOL_TERMS_TO_REMOVE
+from domains.customer.term_rules import find_rule_mismatches
+
+# Checks that the compiled standardizers give exactly the output of the original
+# regex-per-term passes, over a checked-in sample of historical school and
+# district names (and, optionally, the name columns of a past run's schools output).
+# Usage: python domains/customer/check_standardization.py [outputs/schools/schools_<suffix>.csv]
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standardization_sample.csv')
+
+DISTRICT_COLUMNS = ['FOCUS_SCHOOL_DISTRICT_NAME', 'NCES_NAME']
+SCHOOL_COLUMNS = ['FOCUS_SCHOOL_NAME', 'NCES_SCH_NAME']
+
+
+def _normalized_names(df, columns):
+    columns = [col for col in columns if col in df.columns]
+    normalized_df = normalize_dataframe_columns(df.filter(items=columns, axis=1), columns)
+    return pd.concat([normalized_df[f"{col}_standardized"] for col in columns])
+
+
+def check_standardization(schools_file=None):
+    """
+    Compares the compiled and the sequential standardization rules over the
+    sample names and fails on any mismatch.
+
+    Args:
+        schools_file (str): Optional schools CSV of a past run whose name
+                            columns are checked along with the sample.
+
+    Raises:
+        AssertionError: If the engines disagree on any name.
+    """
+    sample_df = pd.read_csv(SAMPLE_FILE, dtype=str, keep_default_na=False)
+    sample_df = sample_df.pivot(columns='NAME_TYPE', values='NAME')
+    district_values = [_normalized_names(sample_df, ['district']).dropna()]
+    school_values = [_normalized_names(sample_df, ['school']).dropna()]
+
+    if schools_file is not None:
+        historical_df = read_data(schools_file)
+        district_values.append(_normalized_names(historical_df, DISTRICT_COLUMNS))
+        school_values.append(_normalized_names(historical_df, SCHOOL_COLUMNS))
+
+    district_values = pd.concat(district_values)
+    school_values = pd.concat(school_values)
+
+    district_mismatches = find_rule_mismatches(district_values, DISTRICT_ABBREVIATION_MAP, DISTRICT_COMMON_TERMS)
+    school_mismatches = find_rule_mismatches(school_values.str.lower(), SCHOOL_ABBREVIATION_MAP, SCHOOL_TERMS_TO_REMOVE)
+
+    print(f"District names checked: {district_values.nunique()}, mismatches: {len(district_mismatches)}")
+    print(f"School names checked: {school_values.nunique()}, mismatches: {len(school_mismatches)}")
+
+    if len(district_mismatches) or len(school_mismatches):
+        with pd.option_context('display.max_rows', 50, 'display.max_colwidth', None):
+            raise AssertionError(
+                "Compiled standardization differs from the sequential rules:\n"
+                f"{district_mismatches.head(50)}\n{school_mismatches.head(50)}"
+            )
+
+    print("Compiled standardization matches the sequential rules!")
+
+
+if __name__ == "__main__":
+    check_standardization(sys.argv[1] if len(sys.argv) > 1 else None)
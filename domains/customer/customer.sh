@@ -4,7 +4,4 @@ export FILE_DATE_SUFFIX=$(date +%Y%m%d)_2
 
 pip install -r requirements.txt
 
-python domains/customer/school_mastering.py
-python domains/customer/prettify_schools.py
-python domains/customer/customer_mastering.py
-python domains/customer/prettify_customers.py
\ No newline at end of file
+python domains/customer/pipeline.py
\ No newline at end of file
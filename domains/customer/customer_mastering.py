@@ -5,67 +5,90 @@ sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-p
 import pandas as pd
 import os
 
+from domains.customer.entity_clustering import cluster_rows, conflicting_rows
 from domains.customer.Reader import read_data
+from domains.customer.source_schemas import CUSTOMER_EXPORT_SCHEMA
 
 BASE_PATH = '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/'
-schools_df = read_data(
-    BASE_PATH+f'outputs/schools/schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
-
-customers_df = schools_df.filter(items=["FOCUS_SCHOOL_DISTRICT_ID", "NCES_LEAID"], axis=1) \
-    .groupby("FOCUS_SCHOOL_DISTRICT_ID", as_index=False) \
-    .nunique()
-
-# print(customers_df)
-
-# print(customers_df.head(10))
-agreeing_customers = customers_df.loc[(customers_df["NCES_LEAID"] == 1)]
-agreeing_customers.columns.values[0] = "FOCUS_SCHOOL_DISTRICT_ID"
-
-
-full_customer_df = schools_df.filter(items=[
-        "FOCUS_SCHOOL_DISTRICT_ID",
-        "NCES_LEAID",
-        "NCES_SCHID"
-        'FOCUS_SCHOOL_DISTRICT_NAME', 
-        'NCES_NAME',
-        "NCES_LEAID",
-        "NCES_NAME",
-        "NCES_STATE.1",
-        "NCES_CITY.1",
-        "NCES_STREET.1",
-        "NCES_ZIP.1"
-    ], axis=1).loc[(schools_df["FOCUS_SCHOOL_DISTRICT_ID"].isin(agreeing_customers["FOCUS_SCHOOL_DISTRICT_ID"]))] \
-    .loc[(schools_df["NCES_LEAID"] == schools_df["NCES_LEAID"])] \
-    .drop_duplicates() \
-
-full_customer_df["NCES_LEAID"] = full_customer_df.apply(
-    lambda row: str(int(row["NCES_LEAID"])), axis=1
-)
-    
-existing_customers = read_data('/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/customer-export-2025-04-22-15-54.csv')
-
-merged_df = full_customer_df.merge(
-    right=existing_customers,
-    left_on="NCES_LEAID",
-    right_on="XREF_VALUE1",
-    how="left",
-).filter(items=[
-        "FOCUS_SCHOOL_DISTRICT_ID",
-        "NCES_SCHID"
-        'FOCUS_SCHOOL_DISTRICT_NAME', 
-        'NCES_NAME',
-        "NCES_LEAID",
-        "NCES_NAME",
-        "NCES_STATE.1",
-        "NCES_CITY.1",
-        "NCES_STREET.1",
-        "NCES_ZIP.1",
-        "MASTERPROPERTIES_ID"
-    ], axis=1)
-
-creates = len(merged_df.loc[(merged_df["MASTERPROPERTIES_ID"] != merged_df["MASTERPROPERTIES_ID"])])
-updates = len(merged_df.loc[(merged_df["MASTERPROPERTIES_ID"] == merged_df["MASTERPROPERTIES_ID"])])
-
-print(f"For customers, we have {creates} creates and {updates} updates")
-    
-merged_df.to_csv(f'outputs/customers/customers_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
\ No newline at end of file
+CUSTOMER_EXPORT_FILE = '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/customer-export-2025-04-22-15-54.csv'
+
+
+def master_customers(schools_df, existing_customers=None):
+    """
+    Derives customers (school districts) from mastered schools and looks up the
+    ones that already exist.
+
+    Args:
+        schools_df (pd.DataFrame | str): The mastered schools, or the path of a
+                                         schools CSV written by school_mastering.
+        existing_customers (pd.DataFrame): The DB customer export. Read from
+                                           CUSTOMER_EXPORT_FILE when not given.
+
+    Returns:
+        pd.DataFrame: The customers.
+    """
+    if isinstance(schools_df, str):
+        schools_df = read_data(schools_df)
+
+    leaids_per_district = schools_df.groupby("FOCUS_SCHOOL_DISTRICT_ID")["NCES_LEAID"].nunique()
+    agreeing_districts = leaids_per_district.index[leaids_per_district == 1]
+    agreeing = schools_df["FOCUS_SCHOOL_DISTRICT_ID"].isin(agreeing_districts)
+
+    # districts and LEAIDs linked through schools, only to report how the
+    # conflicting districts hang together (see entity_clustering)
+    clusters = cluster_rows(schools_df, ["FOCUS_SCHOOL_DISTRICT_ID", "NCES_LEAID"])
+    conflicting = conflicting_rows(schools_df, clusters, "NCES_LEAID")
+    print(f"Leaving out {(leaids_per_district > 1).sum()} districts with conflicting NCES LEAIDs, "
+          f"in {pd.unique(clusters[conflicting]).size} clusters")
+
+
+    full_customer_df = schools_df.filter(items=[
+            "FOCUS_SCHOOL_DISTRICT_ID",
+            "NCES_LEAID",
+            "NCES_SCHID"
+            'FOCUS_SCHOOL_DISTRICT_NAME',
+            'NCES_NAME',
+            "NCES_LEAID",
+            "NCES_NAME",
+            "NCES_STATE.1",
+            "NCES_CITY.1",
+            "NCES_STREET.1",
+            "NCES_ZIP.1"
+        ], axis=1).loc[agreeing] \
+        .loc[(schools_df["NCES_LEAID"] == schools_df["NCES_LEAID"])] \
+        .drop_duplicates() \
+
+    full_customer_df["NCES_LEAID"] = pd.to_numeric(full_customer_df["NCES_LEAID"]).astype("Int64").astype(str)
+
+    if existing_customers is None:
+        existing_customers = read_data(CUSTOMER_EXPORT_FILE, schema=CUSTOMER_EXPORT_SCHEMA)
+
+    merged_df = full_customer_df.merge(
+        right=existing_customers,
+        left_on="NCES_LEAID",
+        right_on="XREF_VALUE1",
+        how="left",
+    ).filter(items=[
+            "FOCUS_SCHOOL_DISTRICT_ID",
+            "NCES_SCHID"
+            'FOCUS_SCHOOL_DISTRICT_NAME',
+            'NCES_NAME',
+            "NCES_LEAID",
+            "NCES_NAME",
+            "NCES_STATE.1",
+            "NCES_CITY.1",
+            "NCES_STREET.1",
+            "NCES_ZIP.1",
+            "MASTERPROPERTIES_ID"
+        ], axis=1)
+
+    creates = len(merged_df.loc[(merged_df["MASTERPROPERTIES_ID"] != merged_df["MASTERPROPERTIES_ID"])])
+    updates = len(merged_df.loc[(merged_df["MASTERPROPERTIES_ID"] == merged_df["MASTERPROPERTIES_ID"])])
+
+    print(f"For customers, we have {creates} creates and {updates} updates")
+    return merged_df
+
+
+if __name__ == "__main__":
+    master_customers(BASE_PATH+f'outputs/schools/schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv') \
+        .to_csv(f'outputs/customers/customers_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_SIZE = 1_000_000
+
+# Named LRU caches shared by every stage of one run (one process)
+_RUN_CACHES = {}
+
+# dict key standing in for NaN/None, which do not compare equal to themselves
+_NA_KEY = object()
+
+
+def run_cache(name, maxsize=DEFAULT_CACHE_SIZE):
+    """
+    Returns the run-wide LRU cache called `name`, creating it if needed.
+
+    Args:
+        name (str): The cache name, one per transformation (e.g. 'standardize_school_name').
+        maxsize (int): The maximum number of values kept; least recently used go first.
+
+    Returns:
+        OrderedDict: The cache, mapping input value -> transformed value.
+    """
+    if name not in _RUN_CACHES:
+        _RUN_CACHES[name] = OrderedDict()
+    return _RUN_CACHES[name]
+
+
+def clear_run_caches():
+    """
+    Empties every run-wide cache, e.g. between runs in the same process.
+    """
+    _RUN_CACHES.clear()
+
+
+def apply_to_distinct(series, func, vectorized=False, cache_name=None, maxsize=DEFAULT_CACHE_SIZE):
+    """
+    Applies a transformation to the distinct values of a column only, and maps the
+    results back to every row through the factorized integer codes.
+
+    With a cache_name, results are also kept in a run-wide LRU cache, so a value
+    already transformed by an earlier stage or column is not transformed again.
+
+    Args:
+        series (pd.Series): The column to transform. NaN is treated as one more value.
+        func (callable): value -> result, or with vectorized=True, Series -> Series.
+        vectorized (bool): Call func once on a Series of the values still to compute.
+        cache_name (str): Optional name of the run-wide cache to read and fill.
+        maxsize (int): Size limit of the run-wide cache.
+
+    Returns:
+        pd.Series: The transformed column, with the same index and name.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    uniques = np.asarray(uniques, dtype=object)
+    keys = [_NA_KEY if pd.isna(value) else value for value in uniques]
+
+    results = np.empty(len(uniques), dtype=object)
+    if cache_name is None:
+        todo = np.arange(len(uniques))
+    else:
+        cache = run_cache(cache_name, maxsize)
+        todo = []
+        for position, key in enumerate(keys):
+            if key in cache:
+                cache.move_to_end(key)
+                results[position] = cache[key]
+            else:
+                todo.append(position)
+        todo = np.asarray(todo, dtype=np.int64)
+
+    if len(todo):
+        if vectorized:
+            computed = np.asarray(func(pd.Series(uniques[todo], dtype=object)), dtype=object)
+        else:
+            computed = [func(value) for value in uniques[todo]]
+        for position, result in zip(todo, computed):
+            results[position] = result
+
+        if cache_name is not None:
+            for position in todo:
+                cache[keys[position]] = results[position]
+            while len(cache) > maxsize:
+                cache.popitem(last=False)
+
+    return pd.Series(results.take(codes), index=series.index, name=series.name)
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+# how a cluster with conflicting entities is resolved
+QUARANTINE_CLUSTER = 'quarantine'
+BEST_SCORE = 'best_score'
+RESOLUTIONS = (QUARANTINE_CLUSTER, BEST_SCORE)
+
+
+def connected_components(n_nodes, left, right):
+    """
+    Array-backed union-find over n_nodes nodes and the edges left[i] - right[i].
+
+    All edges are merged at once, in rounds: every edge whose ends are still in
+    different sets hooks the larger root under the smaller one, then every node
+    jumps to its parent's parent until it points straight at its root. Each round is a few
+    linear passes over the remaining edges and nodes, and edges drop out as
+    soon as their ends share a root.
+
+    Args:
+        n_nodes (int): Number of nodes, numbered from 0.
+        left (array-like): One end of every edge.
+        right (array-like): The other end of every edge.
+
+    Returns:
+        np.ndarray: The root (smallest node) of every node's component.
+    """
+    parent = np.arange(n_nodes, dtype=np.int64)
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    while len(left):
+        root_left, root_right = parent[left], parent[right]
+        differ = root_left != root_right
+        left, right = left[differ], right[differ]
+        root_left, root_right = root_left[differ], root_right[differ]
+        if not len(left):
+            break
+        # a root only ever points at a smaller node, so no cycles come up
+        np.minimum.at(parent, np.maximum(root_left, root_right), np.minimum(root_left, root_right))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def cluster_rows(df, columns):
+    """
+    Clusters the rows of df by the entities they connect. Every value of every
+    column is a node (values of different columns are different nodes, e.g. a
+    Focus school and an NCES school), every row an edge between its values, and
+    rows whose nodes end up connected, directly or through other rows, share a
+    cluster.
+
+    Args:
+        df (pd.DataFrame): The candidate edges, e.g. best matches.
+        columns (list): The entity ID columns, e.g. ['FOCUS_SCHOOL_ID', 'NCES_NCESSCH'].
+
+    Returns:
+        np.ndarray: The cluster of every row; -1 for rows with no value in any
+                    of the columns.
+    """
+    codes = []
+    n_nodes = 0
+    for col in columns:
+        col_codes, uniques = pd.factorize(df[col].to_numpy())
+        codes.append(np.where(col_codes >= 0, col_codes + n_nodes, -1))
+        n_nodes += len(uniques)
+
+    # every row is tied to its first value, which then stands for the row
+    anchor = codes[0]
+    for col_codes in codes[1:]:
+        anchor = np.where(anchor >= 0, anchor, col_codes)
+    left, right = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for col_codes in codes[1:]:
+        both = (anchor >= 0) & (col_codes >= 0)
+        left.append(anchor[both])
+        right.append(col_codes[both])
+
+    roots = connected_components(n_nodes, np.concatenate(left), np.concatenate(right))
+    return np.where(anchor >= 0, roots[np.maximum(anchor, 0)], -1)
+
+
+def values_per_cluster(df, clusters, column):
+    """
+    Number of distinct (non-missing) values of column in the cluster of every row.
+    """
+    return df[column].groupby(clusters).transform('nunique').to_numpy()
+
+
+def best_entity_rows(df, clusters, entity_col, score_col):
+    """
+    Boolean mask of the rows of the best scoring entity of every cluster; ties go
+    to the entity whose row comes first.
+    """
+    entities = df[entity_col].to_numpy()
+    # best score first within every cluster; lexsort is stable and puts missing scores last
+    order = np.lexsort((-df[score_col].to_numpy(dtype=np.float64), clusters))
+    sorted_clusters = clusters[order]
+    first_of_cluster = np.ones(len(order), dtype=bool)
+    first_of_cluster[1:] = sorted_clusters[1:] != sorted_clusters[:-1]
+    winners = pd.Series(entities[order][first_of_cluster], index=sorted_clusters[first_of_cluster])
+    return entities == winners.reindex(clusters).to_numpy()
+
+
+def conflicting_rows(df, clusters, entity_col, resolution=QUARANTINE_CLUSTER, score_col=None):
+    """
+    Boolean mask of the rows to quarantine: those in clusters holding more than
+    one entity_col value. With QUARANTINE_CLUSTER the whole cluster is
+    quarantined as a unit; with BEST_SCORE the cluster is resolved to its best
+    scoring entity (by score_col) and only the others are quarantined.
+
+    Args:
+        df (pd.DataFrame): The clustered rows.
+        clusters (np.ndarray): The cluster of every row, from cluster_rows.
+        entity_col (str): The column that must have one value per cluster.
+        resolution (str): QUARANTINE_CLUSTER or BEST_SCORE.
+        score_col (str): The score column, for BEST_SCORE.
+
+    Returns:
+        np.ndarray: True for the rows to quarantine.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown cluster resolution {resolution!r}, expected one of {RESOLUTIONS}.")
+    conflicting = (values_per_cluster(df, clusters, entity_col) > 1) & (clusters >= 0)
+    if resolution == BEST_SCORE:
+        conflicting &= ~best_entity_rows(df, clusters, entity_col, score_col)
+    return conflicting
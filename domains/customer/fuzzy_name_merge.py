@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from tqdm import tqdm
 
 from domains.customer.Ingester import filter_sf_data
@@ -122,6 +123,170 @@ def compare_distinct_sd_series_focus_sf(series1, series2, threshold=80, method=f
 
     return pd.DataFrame(comparison_data)
 
+# state and province names -> postal codes, for state columns that spell them out
+STATE_CODES = {
+    'ALABAMA': 'AL', 'ALASKA': 'AK', 'ARIZONA': 'AZ', 'ARKANSAS': 'AR', 'CALIFORNIA': 'CA', 'COLORADO': 'CO',
+    'CONNECTICUT': 'CT', 'DELAWARE': 'DE', 'DISTRICT OF COLUMBIA': 'DC', 'FLORIDA': 'FL', 'GEORGIA': 'GA',
+    'HAWAII': 'HI', 'IDAHO': 'ID', 'ILLINOIS': 'IL', 'INDIANA': 'IN', 'IOWA': 'IA', 'KANSAS': 'KS', 'KENTUCKY': 'KY',
+    'LOUISIANA': 'LA', 'MAINE': 'ME', 'MARYLAND': 'MD', 'MASSACHUSETTS': 'MA', 'MICHIGAN': 'MI', 'MINNESOTA': 'MN',
+    'MISSISSIPPI': 'MS', 'MISSOURI': 'MO', 'MONTANA': 'MT', 'NEBRASKA': 'NE', 'NEVADA': 'NV', 'NEW HAMPSHIRE': 'NH',
+    'NEW JERSEY': 'NJ', 'NEW MEXICO': 'NM', 'NEW YORK': 'NY', 'NORTH CAROLINA': 'NC', 'NORTH DAKOTA': 'ND',
+    'OHIO': 'OH', 'OKLAHOMA': 'OK', 'OREGON': 'OR', 'PENNSYLVANIA': 'PA', 'RHODE ISLAND': 'RI',
+    'SOUTH CAROLINA': 'SC', 'SOUTH DAKOTA': 'SD', 'TENNESSEE': 'TN', 'TEXAS': 'TX', 'UTAH': 'UT', 'VERMONT': 'VT',
+    'VIRGINIA': 'VA', 'WASHINGTON': 'WA', 'WEST VIRGINIA': 'WV', 'WISCONSIN': 'WI', 'WYOMING': 'WY',
+    'AMERICAN SAMOA': 'AS', 'GUAM': 'GU', 'NORTHERN MARIANA ISLANDS': 'MP', 'PUERTO RICO': 'PR',
+    'VIRGIN ISLANDS': 'VI', 'ALBERTA': 'AB', 'BRITISH COLUMBIA': 'BC', 'MANITOBA': 'MB', 'NEW BRUNSWICK': 'NB',
+    'NEWFOUNDLAND AND LABRADOR': 'NL', 'NORTHWEST TERRITORIES': 'NT', 'NOVA SCOTIA': 'NS', 'NUNAVUT': 'NU',
+    'ONTARIO': 'ON', 'PRINCE EDWARD ISLAND': 'PE', 'QUEBEC': 'QC', 'SASKATCHEWAN': 'SK', 'YUKON': 'YT',
+}
+
+
+def normalize_state_codes(states):
+    """
+    Turns state and province names or postal codes into postal codes, e.g.
+    'California' and ' ca' into 'CA'. Missing and unrecognized values become ''.
+
+    Args:
+        states (pd.Series): State names or codes.
+
+    Returns:
+        pd.Series: The postal codes, '' where unknown.
+    """
+    cleaned = states.astype(object).where(states.notna(), '').astype(str).str.strip().str.upper()
+    codes = cleaned.where(cleaned.isin(set(STATE_CODES.values())), cleaned.map(STATE_CODES)).fillna('')
+    unrecognized = (codes == '') & (cleaned != '')
+    if unrecognized.any():
+        print(f"Warning: {unrecognized.sum()} '{states.name}' values are not states "
+              f"(e.g. {cleaned[unrecognized].iloc[0]!r}); they are matched without the state block")
+    return codes
+
+
+DISTRICT_SUFFIXES = [
+    'township school district',
+    'consolidated school district',
+    'unified school district',
+    'public schools',
+    'school district',
+]
+
+
+def _strip_district_suffixes(series, states=None):
+    """
+    Lowercases the distinct district names once and, for every suffix in
+    DISTRICT_SUFFIXES the name contains, emits the name with that suffix removed.
+
+    Args:
+        series (pd.Series): District names.
+        states (pd.Series): Optional states aligned with `series` (see
+                            normalize_state_codes).
+
+    Returns:
+        pd.DataFrame: One row per (distinct name, state, contained suffix) with the
+                      columns name, state ('' if unknown), suffix, suffix_mask,
+                      stripped and lead.
+    """
+    distinct = pd.DataFrame({
+        'name': series.astype(str).str.lower().str.strip().to_numpy(),
+        'state': normalize_state_codes(states).to_numpy() if states is not None else '',
+    }).drop_duplicates(ignore_index=True)
+
+    suffix_mask = np.zeros(len(distinct), dtype=np.int64)
+    for position, suffix in enumerate(DISTRICT_SUFFIXES):
+        suffix_mask |= distinct['name'].str.contains(suffix, regex=False).to_numpy().astype(np.int64) << position
+    distinct['suffix_mask'] = suffix_mask
+
+    variants = []
+    for position, suffix in enumerate(DISTRICT_SUFFIXES):
+        with_suffix = distinct.loc[((suffix_mask >> position) & 1) == 1].copy()
+        with_suffix['suffix'] = position
+        with_suffix['stripped'] = with_suffix['name'].str.replace(suffix, '', regex=False).str.strip()
+        variants.append(with_suffix)
+
+    variants = pd.concat(variants, ignore_index=True)
+    variants['lead'] = variants['stripped'].str.split(' ', n=1).str[0]
+    return variants
+
+
+def match_distinct_sd_series_focus_sf(series1, series2, states1=None, states2=None, threshold=80,
+                                      method=fuzz.ratio, block_on_leading_token=False):
+    """
+    Blocked replacement for compare_distinct_sd_series_focus_sf.
+
+    Each distinct name is lowercased and stripped of its district suffixes once.
+    Candidates are blocked by state (when given) and shared suffix, optionally by
+    leading token too, and every block is scored in a single rapidfuzz cdist call.
+    A name whose state is missing or not recognized is compared with the names
+    of every state. A pair is scored on the first suffix in DISTRICT_SUFFIXES
+    that both names contain, as before; pairs that share no suffix are never
+    matched.
+
+    Blocking on the leading token is off by default: it misses names that differ
+    in their first word (e.g. 'st. mary' and 'saint mary'), which the unblocked
+    comparison finds.
+
+    Args:
+        series1 (pd.Series): The first pandas Series (Focus district names).
+        series2 (pd.Series): The second pandas Series (Salesforce account names).
+        states1 (pd.Series): Optional states (codes or names) aligned with series1.
+        states2 (pd.Series): Optional states (codes or names) aligned with series2.
+        threshold (int): The minimum similarity score (0-100) to consider a match.
+        method (callable): The fuzzy matching function from rapidfuzz (e.g., fuzz.ratio).
+        block_on_leading_token (bool): Only compare names whose stripped forms share
+                                       their first word.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the distinct values from both series
+                      that have a similarity score above the threshold, along with
+                      their similarity score.
+    """
+    use_states = states1 is not None and states2 is not None
+    left = _strip_district_suffixes(series1, states1 if use_states else None)
+    right = _strip_district_suffixes(series2, states2 if use_states else None)
+    print("focus series1 " + str(left['name'].nunique()))
+    print("sf series2 " + str(right['name'].nunique()))
+
+    block_keys = ['suffix'] + (['lead'] if block_on_leading_token else [])
+    unknown_state = right['state'] == ''
+    right_blocks = {key: block for key, block in right[~unknown_state].groupby(['state'] + block_keys, sort=False)}
+    # names without a state are candidates in every state, and names of any state are for them
+    right_stateless = {key: block for key, block in right[unknown_state].groupby(block_keys, sort=False)}
+    right_any_state = {key: block for key, block in right.groupby(block_keys, sort=False)}
+
+    matches = []
+    for key, left_block in tqdm(left.groupby(['state'] + block_keys, sort=False),
+                                desc=f"Comparing blocks from '{series1.name}'"):
+        state, name_key = key[0], key[1:]
+        if state == '':
+            right_block = right_any_state.get(name_key)
+        else:
+            parts = [block for block in (right_blocks.get(key), right_stateless.get(name_key)) if block is not None]
+            right_block = pd.concat(parts) if parts else None
+        if right_block is None:
+            continue
+        suffix = name_key[0]
+
+        scores = process.cdist(left_block['stripped'].tolist(), right_block['stripped'].tolist(),
+                               scorer=method, score_cutoff=threshold, workers=-1, dtype=np.float64)
+        left_pos, right_pos = np.nonzero(scores >= threshold)
+
+        # A pair belongs to this suffix only if it shares no suffix listed before it
+        higher_suffixes = (1 << suffix) - 1
+        shared = left_block['suffix_mask'].to_numpy()[left_pos] & right_block['suffix_mask'].to_numpy()[right_pos]
+        keep = (shared & higher_suffixes) == 0
+
+        matches.append(pd.DataFrame({
+            f"{series1.name}": left_block['name'].to_numpy()[left_pos[keep]],
+            f"{series2.name}": right_block['name'].to_numpy()[right_pos[keep]],
+            "SF_FOCUS_sd_similarity_score": scores[left_pos[keep], right_pos[keep]],
+        }))
+
+    if not matches:
+        return pd.DataFrame(columns=[f"{series1.name}", f"{series2.name}", "SF_FOCUS_sd_similarity_score"])
+
+    # the same pair of names can meet in several states
+    return pd.concat(matches, ignore_index=True) \
+        .drop_duplicates(subset=[f"{series1.name}", f"{series2.name}"], ignore_index=True)
+
 # def link_dataframes_with_details_no_prefix(df1, df2, column1, column2, threshold=80, method=fuzz.ratio):
 #     linked_records = []
 #     for index1, row1 in tqdm(df1.iterrows(), total=len(df1), desc="Processing df1"):
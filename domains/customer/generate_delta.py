@@ -1,20 +1,82 @@
 import sys
 sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
 
+import os
+
+import numpy as np
 import pandas as pd
 
-import json
+from domains.customer.instrumentation import record_count
+from domains.customer.Reader import read_data
+from domains.customer.source_schemas import INTERMEDIATE_SCHOOLS_SCHEMA, SCHOOL_EXPORT_SCHEMA
 
 pd.set_option('display.max_columns', None)
 
+DELTA_ACTION_COL = 'DELTA_ACTION'
+CREATE = 'create'
+UPDATE = 'update'
+NOOP = 'noop'
+DELTA_ACTIONS = (CREATE, UPDATE, NOOP)
+# drawn by the prettifier rather than taken from the sources, so not part of what a record says
+GENERATED_COLUMNS = ('MASTERPROPERTIES_ID_1', 'MASTERPROPERTIES_ID_2')
+
+XREF2_COLUMNS = ['XREF_SOURCESYSTEM2', 'XREF_KEYNAME2', 'XREF_VALUE2']
+
+
+def parse_focus_id_lists(values):
+    """
+    Parses JSON lists of focus ids, e.g. '[101577, 101578]', column-wise instead
+    of json.loads per row. Ids are returned as text, quoted or not.
+
+    Args:
+        values (pd.Series): The lists.
+
+    Returns:
+        pd.Series: One focus id per list element, on the index of its list.
+    """
+    items = values.dropna().astype(str).str.strip().str.removeprefix('[').str.removesuffix(']') \
+        .str.split(',').explode()
+    items = items.str.strip().str.strip('"')
+    return items[items != '']
+
+
+def build_focus_id_index(existing_db_df, intermediate_file_df):
+    """
+    Joins the DB export with the intermediate file on the NCES school id, taking
+    the focus id lists (XREF 2) from the intermediate file, and keys the master
+    records by every focus id they hold.
+
+    Returns:
+        pd.DataFrame: One row per (master record, focus id), with the focus id in
+                      'focus_id_list'.
+    """
+    intermediate_columns = ['MASTERPROPERTIES_NCESSCHOOLID'] + [
+        col for col in intermediate_file_df.columns
+        if col in XREF2_COLUMNS or col not in existing_db_df.columns]
+    master = pd.merge(existing_db_df.drop(columns=XREF2_COLUMNS, errors='ignore'),
+                      intermediate_file_df[intermediate_columns], on='MASTERPROPERTIES_NCESSCHOOLID')
+    print("records in merged " + str(len(master)))
+
+    focus_ids = parse_focus_id_lists(master['XREF_VALUE2'])
+    return master.loc[focus_ids.index].assign(focus_id_list=focus_ids.to_numpy()).reset_index(drop=True)
+
+
 def add_on_existing_db_ids(df, existing_db_df_path, intermediate_file_path):
-        # merge intermediate with db export
-        # existing_db_df = pd.read_csv('/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/school-export-2025-04-18-09-22.csv')
-        existing_db_df = pd.read_csv(existing_db_df_path)
-        # intermediate_file_df = pd.read_csv('/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/iterm_schools_20250331.csv')
-        intermediate_file_df = pd.read_csv(intermediate_file_path)
-        # print(existing_db_df.head())
-        # print(intermediate_file_df.head())
+        """
+        Looks up the DB master record of every outgoing school by its focus id and
+        marks each row, in DELTA_ACTION_COL, as a create (no master record), an
+        update (the NCES school id changed) or a no-op.
+
+        Args:
+            df (pd.DataFrame): Renamed mastered schools, with FOCUS_ID.
+            existing_db_df_path (str): The DB school export.
+            intermediate_file_path (str): The intermediate schools file.
+
+        Returns:
+            pd.DataFrame: df with the master records' columns and the action.
+        """
+        existing_db_df = read_data(existing_db_df_path, schema=SCHOOL_EXPORT_SCHEMA)
+        intermediate_file_df = read_data(intermediate_file_path, schema=INTERMEDIATE_SCHOOLS_SCHEMA)
         print("records in existing " + str(len(existing_db_df)))
         print("records in intermediate " + str(len(intermediate_file_df)))
 
@@ -24,68 +86,24 @@ def add_on_existing_db_ids(df, existing_db_df_path, intermediate_file_path):
         print(filtered_counts)
         print("distinct school id in intermediate " + str(len(intermediate_file_df['MASTERPROPERTIES_NCESSCHOOLID'].unique())))
 
+        master_by_focus_id = build_focus_id_index(existing_db_df, intermediate_file_df)
 
+        # focus ids are compared as text, whether FOCUS_ID was read as numbers or strings
+        tw_merged_df = pd.merge(df.assign(focus_id_key=df['FOCUS_ID'].astype(str)), master_by_focus_id,
+                                left_on=['focus_id_key'], right_on=['focus_id_list'], how='left',
+                                suffixes=('', '_master')) \
+            .drop(columns=['focus_id_key'])
 
-        #merged_df = pd.merge(existing_db_df, intermediate_file_df, on='MASTERPROPERTIES_NCESSCHOOLID')
-        #2156
-        merged_df = pd.merge(existing_db_df, intermediate_file_df, on=['MASTERPROPERTIES_NCESSCHOOLID'])
-        # , 'XREF_VALUE1'
-        print("records in merged " + str(len(merged_df)))
-        merged_df.head(10)
-
-
-        # copy the values of focus id from intermediate file to db export df
-
-        merged_df.drop(columns=['XREF_SOURCESYSTEM2_x', 'XREF_KEYNAME2_x', 'XREF_VALUE2_x'], inplace=True)
-        merged_df.rename(columns={'XREF_SOURCESYSTEM2_y': 'XREF_SOURCESYSTEM2_x',
-                                'XREF_KEYNAME2_y': 'XREF_KEYNAME2_x',
-                                'XREF_VALUE2_y': 'XREF_VALUE2_x',
-                                }, inplace=True)
-        merged_df = merged_df.drop(columns=[col for col in merged_df.columns if col.endswith('_y')])
-        merged_df.columns = [col.replace('_x', '') for col in merged_df.columns]
-        merged_df['focus_id_list'] = merged_df.apply(
-            lambda row: json.loads(row['XREF_VALUE2']), axis=1
-        )
-        # XREF_SOURCESYSTEM2_y	XREF_KEYNAME2_y	XREF_VALUE2_y
-
-        merged_df = merged_df.explode('focus_id_list')
-        # print(merged_df['focus_id_list'].sort_values())
-
-
-        # read our schools file
-        # tw_schools = school_prettifier('outputs/schools/schools_0417_3.csv')
-
-        tw_merged_df = pd.merge(df, merged_df, left_on=['FOCUS_ID'], right_on=['focus_id_list'], how='left')
-        # tw_merged_df["clensed_nces_x"] = tw_merged_df.apply(
-        #     lambda row: (row["MASTERPROPERTIES_NCESSCHOOLID_x"].zfill(13)[0:7] + row["MASTERPROPERTIES_NCESSCHOOLID_x"][-5:]) if len(row["MASTERPROPERTIES_NCESSCHOOLID_x"])>=12 else row["MASTERPROPERTIES_NCESSCHOOLID_x"], axis=1
-        # )
-        # tw_merged_df["clensed_nces_y"] = tw_merged_df.apply(
-        #     lambda row: str(row["MASTERPROPERTIES_NCESSCHOOLID_y"]).zfill(12) if len(row["MASTERPROPERTIES_NCESSCHOOLID_x"])>=12 else row["MASTERPROPERTIES_NCESSCHOOLID_x"], axis=1
-        # )
-        # print(tw_merged_df.filter(items=["FOCUS_ID", "focus_id_list", "MASTERPROPERTIES_SCHOOLNAME_x", "MASTERPROPERTIES_ID", "clensed_nces_x", "MASTERPROPERTIES_NCESSCHOOLID_x", "MASTERPROPERTIES_NCESSCHOOLID_y", "MASTERPROPERTIES_ADDRESS_CITY_x"], axis=1)
-        #     .loc[(tw_merged_df['focus_id_list']==tw_merged_df['focus_id_list'])]
-        #     .loc[(tw_merged_df['clensed_nces_x']!=tw_merged_df['clensed_nces_y'])]
-        # )
-
-        creates = len(tw_merged_df
-            .loc[(tw_merged_df['focus_id_list']!=tw_merged_df['focus_id_list'])] #i.e. no R-side focus id
-        )
-        updates = len(tw_merged_df
-            .loc[(tw_merged_df['focus_id_list']==tw_merged_df['focus_id_list'])]
-            .loc[(tw_merged_df['MASTERPROPERTIES_NCESSCHOOLID_x']!=tw_merged_df['MASTERPROPERTIES_NCESSCHOOLID_y'])]
-        )
-        noops = len(tw_merged_df
-            .loc[(tw_merged_df['focus_id_list']==tw_merged_df['focus_id_list'])]
-            .loc[(tw_merged_df['MASTERPROPERTIES_NCESSCHOOLID_x']==tw_merged_df['MASTERPROPERTIES_NCESSCHOOLID_y'])]
-        )
-
-        print(f"Generating a file that will cause {creates} creates, {updates} meaningful updates, and {noops} no-ops.")
-
-        # raise Exception("Hurrah!")
-        # print("total matched records")
-        # print(tw_merged_df['MASTERPROPERTIES_ID'].notnull().sum())
-        # print("result df length")
-        # print(len(tw_merged_df))
+        has_master = tw_merged_df['focus_id_list'].notna().to_numpy()
+        same_school = tw_merged_df['MASTERPROPERTIES_NCESSCHOOLID'].astype(object) \
+            .eq(tw_merged_df['MASTERPROPERTIES_NCESSCHOOLID_master'].astype(object)).to_numpy()
+        tw_merged_df[DELTA_ACTION_COL] = np.select([~has_master, same_school], [CREATE, NOOP], UPDATE)
+
+        counts = tw_merged_df[DELTA_ACTION_COL].value_counts()
+        print(f"Generating a file that will cause {counts.get(CREATE, 0)} creates, {counts.get(UPDATE, 0)} meaningful updates, "
+              f"and {counts.get(NOOP, 0)} no-ops.")
+        for action in DELTA_ACTIONS:
+            record_count(f"delta: {action}", counts.get(action, 0))
 
         # commented below line as we dont want to add our generated id to final dataset
         #tw_merged_df['MASTERPROPERTIES_ID'] = tw_merged_df['MASTERPROPERTIES_ID'].fillna(tw_merged_df['MASTERPROPERTIES_ID_1'])
@@ -95,14 +113,119 @@ def add_on_existing_db_ids(df, existing_db_df_path, intermediate_file_path):
         tw_merged_df['XREF_KEYNAME3'] = "school_id"
         tw_merged_df['XREF_VALUE3'] = tw_merged_df['FOCUS_ID']
 
-
-        tw_merged_df = tw_merged_df.drop(columns=[col for col in tw_merged_df.columns if col.endswith('_y')])
-        tw_merged_df.columns = [col.replace('_x', '') for col in tw_merged_df.columns]
-
-        return tw_merged_df
-
-        # tw_merged_update = tw_merged_df[tw_merged_df['MASTERPROPERTIES_ID'].notnull()]
-        # tw_merged_insert = tw_merged_df[tw_merged_df['MASTERPROPERTIES_ID'].isnull()]
-        # print(tw_merged_update.head())
-        # print("========== ============")
-        # print(tw_merged_insert.head())
\ No newline at end of file
+        return tw_merged_df.drop(columns=[col for col in tw_merged_df.columns if col.endswith('_master')])
+
+
+def delta_outputs(pretty_df, directory, file_date_suffix):
+    """
+    Splits pretty records carrying DELTA_ACTION_COL into one output per action, so
+    the downstream load only touches what changed.
+
+    Returns:
+        dict: Output path -> records of that action (without DELTA_ACTION_COL).
+    """
+    return {
+        os.path.join(directory, f'{action}_schools_{file_date_suffix}.csv'):
+            pretty_df[pretty_df[DELTA_ACTION_COL] == action].drop(columns=[DELTA_ACTION_COL])
+        for action in DELTA_ACTIONS
+    }
+
+
+def _as_text(values):
+    # values compared as text, so numbers and strings of the same value agree; missing is ''.
+    # Whole numbers lose leading zeros and a '.0', as export columns with inferred types
+    # read '03386' as 3386 and nullable integers as 100005.0
+    values = values.astype(object)
+    texts = values.where(values.isna(), values.astype(str)).fillna('').str.strip()
+    whole = texts.str.fullmatch(r'\d+(\.0*)?').to_numpy(dtype=bool)
+    texts[whole] = texts[whole].str.replace(r'\.0*$', '', regex=True).str.lstrip('0').replace('', '0')
+    return texts
+
+
+def content_fingerprints(df, columns):
+    """
+    Hashes every value of the given columns, and every row over them.
+
+    Args:
+        df (pd.DataFrame): The records.
+        columns (list): The columns to fingerprint.
+
+    Returns:
+        tuple: (row fingerprints as a uint64 array, column fingerprints as a
+               uint64 array of shape (rows, columns)).
+    """
+    column_hashes = np.column_stack(
+        [pd.util.hash_pandas_object(_as_text(df[col]), index=False).to_numpy() for col in columns]
+    ) if columns else np.zeros((len(df), 0), dtype=np.uint64)
+    row_hashes = pd.util.hash_pandas_object(pd.DataFrame(column_hashes), index=False).to_numpy()
+    return row_hashes, column_hashes
+
+
+def classify_by_content(pretty_df, existing_db_df, key='MASTERPROPERTIES_ID', prefix='MASTERPROPERTIES_'):
+    """
+    Compares outgoing records with their master record in the DB export, field by
+    field over the MASTERPROPERTIES_* columns both have, except the generated
+    GENERATED_COLUMNS. A record is a create without a master record, an update
+    if any of those fields differs and a no-op otherwise. Whole numbers compare
+    equal however the export's inferred types wrote them (3386, '03386', 3386.0).
+
+    Args:
+        pretty_df (pd.DataFrame): Outgoing records in the export layout.
+        existing_db_df (pd.DataFrame): The DB export.
+        key (str): The master record id, in both.
+        prefix (str): Prefix of the compared columns.
+
+    Returns:
+        tuple: (np.ndarray of actions, pd.DataFrame of booleans: which compared
+               fields of each record changed; all False for creates and no-ops).
+    """
+    columns = [col for col in pretty_df.columns
+               if col.startswith(prefix) and col != key and col not in GENERATED_COLUMNS
+               and col in existing_db_df.columns]
+    existing = existing_db_df.dropna(subset=[key]).drop_duplicates(key).set_index(key)
+
+    has_master = pretty_df[key].isin(existing.index).to_numpy()
+    outgoing = pretty_df[has_master]
+    outgoing_rows, outgoing_columns = content_fingerprints(outgoing, columns)
+    master_rows, master_columns = content_fingerprints(existing.reindex(outgoing[key]), columns)
+
+    changed = np.zeros((len(pretty_df), len(columns)), dtype=bool)
+    changed[has_master] = outgoing_columns != master_columns
+    row_changed = np.zeros(len(pretty_df), dtype=bool)
+    row_changed[has_master] = outgoing_rows != master_rows
+
+    actions = np.select([~has_master, row_changed], [CREATE, UPDATE], NOOP)
+    return actions, pd.DataFrame(changed, index=pretty_df.index, columns=columns)
+
+
+def content_delta_outputs(pretty_df, existing_db_df, directory, file_date_suffix, changed_columns_only=False,
+                          key='MASTERPROPERTIES_ID'):
+    """
+    Like delta_outputs, but with actions from classify_by_content, so updates
+    are the records whose fields actually changed.
+
+    Args:
+        pretty_df (pd.DataFrame): Outgoing records in the export layout.
+        existing_db_df (pd.DataFrame): The DB export.
+        directory (str): Where the outputs go.
+        file_date_suffix (str): Suffix of the output file names.
+        changed_columns_only (bool): Only write the key and the fields that changed
+                                     in some update to the updates output.
+        key (str): The master record id.
+
+    Returns:
+        dict: Output path -> records.
+    """
+    actions, changed = classify_by_content(pretty_df, existing_db_df, key=key)
+    counts = pd.Series(actions).value_counts()
+    print(f"By content: {counts.get(CREATE, 0)} creates, {counts.get(UPDATE, 0)} updates, "
+          f"{counts.get(NOOP, 0)} no-ops.")
+    for action in DELTA_ACTIONS:
+        record_count(f"delta by content: {action}", counts.get(action, 0))
+
+    outputs = delta_outputs(pretty_df.assign(**{DELTA_ACTION_COL: actions}), directory, file_date_suffix)
+    if changed_columns_only:
+        updates_path = os.path.join(directory, f'{UPDATE}_schools_{file_date_suffix}.csv')
+        changed_columns = changed.columns[changed.to_numpy()[actions == UPDATE].any(axis=0)].tolist()
+        outputs[updates_path] = outputs[updates_path][[key] + changed_columns]
+    return outputs
@@ -1,9 +1,9 @@
 import geopandas as gpd
 import pandas as pd
-from shapely.geometry import Point
-from geopy.distance import geodesic
+from sklearn.neighbors import BallTree
 import numpy as np
 
+from domains.customer.geodesic_distance import EARTH_RADIUS_M, geodesic_distance
 from domains.customer.name_similarity_scoring import add_similarity_score
 
 def ensure_same_and_projected_crs(gdf1, gdf2, target_crs='EPSG:32633'): # Example: UTM Zone 33N (meters)
@@ -57,18 +57,9 @@ def join_geodataframes_by_lat_lon_columns(gdf1, gdf2, left_lat='lat1', left_lon=
     # Perform spatial join based on distance (now in meters)
     joined_gdf = gpd.sjoin_nearest(gdf1, gdf2, how=how, max_distance=distance, lsuffix='_left', rsuffix='_right')
 
-    # Calculate the actual geodesic distance between the original lat/lon points, handling NaNs
-    def calculate_geodesic_distance(row):
-        lat1 = row[left_lat]
-        lon1 = row[left_lon]
-        lat2 = row[right_lat]
-        lon2 = row[right_lon]
-        if np.isnan(lat1) or np.isnan(lon1) or np.isnan(lat2) or np.isnan(lon2):
-            return np.nan  # Return NaN if any coordinate is NaN
-        else:
-            return geodesic((lat1, lon1), (lat2, lon2)).meters
-
-    joined_gdf['actual_distance_m'] = joined_gdf.apply(calculate_geodesic_distance, axis=1)
+    # Calculate the actual geodesic distance between the original lat/lon points (NaN where any is missing)
+    joined_gdf['actual_distance_m'] = geodesic_distance(joined_gdf[left_lat], joined_gdf[left_lon],
+                                                        joined_gdf[right_lat], joined_gdf[right_lon])
 
     # Remove temporary geometry columns
     gdf1.drop(columns=['geometry'], inplace=True)
@@ -76,6 +67,169 @@ def join_geodataframes_by_lat_lon_columns(gdf1, gdf2, left_lat='lat1', left_lon=
 
     return joined_gdf
 
+CANDIDATE_DTYPE = np.dtype([('left_idx', np.int64), ('right_idx', np.int64), ('distance_m', np.float64)])
+
+
+def build_haversine_index(lat, lon):
+    """
+    Builds a BallTree over lat/lon points using the haversine metric, so that
+    queries are answered in true great-circle distance without reprojecting.
+
+    Points with a missing coordinate are left out of the tree; with no points
+    left the tree is None.
+
+    Args:
+        lat (array-like): Latitudes in degrees.
+        lon (array-like): Longitudes in degrees.
+
+    Returns:
+        tuple: (BallTree, np.ndarray) the tree and, for every point in it, the
+               position of that point in the input arrays.
+    """
+    coords = np.column_stack([np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)])
+    row_ids = np.flatnonzero(~np.isnan(coords).any(axis=1))
+    if len(row_ids) == 0:
+        return None, row_ids
+    return BallTree(np.radians(coords[row_ids]), metric='haversine'), row_ids
+
+
+def find_candidates_within_radius(tree, row_ids, lat, lon, distance=50, k=1):
+    """
+    Finds up to k indexed points within `distance` metres of each query point.
+
+    Distances are refined on the WGS-84 ellipsoid, so the radius is in true metres.
+
+    Args:
+        tree (BallTree): The index returned by build_haversine_index.
+        row_ids (np.ndarray): The row positions returned by build_haversine_index.
+        lat (array-like): Query latitudes in degrees.
+        lon (array-like): Query longitudes in degrees.
+        distance (float): The maximum distance (in meters) for a candidate.
+        k (int): The maximum number of candidates per query point.
+
+    Returns:
+        np.ndarray: A CANDIDATE_DTYPE record array of (left_idx, right_idx, distance_m),
+                    ordered by left_idx and then distance. left_idx is the position of
+                    the query point, right_idx the position of the indexed point.
+    """
+    coords = np.column_stack([np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)])
+    query_ids = np.flatnonzero(~np.isnan(coords).any(axis=1))
+    k = min(k, len(row_ids))
+    if k == 0 or len(query_ids) == 0:
+        return np.empty(0, dtype=CANDIDATE_DTYPE)
+
+    tree_distances, tree_positions = tree.query(np.radians(coords[query_ids]), k=k)
+
+    # the sphere is off by up to ~0.5% from the ellipsoid, so pre-filter with some slack
+    within = tree_distances * EARTH_RADIUS_M <= distance * 1.01
+    left_idx = np.repeat(query_ids, k).reshape(-1, k)[within]
+    right_idx = row_ids[tree_positions[within]]
+
+    tree_lat, tree_lon = np.degrees(np.asarray(tree.data)[tree_positions[within]]).T
+    distance_m = geodesic_distance(coords[left_idx, 0], coords[left_idx, 1], tree_lat, tree_lon)
+
+    keep = distance_m <= distance
+    candidates = np.empty(keep.sum(), dtype=CANDIDATE_DTYPE)
+    candidates['left_idx'] = left_idx[keep]
+    candidates['right_idx'] = right_idx[keep]
+    candidates['distance_m'] = distance_m[keep]
+    return candidates[np.lexsort((candidates['distance_m'], candidates['left_idx']))]
+
+
+def find_candidate_pairs(df1, df2, left_lat='lat1', left_lon='lon1', right_lat='lat2', right_lon='lon2',
+                         how='inner', distance=50, k=1, right_index=None):
+    """
+    Pairs every left row with up to k right rows within `distance` true metres,
+    found with a haversine BallTree, without copying any other column.
+
+    Args:
+        See join_dataframes_by_lat_lon_radius.
+
+    Returns:
+        DataFrame: One row per pair, ordered by left row and then distance, with
+                   'left_idx' and 'right_idx' (row positions in df1 and df2; -1
+                   for left rows without a candidate) and 'actual_distance_m'.
+    """
+    if how not in ('inner', 'left'):
+        raise ValueError(f"Unsupported join type '{how}'; use 'inner' or 'left'.")
+
+    if right_index is None:
+        tree, row_ids = build_haversine_index(df2[right_lat], df2[right_lon])
+    elif len(right_index.coords) != len(df2):
+        raise ValueError(f"Spatial index covers {len(right_index.coords)} rows but the right DataFrame has {len(df2)}.")
+    else:
+        tree, row_ids = right_index.tree, right_index.row_ids
+    candidates = find_candidates_within_radius(tree, row_ids, df1[left_lat], df1[left_lon], distance=distance, k=k)
+
+    left_idx, right_idx, distance_m = candidates['left_idx'], candidates['right_idx'], candidates['distance_m']
+    if how == 'left':
+        # keep left rows without a candidate, with an empty right side
+        lonely = np.setdiff1d(np.arange(len(df1)), left_idx)
+        left_idx = np.concatenate([left_idx, lonely])
+        right_idx = np.concatenate([right_idx, np.full(len(lonely), -1)])
+        distance_m = np.concatenate([distance_m, np.full(len(lonely), np.nan)])
+        order = np.argsort(left_idx, kind='stable')
+        left_idx, right_idx, distance_m = left_idx[order], right_idx[order], distance_m[order]
+
+    return pd.DataFrame({'left_idx': left_idx, 'right_idx': right_idx, 'actual_distance_m': distance_m})
+
+
+def materialize_pairs(df1, df2, pairs):
+    """
+    Builds the joined rows of candidate pairs from find_candidate_pairs: the left
+    row, then the right row (empty for right_idx -1). Columns both sides share are
+    suffixed '_left' and '_right'.
+
+    Args:
+        df1 (DataFrame): The left DataFrame.
+        df2 (DataFrame): The right DataFrame.
+        pairs (DataFrame): Pairs of row positions in df1 and df2.
+
+    Returns:
+        DataFrame: The joined DataFrame, with the left index, an 'index_right' column
+                   and the candidate distance in 'actual_distance_m'.
+    """
+    left_idx, right_idx = pairs['left_idx'].to_numpy(), pairs['right_idx'].to_numpy()
+    overlap = df1.columns.intersection(df2.columns)
+    left_part = df1.iloc[left_idx].rename(columns={col: f"{col}_left" for col in overlap})
+    right_part = df2.reset_index(drop=True).reindex(right_idx) \
+        .rename(columns={col: f"{col}_right" for col in overlap})
+    right_part.index = left_part.index
+
+    joined_df = pd.concat([left_part, right_part], axis=1)
+    joined_df.insert(len(left_part.columns), 'index_right', pd.Series(df2.index).reindex(right_idx).to_numpy())
+    joined_df['actual_distance_m'] = pairs['actual_distance_m'].to_numpy()
+    return joined_df
+
+
+def join_dataframes_by_lat_lon_radius(df1, df2, left_lat='lat1', left_lon='lon1', right_lat='lat2', right_lon='lon2',
+                                      how='inner', distance=50, k=1, right_index=None):
+    """
+    Joins two DataFrames on lat/lon, pairing every left row with up to k right rows
+    within `distance` true metres, found with a haversine BallTree. Unlike
+    join_geodataframes_by_lat_lon_columns nothing is reprojected.
+
+    Args:
+        df1 (DataFrame): The left DataFrame.
+        df2 (DataFrame): The right DataFrame.
+        left_lat (str): The latitude column name in df1.
+        left_lon (str): The longitude column name in df1.
+        right_lat (str): The latitude column name in df2.
+        right_lon (str): The longitude column name in df2.
+        how (str): Type of join. 'inner' or 'left'.
+        distance (float): The maximum distance (in meters) for matching points.
+        k (int): The maximum number of candidates per left row, nearest first.
+        right_index (SpatialIndex): Optional prebuilt index over df2's rows, e.g. from
+                                    spatial_index.load_or_build_spatial_index; df2 must
+                                    hold the indexed file's rows in file order.
+    Returns:
+        DataFrame: The joined DataFrame, with the left index, an 'index_right' column
+                   and the candidate distance in 'actual_distance_m'.
+    """
+    pairs = find_candidate_pairs(df1, df2, left_lat=left_lat, left_lon=left_lon, right_lat=right_lat,
+                                 right_lon=right_lon, how=how, distance=distance, k=k, right_index=right_index)
+    return materialize_pairs(df1, df2, pairs)
+
 def create_geodataframe_from_lat_lon(df, lat_col='latitude', lon_col='longitude', crs='EPSG:4326'):
     """
     Creates a GeoDataFrame from a Pandas DataFrame with latitude and longitude columns.
@@ -90,7 +244,7 @@ def create_geodataframe_from_lat_lon(df, lat_col='latitude', lon_col='longitude'
         GeoDataFrame: The created GeoDataFrame.
     """
 
-    geometry = [Point(xy) for xy in zip(df[lon_col], df[lat_col])]
+    geometry = gpd.points_from_xy(df[lon_col], df[lat_col])
     gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=crs)
     return gdf
 
@@ -0,0 +1,143 @@
+import numpy as np
+from geographiclib.geodesic import Geodesic
+
+# WGS-84 ellipsoid, the same one geopy.distance.geodesic uses
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# mean earth radius (metres) for the spherical approximation
+EARTH_RADIUS_M = 6371008.8
+
+
+def _as_float_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def haversine_distance(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_M):
+    """
+    Great-circle distance in metres between aligned arrays of points on a sphere.
+
+    Any NaN coordinate gives a NaN distance for that row.
+
+    Args:
+        lat1, lon1 (array-like): Latitudes/longitudes (degrees) of the first points.
+        lat2, lon2 (array-like): Latitudes/longitudes (degrees) of the second points.
+        radius (float): Sphere radius in metres.
+
+    Returns:
+        np.ndarray: Distances in metres.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, map(_as_float_array, (lat1, lon1, lat2, lon2)))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_distance(lat1, lon1, lat2, lon2, max_iterations=200, tolerance=1e-12):
+    """
+    Ellipsoidal (WGS-84) distance in metres between aligned arrays of points,
+    using Vincenty's inverse formula iterated on whole arrays at once.
+
+    Rows where the iteration does not converge (nearly antipodal points) are
+    solved with Karney's algorithm from geographiclib, which is what geopy uses.
+    Any NaN coordinate gives a NaN distance for that row.
+
+    Args:
+        lat1, lon1 (array-like): Latitudes/longitudes (degrees) of the first points.
+        lat2, lon2 (array-like): Latitudes/longitudes (degrees) of the second points.
+        max_iterations (int): Iteration cap for the lambda update.
+        tolerance (float): Convergence threshold on lambda (radians).
+
+    Returns:
+        np.ndarray: Distances in metres.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*map(_as_float_array, (lat1, lon1, lat2, lon2)))
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_U2 * sin_lam, cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lam)
+            cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_U1 * cos_U2 * sin_lam / sin_sigma)
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            # equatorial lines have cos_sq_alpha == 0
+            cos_2sigma_m = np.where(cos_sq_alpha == 0, 0.0, cos_sigma - 2 * sin_U1 * sin_U2 / cos_sq_alpha)
+            C = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) <= tolerance
+            if converged[~np.isnan(lam)].all():
+                break
+
+        u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+        A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        distance = b * A * (sigma - delta_sigma)
+
+    distance = np.where(sin_sigma == 0, 0.0, distance)
+    distance[np.isnan(lat1) | np.isnan(lon1) | np.isnan(lat2) | np.isnan(lon2)] = np.nan
+
+    for i in np.flatnonzero(~converged & ~np.isnan(distance)):
+        distance.flat[i] = karney_distance(lat1.flat[i], lon1.flat[i], lat2.flat[i], lon2.flat[i])
+
+    return distance
+
+
+def karney_distance(lat1, lon1, lat2, lon2):
+    """
+    Ellipsoidal (WGS-84) distance in metres using Karney's algorithm
+    (geographiclib), one pair at a time. Exact to geopy.distance.geodesic.
+
+    Args:
+        lat1, lon1 (array-like): Latitudes/longitudes (degrees) of the first points.
+        lat2, lon2 (array-like): Latitudes/longitudes (degrees) of the second points.
+
+    Returns:
+        np.ndarray: Distances in metres.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*map(_as_float_array, (lat1, lon1, lat2, lon2)))
+    distance = np.full(lat1.shape, np.nan)
+    valid = ~(np.isnan(lat1) | np.isnan(lon1) | np.isnan(lat2) | np.isnan(lon2))
+    for i in np.flatnonzero(valid):
+        distance.flat[i] = Geodesic.WGS84.Inverse(lat1.flat[i], lon1.flat[i], lat2.flat[i], lon2.flat[i],
+                                                  Geodesic.DISTANCE)['s12']
+    return distance
+
+
+DISTANCE_METHODS = {
+    'haversine': haversine_distance,
+    'vincenty': vincenty_distance,
+    'karney': karney_distance,
+}
+
+
+def geodesic_distance(lat1, lon1, lat2, lon2, method='vincenty'):
+    """
+    Distance in metres between aligned arrays of lat/lon points.
+
+    Args:
+        lat1, lon1 (array-like): Latitudes/longitudes (degrees) of the first points.
+        lat2, lon2 (array-like): Latitudes/longitudes (degrees) of the second points.
+        method (str): 'vincenty' (vectorized ellipsoidal, sub-millimetre against geopy),
+                      'haversine' (vectorized spherical, fastest) or
+                      'karney' (geographiclib per pair, slowest).
+
+    Returns:
+        np.ndarray: Distances in metres, NaN where any coordinate is NaN.
+    """
+    return DISTANCE_METHODS[method](lat1, lon1, lat2, lon2)
@@ -0,0 +1,159 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from domains.customer.Reader import read_data
+
+# IDs are 'dddd-dddd-dddd', i.e. a 12-digit number
+ID_SPACE = 10 ** 12
+# MASTERPROPERTIES_ID_2 repeats the last eight digits, so those must be unique too
+TAIL_SPACE = 10 ** 8
+MAX_ATTEMPTS = 32
+
+ID_PATTERN = r'(\d{4})-(\d{4})-(\d{4})'
+TAIL_PATTERN = r'[A-Z]{4}-(\d{4})-(\d{4})'
+
+# numbers and last eight digits of the IDs in use, as hashed indexes
+ExistingIds = namedtuple('ExistingIds', ['numbers', 'tails'])
+
+
+def format_ids(numbers):
+    """
+    Formats 12-digit numbers as 'dddd-dddd-dddd' IDs.
+    """
+    digits = pd.Series(np.asarray(numbers, dtype=np.int64)).astype(str).str.zfill(12)
+    return (digits.str[0:4] + '-' + digits.str[4:8] + '-' + digits.str[8:12]).to_numpy(dtype=object)
+
+
+def _parsed_numbers(values, pattern):
+    # the digit groups of the values matching pattern, as one number per value
+    texts = pd.Series(np.asarray(values, dtype=object)).dropna().astype(str)
+    groups = texts.str.extract('^' + pattern + '$').dropna()
+    if groups.empty:
+        return np.empty(0, dtype=np.int64)
+    return groups.iloc[:, 0].str.cat(groups.iloc[:, 1:]).astype(np.int64).to_numpy()
+
+
+def parse_existing_ids(id_values=(), tail_values=()):
+    """
+    Collects the IDs in use from 'dddd-dddd-dddd' values and 'USxx-dddd-dddd'
+    values; anything else is ignored.
+
+    Args:
+        id_values (array-like): MASTERPROPERTIES_ID_1-style values.
+        tail_values (array-like): MASTERPROPERTIES_ID_2-style values.
+
+    Returns:
+        ExistingIds: The taken numbers and taken last eight digits.
+    """
+    numbers = _parsed_numbers(id_values, ID_PATTERN)
+    tails = np.concatenate([numbers % TAIL_SPACE, _parsed_numbers(tail_values, TAIL_PATTERN)])
+    return ExistingIds(pd.Index(np.unique(numbers)), pd.Index(np.unique(tails)))
+
+
+def load_existing_ids(export_path, id_columns=('MASTERPROPERTIES_ID', 'MASTERPROPERTIES_ID_1'),
+                      tail_columns=('MASTERPROPERTIES_ID_2',)):
+    """
+    Loads the IDs in use from a DB export, once per run.
+
+    Args:
+        export_path (str): The DB export, e.g. the school export.
+        id_columns (tuple): Columns holding 'dddd-dddd-dddd' IDs, where present.
+        tail_columns (tuple): Columns holding 'USxx-dddd-dddd' IDs, where present.
+
+    Returns:
+        ExistingIds: The taken numbers and taken last eight digits.
+    """
+    export = read_data(export_path)
+    return parse_existing_ids(
+        np.concatenate([export[col].to_numpy(dtype=object) for col in id_columns if col in export.columns] or [[]]),
+        np.concatenate([export[col].to_numpy(dtype=object) for col in tail_columns if col in export.columns] or [[]]),
+    )
+
+
+def _keyed_numbers(keys, attempt):
+    # stable across runs and machines: pandas hashes with a fixed key
+    salted = pd.Series(keys, dtype=object).astype(str) + f"#{attempt}"
+    return (pd.util.hash_array(salted.to_numpy(dtype=object)) % np.uint64(ID_SPACE)).astype(np.int64)
+
+
+def allocate_ids(n, existing=None, keys=None, seed=None):
+    """
+    Allocates n new 'dddd-dddd-dddd' IDs at once. No ID, nor its last eight digits
+    (which MASTERPROPERTIES_ID_2 repeats), is in use in `existing` or given twice
+    in the batch; clashing candidates are drawn again, in bulk, until none are left.
+
+    With keys, IDs are derived from them (e.g. FOCUS_ID) instead of drawn at
+    random, so a rerun gives the same IDs as long as no new clash comes up. Rows
+    with the same key get the same ID.
+
+    Args:
+        n (int): Number of IDs.
+        existing (ExistingIds): IDs in use, e.g. from load_existing_ids.
+        keys (array-like): Optional key of every row, for deterministic IDs.
+        seed (int): Seed of the random IDs.
+
+    Returns:
+        np.ndarray: n IDs.
+
+    Raises:
+        RuntimeError: If clashes remain after MAX_ATTEMPTS rounds.
+    """
+    if existing is None:
+        existing = parse_existing_ids()
+    if keys is None:
+        codes, uniques = np.arange(n), None
+        rng = np.random.default_rng(seed)
+    else:
+        codes, uniques = pd.factorize(np.asarray(keys, dtype=object), use_na_sentinel=False)
+        if len(codes) != n:
+            raise ValueError(f"Got {len(codes)} keys for {n} IDs.")
+    taken_numbers, taken_tails = existing.numbers, existing.tails
+
+    numbers = np.full(n if uniques is None else len(uniques), -1, dtype=np.int64)
+    pending = np.arange(len(numbers))
+    for attempt in range(MAX_ATTEMPTS):
+        if not len(pending):
+            break
+        if uniques is None:
+            candidates = rng.integers(0, ID_SPACE, size=len(pending))
+        else:
+            candidates = _keyed_numbers(uniques[pending], attempt)
+        tails = candidates % TAIL_SPACE
+        # a unique tail also makes the whole number unique within the batch
+        accepted = ~pd.Index(candidates).isin(taken_numbers) & ~pd.Index(tails).isin(taken_tails) \
+            & ~pd.Series(tails).duplicated().to_numpy()
+        numbers[pending[accepted]] = candidates[accepted]
+        taken_numbers = taken_numbers.append(pd.Index(candidates[accepted]))
+        taken_tails = taken_tails.append(pd.Index(tails[accepted]))
+        pending = pending[~accepted]
+
+    if len(pending):
+        raise RuntimeError(f"Could not allocate {len(pending)} IDs without clashes in {MAX_ATTEMPTS} attempts.")
+    return format_ids(numbers[codes])
+
+
+def keep_or_allocate_ids(current_ids, existing=None, keys=None, seed=None):
+    """
+    Keeps the 'dddd-dddd-dddd' IDs records already have (e.g. from their master
+    record in the DB export) and allocates new ones (see allocate_ids) for the
+    others only. A loaded record's own ID is in the export, so drawing it
+    again would count it as taken and give the record a new ID on every run.
+
+    Args:
+        current_ids (array-like): Every record's ID so far; missing or malformed
+                                  for records that need a new one.
+        existing (ExistingIds): IDs in use, e.g. from load_existing_ids.
+        keys (array-like): Optional key of every record, for deterministic new IDs.
+        seed (int): Seed of the random new IDs.
+
+    Returns:
+        np.ndarray: An ID per record.
+    """
+    ids = pd.Series(np.asarray(current_ids, dtype=object)).astype('string').str.strip()
+    new = ~ids.str.fullmatch(ID_PATTERN).fillna(False).to_numpy(dtype=bool)
+    ids = ids.to_numpy(dtype=object, na_value=np.nan)
+    ids[new] = allocate_ids(int(new.sum()), existing,
+                            keys=None if keys is None else np.asarray(keys, dtype=object)[new], seed=seed)
+    return ids
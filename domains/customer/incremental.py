@@ -0,0 +1,116 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+STATE_FORMAT_VERSION = 5
+
+
+def focus_id_hashes(focus_data, id_col='FOCUS_SCHOOL_ID'):
+    """
+    Content hash of every Focus school: the hashes of all its rows, combined.
+    Rows without an ID are left out.
+
+    Args:
+        focus_data (pd.DataFrame): Focus schools.
+        id_col (str): The Focus school ID column.
+
+    Returns:
+        pd.Series: uint64 hash per Focus school ID.
+    """
+    row_hashes = pd.Series(pd.util.hash_pandas_object(focus_data, index=False).to_numpy(), index=focus_data.index)
+    # summing (with uint64 wrap-around) does not depend on the order of a school's rows
+    return row_hashes.groupby(focus_data[id_col].to_numpy()).sum()
+
+
+def load_match_state(state_path):
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != STATE_FORMAT_VERSION:
+        return None
+    return state
+
+
+def save_match_state(state_path, state):
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, state_path)
+
+
+def match_incrementally(focus_data, nces_data, nces_index, state_path, match_func, id_col='FOCUS_SCHOOL_ID',
+                        match_settings=None):
+    """
+    Runs match_func only for Focus schools that are new or changed since the last
+    run and carries the previous decisions (their quarantine ledger rows) forward
+    for the rest. Everything is matched again when the NCES file, the Focus columns
+    or match_settings changed, or there is no saved state. Rows without a Focus
+    school ID cannot be recognized between runs, so they are matched every time.
+
+    match_func must decide each Focus school from its own rows only, like
+    school_mastering.match_focus_to_nces; checks across schools (e.g. duplicate
+    NCES matches) belong after this step, on the merged result.
+
+    Args:
+        focus_data (pd.DataFrame): The full Focus export, columns prefixed 'FOCUS_'.
+        nces_data (pd.DataFrame): NCES locations, columns prefixed 'NCES_'.
+        nces_index (SpatialIndex): Optional prebuilt index over nces_data.
+        state_path (str): Where the hashes and decisions are kept between runs.
+        match_func (callable): (focus_data, nces_data, nces_index) -> quarantine ledger.
+        id_col (str): The Focus school ID column.
+        match_settings (dict): Settings match_func was built with (e.g. candidates
+                               per school and a fingerprint of its rules, see
+                               school_mastering.match_rules_fingerprint); ledgers
+                               of other settings are not reused.
+
+    Returns:
+        pd.DataFrame: The quarantine ledger for the whole Focus export.
+    """
+    hashes = focus_id_hashes(focus_data, id_col)
+    if nces_index is not None:
+        nces_hash = nces_index.source_hash
+    else:
+        nces_hash = int(pd.util.hash_pandas_object(nces_data, index=False).sum())
+
+    state = load_match_state(state_path)
+    if state is None:
+        print("No saved match state, matching every Focus school")
+        changed_ids = hashes.index
+    elif state['nces_hash'] != nces_hash or state['focus_columns'] != list(focus_data.columns) \
+            or state['match_settings'] != match_settings:
+        print("NCES file, Focus columns or match settings changed, matching every Focus school")
+        changed_ids = hashes.index
+    else:
+        previous_hashes = state['focus_hashes']
+        known = hashes.index.isin(previous_hashes.index)
+        unchanged = np.zeros(hashes.size, dtype=bool)
+        unchanged[known] = previous_hashes.loc[hashes.index[known]].to_numpy() == hashes.to_numpy()[known]
+        changed_ids = hashes.index[~unchanged]
+
+    without_id = focus_data[id_col].isna()
+    changed = focus_data[id_col].isin(changed_ids) | without_id
+    print(f"Matching {changed_ids.size} new or changed of {hashes.size} Focus schools"
+          + (f", and {without_id.sum()} rows without an ID" if without_id.any() else ""))
+    if changed.any() or state is None:
+        ledger = match_func(focus_data[changed], nces_data, nces_index)
+    else:
+        ledger = state['ledger'].iloc[:0]
+
+    if state is not None and changed_ids.size < hashes.size:
+        # ids missing from the new export are dropped along with the changed ones
+        carried_ids = hashes.index.difference(changed_ids)
+        ledger = pd.concat([state['ledger'][state['ledger'][id_col].isin(carried_ids)], ledger], ignore_index=True)
+
+    save_match_state(state_path, {
+        'version': STATE_FORMAT_VERSION,
+        'nces_hash': nces_hash,
+        'focus_columns': list(focus_data.columns),
+        'match_settings': match_settings,
+        'focus_hashes': hashes,
+        'ledger': ledger,
+    })
+    return ledger
@@ -0,0 +1,212 @@
+import contextlib
+import cProfile
+import datetime
+import functools
+import json
+import os
+import platform
+import resource
+import time
+
+import pandas as pd
+
+# Stage-level metrics for a run: wall and CPU time, peak RSS, rows in and out
+# and rows per second of every stage, collected into a run report that is
+# written as JSON. Stages can also be profiled with cProfile, one dump each.
+
+# stage records being collected, innermost last; record_count() adds to the last one
+_active_stages = []
+
+
+def new_run_report(name, **settings):
+    """
+    Starts an empty run report.
+
+    Args:
+        name (str): What ran, e.g. 'pipeline'.
+        settings: The run's settings, kept in the report as they are.
+
+    Returns:
+        dict: The report; stage() appends a record to its 'stages'.
+    """
+    return {
+        'run': name,
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'settings': settings,
+        'stages': [],
+    }
+
+
+def count_rows(value):
+    """
+    The rows of a stage's input or output: a frame's length, the first frame of
+    a tuple, or the total over a dict of frames. None for anything else.
+    """
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, dict):
+        frames = [df for df in value.values() if isinstance(df, pd.DataFrame)]
+        return sum(len(df) for df in frames) if frames else None
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    return None
+
+
+def _cpu_seconds():
+    # this process and its finished children (e.g. the matching workers)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _reset_peak_rss():
+    # Linux lets a process reset its high-water mark; elsewhere the peak is the process's so far
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _max_rss_mb():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if platform.system() == 'Darwin' else peak / 1024
+
+
+def _peak_rss_mb():
+    # the high-water mark since the last reset, where /proc has one
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _max_rss_mb()
+
+
+def record_count(name, value):
+    """
+    Records a count (e.g. the records of one quarantine reason) in the stage
+    being measured, if any, next to its timings.
+    """
+    if _active_stages:
+        _active_stages[-1].setdefault('counts', {})[name] = int(value)
+
+
+@contextlib.contextmanager
+def stage(report, name, rows_in=None, profile_dir=None):
+    """
+    Measures the code in the with block as one stage of report.
+
+        with stage(report, 'score', rows_in=len(pairs)) as record:
+            scored = score_pairs(pairs)
+            record['rows_out'] = len(scored)
+
+    The stage's record gets its wall and CPU seconds, its peak RSS in MB (the
+    stage's own on Linux, the process's so far elsewhere), rows_in and rows_out
+    and rows_per_second (rows_in, or rows_out without them, over wall seconds).
+    It is appended to report['stages'] even if the block raises. Stages
+    opened inside another stage get depth 1 and up; only depth 0 stages count
+    towards the run's totals.
+
+    Args:
+        report (dict): From new_run_report.
+        name (str): The stage name.
+        rows_in (int): The rows the stage reads, where known.
+        profile_dir (str): Profile the block with cProfile and dump the stats to
+                           '<profile_dir>/<name>.prof' (see pstats).
+
+    Yields:
+        dict: The stage's record, for rows_out and any other fields.
+    """
+    record = {'stage': name, 'depth': len(_active_stages), 'rows_in': rows_in, 'rows_out': None}
+    profiler = cProfile.Profile() if profile_dir else None
+    # resetting the high-water mark must not lose the peaks of enclosing stages
+    peak_so_far = _peak_rss_mb()
+    for outer in _active_stages:
+        outer['peak_rss_mb'] = max(outer.get('peak_rss_mb', 0.0), peak_so_far)
+    _active_stages.append(record)
+    _reset_peak_rss()
+    start_wall, start_cpu = time.perf_counter(), _cpu_seconds()
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler:
+            profiler.disable()
+        wall = time.perf_counter() - start_wall
+        record['wall_seconds'] = round(wall, 4)
+        record['cpu_seconds'] = round(_cpu_seconds() - start_cpu, 4)
+        record['peak_rss_mb'] = round(max(record.get('peak_rss_mb', 0.0), _peak_rss_mb()), 1)
+        rows = record['rows_in'] if record['rows_in'] is not None else record['rows_out']
+        record['rows_per_second'] = round(rows / wall, 1) if rows is not None and wall > 0 else None
+        _active_stages.remove(record)
+        report['stages'].append(record)
+        if profiler:
+            os.makedirs(profile_dir, exist_ok=True)
+            record['profile'] = os.path.join(profile_dir, f'{name}.prof')
+            profiler.dump_stats(record['profile'])
+
+
+def measure(report, name, func, *args, profile_dir=None, **kwargs):
+    """
+    Runs func(*args, **kwargs) as one stage of report, taking its rows in from
+    its first argument and its rows out from its result (see count_rows).
+
+    Returns:
+        The stage's result.
+    """
+    with stage(report, name, rows_in=count_rows(args[0]) if args else None, profile_dir=profile_dir) as record:
+        result = func(*args, **kwargs)
+        record['rows_out'] = count_rows(result)
+    return result
+
+
+def instrumented(report, name=None, profile_dir=None):
+    """
+    Decorator form of measure: every call of the function is a stage of report,
+    named after the function unless name is given.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return measure(report, name or func.__name__, func, *args, profile_dir=profile_dir, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _top_level_stages(report):
+    # nested stages are already inside their parent's time
+    return [record for record in report['stages'] if record.get('depth', 0) == 0]
+
+
+def finish_run_report(report):
+    """
+    Adds the run's totals to report: wall and CPU seconds over its top-level
+    stages and the process's peak RSS.
+    """
+    top_level = _top_level_stages(report)
+    report['total_wall_seconds'] = round(sum(record['wall_seconds'] for record in top_level), 4)
+    report['total_cpu_seconds'] = round(sum(record['cpu_seconds'] for record in top_level), 4)
+    report['max_rss_mb'] = round(_max_rss_mb(), 1)
+    return report
+
+
+def write_run_report(report, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote run report to {path}")
+
+
+def print_stage_summary(report):
+    print("Stage timings:")
+    for record in report['stages']:
+        rows = f"{record['rows_out']:>10} rows" if record['rows_out'] is not None else " " * 15
+        print(f"  {record['stage']:<20} {record['wall_seconds']:8.2f}s {record['cpu_seconds']:8.2f}s cpu "
+              f"{record['peak_rss_mb']:8.0f} MB {rows}")
+    print(f"  {'total':<20} {sum(record['wall_seconds'] for record in _top_level_stages(report)):8.2f}s")
@@ -1,20 +1,83 @@
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 
-def add_similarity_score(df, col1, col2, new_col_name='similarity_score'):
+SCORERS = {
+    'ratio': fuzz.ratio,
+    'token_sort_ratio': fuzz.token_sort_ratio,
+    'WRatio': fuzz.WRatio,
+}
+
+
+def similarity_scores(left, right, scorer=fuzz.ratio, workers=-1):
+    """
+    Scores two aligned string columns pair by pair using rapidfuzz's batched
+    cpdist, spread across all cores.
+
+    Pairs where either side is null score 0, matching what fuzz.ratio returns
+    for a None/NaN argument.
+
+    Args:
+        left (pd.Series): The first column of strings.
+        right (pd.Series): The second column of strings, aligned with `left`.
+        scorer (callable or str): A rapidfuzz scorer, or one of the names in SCORERS.
+        workers (int): Number of threads to use; -1 uses all cores.
+
+    Returns:
+        np.ndarray: A float64 array of similarity scores (0-100), one per row.
+    """
+    if isinstance(scorer, str):
+        scorer = SCORERS[scorer]
+
+    left = pd.Series(left)
+    right = pd.Series(right)
+    missing = (left.isna().to_numpy() | right.isna().to_numpy())
+
+    scores = process.cpdist(
+        left.fillna('').astype(str).tolist(),
+        right.fillna('').astype(str).tolist(),
+        scorer=scorer,
+        workers=workers,
+        dtype=np.float64,
+    )
+    return np.where(missing, 0.0, scores)
+
+
+def add_similarity_scores(df, column_pairs, workers=-1):
+    """
+    Adds several similarity score columns to the DataFrame in one call.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to modify.
+        column_pairs (list): Tuples of (col1, col2, new_col_name) or
+                             (col1, col2, new_col_name, scorer). The scorer
+                             defaults to fuzz.ratio and may be given by name.
+        workers (int): Number of threads to use; -1 uses all cores.
+
+    Returns:
+        pd.DataFrame: The modified DataFrame with the new similarity score columns.
+    """
+    for pair in column_pairs:
+        col1, col2, new_col_name = pair[:3]
+        scorer = pair[3] if len(pair) > 3 else fuzz.ratio
+        df[new_col_name] = similarity_scores(df[col1], df[col2], scorer=scorer, workers=workers)
+    return df
+
+
+def add_similarity_score(df, col1, col2, new_col_name='similarity_score', scorer=fuzz.ratio):
     """
     Adds a column to the DataFrame containing the similarity score between two name columns,
-    using rapidfuzz's fuzz.ratio().
+    using rapidfuzz's fuzz.ratio() by default.
 
     Args:
         df (pd.DataFrame): The DataFrame to modify.
         col1 (str): The name of the first column to compare.
         col2 (str): The name of the second column to compare.
         new_col_name (str): The name of the new column to add.
+        scorer (callable or str): The rapidfuzz scorer to use.
 
     Returns:
         pd.DataFrame: The modified DataFrame with the new similarity score column.
     """
 
-    df[new_col_name] = df.apply(lambda row: fuzz.ratio(row[col1], row[col2]), axis=1)
-    return df
\ No newline at end of file
+    return add_similarity_scores(df, [(col1, col2, new_col_name, scorer)])
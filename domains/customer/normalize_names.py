@@ -1,6 +1,35 @@
 import pandas as pd
 import re  # Regular expression library
 
+from domains.customer.distinct_values import apply_to_distinct
+
+
+def _normalize_name_series(series):
+    # Make sure the column is treated as string, handle NaNs
+    # Convert NaN to empty string '' BEFORE string operations
+    series = series.fillna('').astype(str)
+
+    # --- Apply Normalization Steps ---
+    # 1. Convert to uppercase (change to .str.lower() if you prefer lowercase)
+    series = series.str.lower()
+
+    # 2. Remove specific punctuation: '.', ',', '\''
+    series = series.str.replace('.', '', regex=False)
+    series = series.str.replace(',', '', regex=False)
+    series = series.str.replace('\'', '', regex=False)
+
+    # 3. Replace hyphens and underscores with spaces
+    series = series.str.replace('-', ' ', regex=False)
+    series = series.str.replace('_', ' ', regex=False)
+
+    # 4. Trim leading/trailing whitespace
+    series = series.str.strip()
+
+    # 5. Collapse multiple internal spaces into a single space
+    series = series.str.replace(r'\s+', ' ', regex=True)
+    # --- End of Normalization Steps ---
+    return series
+
 
 def normalize_dataframe_columns(df, cols_to_normalize):
     """
@@ -35,29 +64,9 @@ def normalize_dataframe_columns(df, cols_to_normalize):
 
         new_col_name = f"{col_name}_standardized"
 
-        # Make sure the column is treated as string, handle NaNs
-        # Convert NaN to empty string '' BEFORE string operations
-        df_normalized[new_col_name] = df_normalized[col_name].fillna('').astype(str)
-
-        # --- Apply Normalization Steps ---
-        # 1. Convert to uppercase (change to .str.lower() if you prefer lowercase)
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.lower()
-
-        # 2. Remove specific punctuation: '.', ',', '\''
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.replace('.', '', regex=False)
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.replace(',', '', regex=False)
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.replace('\'', '', regex=False)
-
-        # 3. Replace hyphens and underscores with spaces
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.replace('-', ' ', regex=False)
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.replace('_', ' ', regex=False)
-
-        # 4. Trim leading/trailing whitespace
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.strip()
-
-        # 5. Collapse multiple internal spaces into a single space
-        df_normalized[new_col_name] = df_normalized[new_col_name].str.replace(r'\s+', ' ', regex=True)
-        # --- End of Normalization Steps ---
+        # The columns repeat a lot after the geo join, so normalize each distinct value once
+        df_normalized[new_col_name] = apply_to_distinct(df_normalized[col_name], _normalize_name_series,
+                                                        vectorized=True, cache_name='normalize_names')
 
     return df_normalized
 
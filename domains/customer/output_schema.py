@@ -0,0 +1,118 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Rules for one output column, evaluated column-wise over the whole frame. Wherever
+# a rule takes another rule, a plain string stands for Column(string).
+
+# the same value on every row
+Constant = namedtuple('Constant', ['value'])
+# a column of the input, or an output column built earlier in the spec; a missing
+# optional column is left out of the output, like DataFrame.filter does, and has
+# only missing values inside other rules
+Column = namedtuple('Column', ['name', 'optional'], defaults=(False,))
+# text left-padded with zeros to width; missing values stay missing
+ZeroPadded = namedtuple('ZeroPadded', ['rule', 'width'])
+# numbers (or numeric text) as integer text, e.g. 100005.0 -> '100005'; missing or non-numeric values become missing
+IntegerText = namedtuple('IntegerText', ['rule'])
+# values mapped through a dict; values missing from it become missing
+Lookup = namedtuple('Lookup', ['rule', 'mapping'])
+# True where the rule's value is not missing
+Present = namedtuple('Present', ['rule'])
+# if_true where condition is True, else if_false
+Where = namedtuple('Where', ['condition', 'if_true', 'if_false'])
+# the rules' values joined as text; missing if any part is missing
+Concat = namedtuple('Concat', ['parts'])
+# text[start:stop]
+Substring = namedtuple('Substring', ['rule', 'start', 'stop'])
+# func(n) -> array of n values, for generated values such as new IDs
+Generated = namedtuple('Generated', ['func'])
+
+
+def _as_text(values):
+    # like str(value) for every value that is not missing
+    values = values.astype(object)
+    return values.where(values.isna(), values.astype(str))
+
+
+def _column(column, df, built):
+    if column.name in built:
+        return built[column.name]
+    if column.optional and column.name not in df.columns:
+        return pd.Series(np.nan, index=df.index, dtype=object)
+    return df[column.name]
+
+
+def evaluate_rule(rule, df, built=None):
+    """
+    Evaluates one output rule over every row of df.
+
+    Args:
+        rule: One of the rules above, or a column name.
+        df (pd.DataFrame): The input rows.
+        built (dict): Output columns built so far, by name; they shadow input
+                      columns of the same name.
+
+    Returns:
+        pd.Series: The rule's value for every row, on df's index.
+    """
+    built = {} if built is None else built
+    if isinstance(rule, str):
+        rule = Column(rule)
+
+    if isinstance(rule, Constant):
+        return pd.Series(rule.value, index=df.index, dtype=object)
+    if isinstance(rule, Column):
+        return _column(rule, df, built)
+    if isinstance(rule, ZeroPadded):
+        return _as_text(evaluate_rule(rule.rule, df, built)).str.zfill(rule.width)
+    if isinstance(rule, IntegerText):
+        values = pd.to_numeric(evaluate_rule(rule.rule, df, built), errors='coerce')
+        if values.dtype.kind == 'f':
+            values = np.trunc(values)
+        integers = values.astype('Int64')
+        return integers.astype(str).astype(object).where(integers.notna(), np.nan)
+    if isinstance(rule, Lookup):
+        return evaluate_rule(rule.rule, df, built).map(rule.mapping)
+    if isinstance(rule, Present):
+        return evaluate_rule(rule.rule, df, built).notna()
+    if isinstance(rule, Where):
+        condition = evaluate_rule(rule.condition, df, built).to_numpy(dtype=bool)
+        if_true = evaluate_rule(rule.if_true, df, built).to_numpy(dtype=object)
+        if_false = evaluate_rule(rule.if_false, df, built).to_numpy(dtype=object)
+        return pd.Series(np.where(condition, if_true, if_false), index=df.index)
+    if isinstance(rule, Concat):
+        parts = [_as_text(evaluate_rule(part, df, built)) for part in rule.parts]
+        joined = parts[0]
+        for part in parts[1:]:
+            joined = joined + part
+        return joined
+    if isinstance(rule, Substring):
+        return _as_text(evaluate_rule(rule.rule, df, built)).str.slice(rule.start, rule.stop)
+    if isinstance(rule, Generated):
+        return pd.Series(rule.func(len(df)), index=df.index)
+    raise TypeError(f"Unknown output rule {rule!r}.")
+
+
+def build_records(df, spec):
+    """
+    Builds output records from a spec, one column at a time, with no per-row
+    Python.
+
+    Args:
+        df (pd.DataFrame): The input rows.
+        spec (list): (output column, rule) pairs, in output column order. A rule
+                     may use the output columns before it.
+
+    Returns:
+        pd.DataFrame: The output columns, on df's index.
+    """
+    built = {}
+    for output_column, rule in spec:
+        if isinstance(rule, str):
+            rule = Column(rule)
+        if isinstance(rule, Column) and rule.optional and rule.name not in built and rule.name not in df.columns:
+            continue
+        built[output_column] = evaluate_rule(rule, df, built)
+    return pd.DataFrame(built, index=df.index)
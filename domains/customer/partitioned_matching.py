@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from domains.customer.geo_matching import build_haversine_index
+from domains.customer.spatial_index import SpatialIndex
+
+# metres per degree of latitude (and of longitude at the equator), rounded down
+METERS_PER_DEGREE = 111_000.0
+
+_MISSING_STATE = ''
+
+
+def _expanded_bbox_mask(lat, lon, part_lat, part_lon, buffer_m):
+    # rows of (lat, lon) inside the partition's bounding box grown by buffer_m on every side
+    if np.isnan(part_lat).all() or np.isnan(part_lon).all():
+        return np.zeros(len(lat), dtype=bool)
+    lat_pad = buffer_m / METERS_PER_DEGREE
+    min_lat, max_lat = np.nanmin(part_lat) - lat_pad, np.nanmax(part_lat) + lat_pad
+    within = (lat >= min_lat) & (lat <= max_lat)
+
+    widest_lat = min(max(abs(min_lat), abs(max_lat)), 89.0)
+    lon_pad = buffer_m / (METERS_PER_DEGREE * np.cos(np.radians(widest_lat)))
+    min_lon, max_lon = np.nanmin(part_lon) - lon_pad, np.nanmax(part_lon) + lon_pad
+    if min_lon > -180 and max_lon < 180:
+        # a box crossing the antimeridian keeps every longitude
+        within &= (lon >= min_lon) & (lon <= max_lon)
+    return within
+
+
+def partition_by_state(focus_data, nces_data, focus_state='FOCUS_STATE', nces_state='NCES_STATE',
+                       focus_lat='FOCUS_ADDRESS_LATITUDE', focus_lon='FOCUS_ADDRESS_LONGITUDE',
+                       nces_lat='NCES_LAT', nces_lon='NCES_LON', border_buffer_m=None):
+    """
+    Splits Focus schools by state and pairs each state's schools with the NCES
+    schools they can match.
+
+    Without a border buffer a state's schools only see NCES schools of the same
+    state. With one, they see every NCES school inside their bounding box grown by
+    border_buffer_m, whatever its state; with a buffer of at least the match
+    radius every partition finds the candidates an unpartitioned run does.
+
+    Args:
+        focus_data (pd.DataFrame): Focus schools.
+        nces_data (pd.DataFrame): NCES locations.
+        focus_state, nces_state (str): The state columns.
+        focus_lat, focus_lon, nces_lat, nces_lon (str): The coordinate columns.
+        border_buffer_m (float): Optional buffer (in meters) around each partition.
+
+    Returns:
+        list: (state, focus part, nces part) tuples, ordered by state. Focus schools
+              without a state form the '' partition.
+    """
+    states = focus_data[focus_state].fillna(_MISSING_STATE).astype(str).to_numpy()
+    nces_states = nces_data[nces_state].fillna(_MISSING_STATE).astype(str).to_numpy()
+    nces_lat_values = nces_data[nces_lat].to_numpy(dtype=np.float64, na_value=np.nan)
+    nces_lon_values = nces_data[nces_lon].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    partitions = []
+    for state in np.unique(states):
+        focus_part = focus_data[states == state]
+        if border_buffer_m is None:
+            nces_mask = nces_states == state
+        else:
+            nces_mask = _expanded_bbox_mask(
+                nces_lat_values, nces_lon_values,
+                focus_part[focus_lat].to_numpy(dtype=np.float64, na_value=np.nan),
+                focus_part[focus_lon].to_numpy(dtype=np.float64, na_value=np.nan),
+                border_buffer_m)
+        partitions.append((state, focus_part, nces_data[nces_mask]))
+    return partitions
+
+
+def _match_partition(match_func, focus_part, nces_part, coords=None):
+    index = None
+    if coords is not None:
+        # a BallTree cannot be cut down to some of its points, so the partition gets its own
+        # tree, built from the persisted index's coordinates of its rows
+        tree, row_ids = build_haversine_index(coords[:, 0], coords[:, 1])
+        index = SpatialIndex(tree=tree, row_ids=row_ids, coords=coords, source_hash=None)
+    return match_func(focus_part, nces_part, index)
+
+
+def match_partitioned(focus_data, nces_data, match_func, workers=None, border_buffer_m=None, nces_index=None,
+                      **partition_kwargs):
+    """
+    Runs match_func per state partition in a process pool and concatenates the
+    partitions' quarantine ledgers in the order of the input Focus rows, so the
+    result does not depend on the number of workers or on scheduling.
+
+    Every partition builds a BallTree over its own NCES rows. Given nces_index,
+    the trees are built from its coordinates, so candidates and distances are
+    the same as an unpartitioned run with that index; otherwise from the NCES
+    columns, whose parsed coordinates can differ from the index's in the last
+    bits (distances and scores then differ by around 1e-9, decisions do not).
+
+    Args:
+        focus_data (pd.DataFrame): Focus schools.
+        nces_data (pd.DataFrame): NCES locations.
+        match_func (callable): (focus_data, nces_data, nces_index) -> quarantine
+                               ledger, e.g. school_mastering.match_focus_to_nces.
+                               Must be a module-level function.
+        workers (int): Number of processes; defaults to the CPU count.
+        border_buffer_m (float): See partition_by_state.
+        nces_index (SpatialIndex): Optional prebuilt index over nces_data.
+        **partition_kwargs: Column names for partition_by_state.
+
+    Returns:
+        pd.DataFrame: The quarantine ledger of all partitions.
+    """
+    # remembers each Focus row's input position through the match
+    focus_data = focus_data.assign(_focus_row=np.arange(len(focus_data)))
+    partitions = partition_by_state(focus_data, nces_data, border_buffer_m=border_buffer_m, **partition_kwargs)
+    print(f"Matching {len(partitions)} state partitions")
+
+    if nces_index is None:
+        coords = [None] * len(partitions)
+    else:
+        coords = [nces_index.coords[nces_data.index.get_indexer(nces_part.index)] for _, _, nces_part in partitions]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        ledgers = list(executor.map(_match_partition, [match_func] * len(partitions),
+                                    [focus_part for _, focus_part, _ in partitions],
+                                    [nces_part for _, _, nces_part in partitions], coords))
+
+    ledger = pd.concat(ledgers, ignore_index=True)
+    return ledger.sort_values('_focus_row', kind='stable', ignore_index=True).drop(columns=['_focus_row'])
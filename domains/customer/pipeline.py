@@ -0,0 +1,229 @@
+import sys
+sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
+
+import argparse
+import os
+
+from domains.customer.customer_mastering import master_customers
+from domains.customer.entity_clustering import QUARANTINE_CLUSTER
+from domains.customer.generate_delta import content_delta_outputs
+from domains.customer.instrumentation import finish_run_report, measure, new_run_report, print_stage_summary, \
+    write_run_report
+from domains.customer.prettify_customers import customer_prettifier
+from domains.customer.prettify_schools import SCHOOL_EXPORT_FILE, school_prettifier
+from domains.customer.Reader import read_data
+from domains.customer.reconciliation import CATEGORY_COL, reconcile, reconciliation_report
+from domains.customer.school_mastering import DUPLICATE_RESOLUTIONS, load_focus_data, load_nces_data, load_sf_data, \
+    load_mastered_schools, master_schools, master_schools_streaming, merge_focus_with_sf
+from domains.customer.source_schemas import SCHOOL_EXPORT_SCHEMA
+
+
+# the stages --profile-dir profiles
+HOT_STAGES = ['master_schools', 'prettify_schools', 'master_customers', 'school_delta']
+
+
+def run_stage(report, name, func, *args, **kwargs):
+    """
+    Runs one pipeline stage and records its metrics in the run report (see
+    instrumentation.measure), profiling it if the run profiles this stage.
+
+    Args:
+        report (dict): The run report, from instrumentation.new_run_report.
+        name (str): The stage name to report.
+        func (callable): The stage.
+
+    Returns:
+        The stage's result.
+    """
+    settings = report['settings']
+    profile_dir = settings['profile_dir'] if name in settings['profile_stages'] else None
+    print(f"=== {name} ===")
+    result = measure(report, name, func, *args, profile_dir=profile_dir, **kwargs)
+    record = report['stages'][-1]
+    print(f"=== {name} took {record['wall_seconds']:.2f}s ({record['cpu_seconds']:.2f}s CPU, "
+          f"peak RSS {record['peak_rss_mb']:.0f} MB) ===")
+    return result
+
+
+def write_outputs(outputs):
+    for path, df in outputs.items():
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        df.to_csv(path)
+        print(f"Wrote {len(df)} rows to {path}")
+
+
+def reconcile_schools(schools_df, other_path, other_column='NCES_NCESSCH'):
+    """
+    Compares the mastered schools with another match output keyed by
+    FOCUS_SCHOOL_ID, e.g. an earlier run or a vendor's file (see reconciliation).
+
+    Returns:
+        tuple: (reconciled, report) DataFrames.
+    """
+    reconciled = reconcile(schools_df, read_data(other_path, use_cache=False), right_col=other_column)
+    report = reconciliation_report(reconciled)
+    counts = reconciled[CATEGORY_COL].value_counts()
+    print(f"Against {other_path}: " + ", ".join(f"{count} {category}" for category, count in counts.items()))
+    overall = report.iloc[0]
+    print(f"Precision {overall['precision']:.3f}, recall {overall['recall']:.3f}, "
+          f"conflict rate {overall['conflict_rate']:.3f}")
+    return reconciled, report
+
+
+def run_pipeline(file_date_suffix, output_dir='outputs', write_intermediate=True, run_focus_sf_merge=False,
+                 incremental=False, workers=None, stream_chunk_rows=None,
+                 deterministic_ids=False, changed_columns_only=False, duplicate_resolution=QUARANTINE_CLUSTER,
+                 reconcile_with=None, reconcile_column='NCES_NCESSCH', report_path=None, profile_dir=None,
+                 profile_stages=HOT_STAGES):
+    """
+    Runs school mastering, school prettifying, customer mastering and customer
+    prettifying in one process. Each source file is parsed once and the stages
+    hand DataFrames to each other; CSVs are only written at the end. The pretty
+    schools are also written split into creates, updates and no-ops (compared
+    field by field with the DB export), under schools/delta.
+
+    Args:
+        file_date_suffix (str): Suffix of the output file names.
+        output_dir (str): Directory holding the 'schools' and 'customers' outputs.
+        write_intermediate (bool): Also write the mastered (not prettified) schools
+                                   and customers, as the separate scripts did.
+        run_focus_sf_merge (bool): Also run and write the Focus/Salesforce merge.
+        incremental (bool): Only match Focus schools changed since the last
+                            incremental run, keeping state under output_dir.
+        workers (int): Match Focus schools state by state in this many processes.
+        stream_chunk_rows (int): Match the Focus export in chunks of this many rows,
+                                 writing the schools outputs as it goes (see
+                                 school_mastering.master_schools_streaming).
+                                 The mastered schools are then read back for
+                                 the later stages. Not with incremental.
+        deterministic_ids (bool): Derive new school IDs from the Focus school ID,
+                                  so reruns give the same IDs.
+        changed_columns_only (bool): Only write the key and the changed fields to
+                                     the school updates output.
+        duplicate_resolution (str): Quarantine every Focus school of a cluster
+                                    matched to the same NCES school, keep the best
+                                    scoring one, or assign Focus and NCES schools
+                                    one to one (see master_schools). Not
+                                    'assignment' when streaming.
+        reconcile_with (str): Another match output to compare the mastered
+                              schools with; the per-school categories and the
+                              rates go under schools/reconciliation.
+        reconcile_column (str): The NCES ID column of reconcile_with.
+        report_path (str): Where to write the JSON run report (see
+                           instrumentation); defaults to
+                           run_report_<file_date_suffix>.json under output_dir.
+        profile_dir (str): Profile profile_stages with cProfile, one
+                           '<stage>.prof' file each in this directory.
+        profile_stages (list): The stages to profile.
+
+    Returns:
+        dict: The run report: the settings and every stage's metrics.
+    """
+    report = new_run_report('pipeline', file_date_suffix=file_date_suffix, output_dir=output_dir,
+                            incremental=incremental, workers=workers, stream_chunk_rows=stream_chunk_rows,
+                            duplicate_resolution=duplicate_resolution, profile_dir=profile_dir,
+                            profile_stages=list(profile_stages) if profile_dir else [])
+
+    if stream_chunk_rows and incremental:
+        raise ValueError("Streaming and incremental runs cannot be combined.")
+
+    nces_data, nces_index = run_stage(report, 'load_nces', load_nces_data)
+
+    schools_dir = os.path.join(output_dir, 'schools')
+    customers_dir = os.path.join(output_dir, 'customers')
+    outputs = {}
+
+    if run_focus_sf_merge:
+        focus_data = run_stage(report, 'load_focus', load_focus_data)
+        sf_data = run_stage(report, 'load_sf', load_sf_data)
+        outputs[os.path.join(schools_dir, f'focus_sf_merge_{file_date_suffix}.csv')] = \
+            run_stage(report, 'merge_focus_with_sf', merge_focus_with_sf, focus_data, sf_data)
+
+    schools_path = os.path.join(schools_dir, f'schools_{file_date_suffix}.csv')
+    quarantined_path = os.path.join(schools_dir, f'quarantined_schools_{file_date_suffix}.csv')
+    if stream_chunk_rows:
+        os.makedirs(schools_dir, exist_ok=True)
+        run_stage(report, 'master_schools', master_schools_streaming, nces_data, nces_index, schools_path,
+                  quarantined_path, chunk_rows=stream_chunk_rows, workers=workers,
+                  duplicate_resolution=duplicate_resolution)
+        schools_df = run_stage(report, 'load_schools', load_mastered_schools, schools_path)
+    else:
+        if not run_focus_sf_merge:
+            focus_data = run_stage(report, 'load_focus', load_focus_data)
+        state_path = os.path.join(schools_dir, '.incremental', 'school_matches.pkl') if incremental else None
+        schools_df, quarantined_df = run_stage(report, 'master_schools', master_schools, focus_data, nces_data,
+                                               nces_index, state_path=state_path, workers=workers,
+                                               duplicate_resolution=duplicate_resolution)
+        if write_intermediate:
+            outputs[schools_path] = schools_df
+        outputs[quarantined_path] = quarantined_df
+    pretty_schools_df = run_stage(report, 'prettify_schools', school_prettifier, schools_df,
+                                  deterministic_ids=deterministic_ids)
+    customers_df = run_stage(report, 'master_customers', master_customers, schools_df)
+    pretty_customers_df = run_stage(report, 'prettify_customers', customer_prettifier, customers_df)
+
+    if write_intermediate:
+        outputs[os.path.join(customers_dir, f'customers_{file_date_suffix}.csv')] = customers_df
+    outputs[os.path.join(schools_dir, f'pretty_schools_{file_date_suffix}.csv')] = pretty_schools_df
+    # the same records split by what they do to the DB
+    school_export_df = run_stage(report, 'load_school_export', read_data, SCHOOL_EXPORT_FILE,
+                                 schema=SCHOOL_EXPORT_SCHEMA)
+    outputs.update(run_stage(report, 'school_delta', content_delta_outputs, pretty_schools_df, school_export_df,
+                             os.path.join(schools_dir, 'delta'), file_date_suffix,
+                             changed_columns_only=changed_columns_only))
+    outputs[os.path.join(customers_dir, f'pretty_customers_{file_date_suffix}.csv')] = pretty_customers_df
+    if reconcile_with:
+        reconciliation_dir = os.path.join(schools_dir, 'reconciliation')
+        reconciled_df, report_df = run_stage(report, 'reconcile', reconcile_schools, schools_df, reconcile_with,
+                                             reconcile_column)
+        outputs[os.path.join(reconciliation_dir, f'reconciled_{file_date_suffix}.csv')] = reconciled_df
+        outputs[os.path.join(reconciliation_dir, f'reconciliation_rates_{file_date_suffix}.csv')] = report_df
+    run_stage(report, 'write_outputs', write_outputs, outputs)
+
+    finish_run_report(report)
+    print_stage_summary(report)
+    write_run_report(report, report_path or os.path.join(output_dir, f'run_report_{file_date_suffix}.json'))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the customer mastering pipeline in one process.")
+    parser.add_argument('--file-date-suffix', default=os.environ.get("FILE_DATE_SUFFIX"),
+                        help="Suffix of the output file names (default: $FILE_DATE_SUFFIX).")
+    parser.add_argument('--output-dir', default='outputs')
+    parser.add_argument('--no-intermediate', action='store_true',
+                        help="Only write the quarantined schools and the pretty outputs.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only match Focus schools that changed since the last incremental run.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Match Focus schools state by state in this many processes.")
+    parser.add_argument('--stream-chunk-rows', type=int, default=None,
+                        help="Match the Focus export in chunks of this many rows, in bounded memory.")
+    parser.add_argument('--deterministic-ids', action='store_true',
+                        help="Derive new school IDs from the Focus school ID, so reruns give the same IDs.")
+    parser.add_argument('--changed-columns-only', action='store_true',
+                        help="Only write the key and the changed fields to the school updates output.")
+    parser.add_argument('--duplicate-resolution', choices=DUPLICATE_RESOLUTIONS, default=QUARANTINE_CLUSTER,
+                        help="Quarantine Focus schools matched to the same NCES school, keep the best scoring one, "
+                             "or assign Focus and NCES schools one to one.")
+    parser.add_argument('--reconcile-with', default=None,
+                        help="Another match output keyed by FOCUS_SCHOOL_ID (an earlier run, a vendor's file) "
+                             "to compare the mastered schools with.")
+    parser.add_argument('--reconcile-column', default='NCES_NCESSCH',
+                        help="The NCES ID column of --reconcile-with, e.g. nix_NCES_ID.")
+    parser.add_argument('--report', default=None,
+                        help="Where to write the JSON run report (default: <output-dir>/run_report_<suffix>.json).")
+    parser.add_argument('--profile-dir', default=None,
+                        help="Profile the hot stages with cProfile, one .prof file per stage in this directory.")
+    parser.add_argument('--profile-stages', nargs='+', default=HOT_STAGES,
+                        help="The stages --profile-dir profiles.")
+    args = parser.parse_args()
+
+    run_pipeline(args.file_date_suffix, output_dir=args.output_dir, write_intermediate=not args.no_intermediate,
+                 run_focus_sf_merge=os.environ.get("FOCUS_SF_MERGE", "") == "1", incremental=args.incremental,
+                 workers=args.workers, stream_chunk_rows=args.stream_chunk_rows,
+                 deterministic_ids=args.deterministic_ids,
+                 changed_columns_only=args.changed_columns_only,
+                 duplicate_resolution=args.duplicate_resolution,
+                 reconcile_with=args.reconcile_with, reconcile_column=args.reconcile_column,
+                 report_path=args.report, profile_dir=args.profile_dir, profile_stages=args.profile_stages)
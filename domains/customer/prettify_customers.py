@@ -2,15 +2,64 @@ import sys
 sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
 
 from domains.customer.Reader import read_data
+from domains.customer.output_schema import Column, Constant, Present, Where, ZeroPadded, build_records
 import os
 
-def is_nan(field):
-    return field != field
-
-def customer_prettifier(customer_file_path):
-
-    tw_data = read_data(
-        customer_file_path)
+BLANK = Constant("")
+HAS_DISTRICT = Present("MASTERPROPERTIES_NCESSCHOOLDISTRICTID")
+NCES_SCHID = Column("NCES_SCHID", optional=True)
+
+# the customer export layout; customers without an NCES district are keyed by their school
+CUSTOMER_OUTPUT_SPEC = [
+    ("TECHNICALPROPERTIES_CREATESYSTEM", BLANK),
+    ("TECHNICALPROPERTIES_CREATETIMESTAMP", BLANK),
+    ("TECHNICALPROPERTIES_UPDATESYSTEM", BLANK),
+    ("TECHNICALPROPERTIES_UPDATETIMESTAMP", BLANK),
+    ("TECHNICALPROPERTIES_DELETESYSTEM", BLANK),
+    ("TECHNICALPROPERTIES_DELETETIMESTAMP", BLANK),
+    ("TECHNICALPROPERTIES_DELETEFLAG", BLANK),
+    ("TECHNICALPROPERTIES_VERSION", BLANK),
+    ("MASTERPROPERTIES_ID", Column("MASTERPROPERTIES_ID", optional=True)),
+    ("MASTERPROPERTIES_NCESSCHOOLDISTRICTID", "MASTERPROPERTIES_NCESSCHOOLDISTRICTID"),
+    ("MASTERPROPERTIES_NAME", "MASTERPROPERTIES_NAME"),
+    ("MASTERPROPERTIES_RECORDTYPE", Constant("Student Contract Record Type")),
+    ("MASTERPROPERTIES_STATUS", Constant("Customer")),
+    ("MASTERPROPERTIES_ENTITYTYPE", Constant("Regular School District")),
+    ("MASTERPROPERTIES_WEBSITE", Column("MASTERPROPERTIES_WEBSITE", optional=True)),
+    ("MASTERPROPERTIES_ADDRESS_TYPE", Constant("primary")),
+    ("MASTERPROPERTIES_ADDRESS_POSTALCODE", ZeroPadded("NCES_ZIP.1", 5)),
+    ("MASTERPROPERTIES_ADDRESS_COUNTRY", Constant("USA")),
+    ("MASTERPROPERTIES_ADDRESS_STATEPROVINCE", "MASTERPROPERTIES_ADDRESS_STATEPROVINCE"),
+    ("MASTERPROPERTIES_ADDRESS_CITY", "MASTERPROPERTIES_ADDRESS_CITY"),
+    ("MASTERPROPERTIES_ADDRESSLINE1", Column("MASTERPROPERTIES_ADDRESSLINE1", optional=True)),
+    ("MASTERPROPERTIES_ADDRESSLINE2", BLANK),
+    ("MASTERPROPERTIES_CONTACT_FULLNAME", BLANK),
+    ("MASTERPROPERTIES_CONTACT_TITLE", BLANK),
+    ("MASTERPROPERTIES_CONTACT_PHONE", BLANK),
+    ("MASTERPROPERTIES_CONTACT_EMAIL", BLANK),
+    ("MASTERPROPERTIES_CONTACT_ISFORMER", BLANK),
+    ("XREF_SOURCESYSTEM1", Constant("nces")),
+    ("XREF_KEYNAME1", Where(HAS_DISTRICT, Constant("leaid"), Constant("schid"))),
+    ("XREF_VALUE1", Where(HAS_DISTRICT, "MASTERPROPERTIES_NCESSCHOOLDISTRICTID", NCES_SCHID)),
+    ("RELATION_ENTITY1", Where(HAS_DISTRICT, Constant("school_district"), Constant("school"))),
+    ("RELATION_TYPE1", Constant("projection")),
+    ("RELATION_ID1", Where(HAS_DISTRICT, "MASTERPROPERTIES_NCESSCHOOLDISTRICTID", NCES_SCHID)),
+]
+
+
+def customer_prettifier(customers):
+    """
+    Maps mastered customers onto the customer export layout.
+
+    Args:
+        customers (pd.DataFrame | str): The mastered customers, or the path of a
+                                        customers CSV written by customer_mastering.
+
+    Returns:
+        pd.DataFrame: The pretty customers.
+    """
+
+    tw_data = read_data(customers) if isinstance(customers, str) else customers
     
     # TODO: Ask how to get website???
 
@@ -24,88 +73,11 @@ def customer_prettifier(customer_file_path):
 
     renamed = tw_data.rename(columns=column_mapping)
 
-    renamed["MASTERPROPERTIES_ADDRESS_POSTALCODE"] = renamed.apply(
-            lambda row: str(row["NCES_ZIP.1"]).zfill(5), axis=1)
-
-
-    renamed["MASTERPROPERTIES_RECORDTYPE"] = "Student Contract Record Type"
-    renamed["MASTERPROPERTIES_STATUS"] = "Customer"
-    renamed["MASTERPROPERTIES_ENTITYTYPE"] = "Regular School District"
-    renamed["MASTERPROPERTIES_ADDRESS_TYPE"] = "primary"
-    renamed["MASTERPROPERTIES_ADDRESS_COUNTRY"] = "USA"
-
-    renamed["XREF_SOURCESYSTEM1"] = "nces"
-    renamed["XREF_KEYNAME1"] = renamed.apply(
-            lambda row: "schid" if is_nan(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"]) else "leaid", axis=1)
-    renamed["XREF_VALUE1"] = renamed.apply(
-            lambda row: row["NCES_SCHID"] if is_nan(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"]) else row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"], axis=1)
-    
-
-    renamed["RELATION_ENTITY1"] = renamed.apply(
-            lambda row: "school" if is_nan(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"]) else "school_district", axis=1)
-    renamed["RELATION_TYPE1"] = "projection"
-    renamed["RELATION_ID1"] = renamed.apply(
-            lambda row: row["NCES_SCHID"] if is_nan(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"]) else row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"], axis=1)
-
-
-    for blank_column in [
-        "TECHNICALPROPERTIES_CREATESYSTEM",
-        "TECHNICALPROPERTIES_CREATETIMESTAMP",
-        "TECHNICALPROPERTIES_UPDATESYSTEM",
-        "TECHNICALPROPERTIES_UPDATETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETESYSTEM",
-        "TECHNICALPROPERTIES_DELETETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETEFLAG",
-        "TECHNICALPROPERTIES_VERSION",
-        "MASTERPROPERTIES_ADDRESSLINE2",
-        "MASTERPROPERTIES_CONTACT_FULLNAME",
-        "MASTERPROPERTIES_CONTACT_TITLE",
-        "MASTERPROPERTIES_CONTACT_PHONE",
-        "MASTERPROPERTIES_CONTACT_EMAIL",
-        "MASTERPROPERTIES_CONTACT_ISFORMER",
-        ]:
-
-        renamed[blank_column] = ""
-
-
-    reordered = renamed.filter(items=[
-        "TECHNICALPROPERTIES_CREATESYSTEM",
-        "TECHNICALPROPERTIES_CREATETIMESTAMP",
-        "TECHNICALPROPERTIES_UPDATESYSTEM",
-        "TECHNICALPROPERTIES_UPDATETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETESYSTEM",
-        "TECHNICALPROPERTIES_DELETETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETEFLAG",
-        "TECHNICALPROPERTIES_VERSION",
-        "MASTERPROPERTIES_ID",
-        "MASTERPROPERTIES_NCESSCHOOLDISTRICTID",
-        "MASTERPROPERTIES_NAME",
-        "MASTERPROPERTIES_RECORDTYPE",
-        "MASTERPROPERTIES_STATUS",
-        "MASTERPROPERTIES_ENTITYTYPE",
-        "MASTERPROPERTIES_WEBSITE",
-        "MASTERPROPERTIES_ADDRESS_TYPE",
-        "MASTERPROPERTIES_ADDRESS_POSTALCODE",
-        "MASTERPROPERTIES_ADDRESS_COUNTRY",
-        "MASTERPROPERTIES_ADDRESS_STATEPROVINCE",
-        "MASTERPROPERTIES_ADDRESS_CITY",
-        "MASTERPROPERTIES_ADDRESSLINE1",
-        "MASTERPROPERTIES_ADDRESSLINE2",
-        "MASTERPROPERTIES_CONTACT_FULLNAME",
-        "MASTERPROPERTIES_CONTACT_TITLE",
-        "MASTERPROPERTIES_CONTACT_PHONE",
-        "MASTERPROPERTIES_CONTACT_EMAIL",
-        "MASTERPROPERTIES_CONTACT_ISFORMER",
-        "XREF_SOURCESYSTEM1",
-        "XREF_KEYNAME1",
-        "XREF_VALUE1",
-        "RELATION_ENTITY1",
-        "RELATION_TYPE1",
-        "RELATION_ID1"
-    ])
+    reordered = build_records(renamed, CUSTOMER_OUTPUT_SPEC)
 
     print(reordered.head())
     return reordered
 
-customer_prettifier(f"outputs/customers/customers_{os.environ.get('FILE_DATE_SUFFIX')}.csv") \
-    .to_csv(f'outputs/customers/pretty_customers_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
\ No newline at end of file
+if __name__ == "__main__":
+    customer_prettifier(f"outputs/customers/customers_{os.environ.get('FILE_DATE_SUFFIX')}.csv") \
+        .to_csv(f'outputs/customers/pretty_customers_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
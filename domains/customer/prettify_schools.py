@@ -2,34 +2,109 @@ import sys
 sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
 
 from domains.customer.Reader import read_data
-from domains.customer.generate_delta import add_on_existing_db_ids
+from domains.customer.generate_delta import DELTA_ACTION_COL, add_on_existing_db_ids
+import numpy as np
 import pandas as pd
 
-from random import randint
+from domains.customer.id_allocator import keep_or_allocate_ids, load_existing_ids
+from domains.customer.output_schema import Column, Concat, Constant, IntegerText, Lookup, Present, Substring, Where, \
+    ZeroPadded, build_records
 
 import os
 
 pd.set_option('display.max_columns', None)
 
-def get_random_four_digits():
-    return str(randint(0, 10000)).zfill(4)
-
-
-def is_nan(field):
-    return field != field
-
-def school_prettifier(schools_file_path):
-    school_type_to_code = {
-        "Alternative School": "AS",
-        "Career and Technical School": "CT",
-        "Postsecondary": "PS",
-        "Private": "PV",
-        "Regular School": "PU",
-        "Special Education School": "SE"
-    }
-
-    tw_data = read_data(
-        schools_file_path)
+SCHOOL_EXPORT_FILE = '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/school-export-2025-04-22-15-54.csv'
+INTERMEDIATE_SCHOOLS_FILE = '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/iterm_schools_20250331.csv'
+
+SCHOOL_TYPE_TO_CODE = {
+    "Alternative School": "AS",
+    "Career and Technical School": "CT",
+    "Postsecondary": "PS",
+    "Private": "PV",
+    "Regular School": "PU",
+    "Special Education School": "SE"
+}
+
+
+BLANK = Constant("")
+NCES_DISTRICT_ID = 'MASTERPROPERTIES_NCESSCHOOLDISTRICTID'
+
+# the school export layout; built from the renamed mastered schools, after the DB IDs are added on
+SCHOOL_OUTPUT_SPEC = [
+    ("TECHNICALPROPERTIES_CREATESYSTEM", BLANK),
+    ("TECHNICALPROPERTIES_CREATETIMESTAMP", BLANK),
+    ("TECHNICALPROPERTIES_UPDATESYSTEM", BLANK),
+    ("TECHNICALPROPERTIES_UPDATETIMESTAMP", BLANK),
+    ("TECHNICALPROPERTIES_DELETESYSTEM", BLANK),
+    ("TECHNICALPROPERTIES_DELETETIMESTAMP", BLANK),
+    ("TECHNICALPROPERTIES_DELETEFLAG", BLANK),
+    ("TECHNICALPROPERTIES_VERSION", BLANK),
+    ("MASTERPROPERTIES_ID_1", "MASTERPROPERTIES_ID_1"),
+    ("MASTERPROPERTIES_ID_2", Concat([Constant("US"), Lookup("MASTERPROPERTIES_SCHOOLTYPE", SCHOOL_TYPE_TO_CODE),
+                                      Constant("-"), Substring("MASTERPROPERTIES_ID_1", 5, 9),
+                                      Constant("-"), Substring("MASTERPROPERTIES_ID_1", 10, 14)])),
+    ("FOCUS_ID", "FOCUS_ID"),
+    ("MASTERPROPERTIES_ID", "MASTERPROPERTIES_ID"),
+    ("MASTERPROPERTIES_NCESSCHOOLID", "MASTERPROPERTIES_NCESSCHOOLID"),
+    (NCES_DISTRICT_ID, IntegerText(NCES_DISTRICT_ID)),
+    ("MASTERPROPERTIES_SCHOOLNAME", "MASTERPROPERTIES_SCHOOLNAME"),
+    ("MASTERPROPERTIES_SCHOOLDISTRICTNAME", "MASTERPROPERTIES_SCHOOLDISTRICTNAME"),
+    ("MASTERPROPERTIES_SCHOOLTYPE", "MASTERPROPERTIES_SCHOOLTYPE"),
+    ("MASTERPROPERTIES_SCHOOLLEVEL", "MASTERPROPERTIES_SCHOOLLEVEL"),
+    ("MASTERPROPERTIES_NCESDATASET", Constant("STATIC_NCES_DOWNLOAD")),
+    ("MASTERPROPERTIES_STARTYEARSTATUSCODE", "MASTERPROPERTIES_STARTYEARSTATUSCODE"),
+    ("MASTERPROPERTIES_SCHOOLYEAR", "MASTERPROPERTIES_SCHOOLYEAR"),
+    ("MASTERPROPERTIES_ERSCODE", "MASTERPROPERTIES_ERSCODE"),
+    ("MASTERPROPERTIES_ADDRESS_TYPE", Constant("Location")),
+    ("MASTERPROPERTIES_ADDRESS_POSTALCODE", ZeroPadded("NCES_ZIP", 5)),
+    ("MASTERPROPERTIES_ADDRESS_COUNTRY", Constant("USA")),
+    ("MASTERPROPERTIES_ADDRESS_STATEPROVINCE", "MASTERPROPERTIES_ADDRESS_STATEPROVINCE"),
+    ("MASTERPROPERTIES_ADDRESS_CITY", "MASTERPROPERTIES_ADDRESS_CITY"),
+    ("MASTERPROPERTIES_ADDRESS_ADDRESSLINE1", "MASTERPROPERTIES_ADDRESS_ADDRESSLINE1"),
+    ("MASTERPROPERTIES_ADDRESS_ADDRESSLINE2", Column("MASTERPROPERTIES_ADDRESS_ADDRESSLINE2", optional=True)),
+    ("MASTERPROPERTIES_ADDRESS_LATITUDE", "MASTERPROPERTIES_ADDRESS_LATITUDE"),
+    ("MASTERPROPERTIES_ADDRESS_LONGITUDE", "MASTERPROPERTIES_ADDRESS_LONGITUDE"),
+    ("XREF_SOURCESYSTEM1", Constant("nces")),
+    ("XREF_KEYNAME1", Constant("schid")),
+    ("XREF_VALUE1", "NCES_SCHID"),
+    ("XREF_SOURCESYSTEM2", Constant("nces")),
+    ("XREF_KEYNAME2", Constant("ncessch")),
+    ("XREF_VALUE2", "MASTERPROPERTIES_NCESSCHOOLID"),
+    ("XREF_SOURCESYSTEM3", "XREF_SOURCESYSTEM3"),
+    ("XREF_KEYNAME3", "XREF_KEYNAME3"),
+    ("XREF_VALUE3", "XREF_VALUE3"),
+    ("RELATION_ENTITY1", Constant("customer")),
+    ("RELATION_TYPE1", Where(Present(NCES_DISTRICT_ID), Constant("child"), Constant("projection"))),
+    ("RELATION_ID1", Where(Present(NCES_DISTRICT_ID), NCES_DISTRICT_ID, "NCES_SCHID")),
+]
+
+
+def school_prettifier(schools, existing_ids=None, deterministic_ids=False, with_delta_action=False,
+                      export_file=SCHOOL_EXPORT_FILE, intermediate_file=INTERMEDIATE_SCHOOLS_FILE):
+    """
+    Maps mastered schools onto the school export layout.
+
+    Args:
+        schools (pd.DataFrame | str): The mastered schools, or the path of a
+                                      schools CSV written by school_mastering.
+        existing_ids (ExistingIds): IDs new MASTERPROPERTIES_ID_1s must not clash
+                                    with; read from export_file when not given.
+        deterministic_ids (bool): Derive new MASTERPROPERTIES_ID_1s from FOCUS_ID,
+                                  so reruns give the same IDs, instead of drawing
+                                  them. Schools with a master record keep its
+                                  MASTERPROPERTIES_ID_1 (or MASTERPROPERTIES_ID)
+                                  either way.
+        with_delta_action (bool): Add a last DELTA_ACTION column, whether each
+                                  record is a create, update or no-op for the DB
+                                  (see generate_delta.delta_outputs).
+        export_file (str): The DB school export.
+        intermediate_file (str): The intermediate schools file of the last load.
+
+    Returns:
+        pd.DataFrame: The pretty schools.
+    """
+    tw_data = read_data(schools) if isinstance(schools, str) else schools
 
     column_mapping = {
         "FOCUS_SCHOOL_ID": "FOCUS_ID",
@@ -57,109 +132,24 @@ def school_prettifier(schools_file_path):
 
     renamed = add_on_existing_db_ids(
         df=renamed,
-        existing_db_df_path='/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/school-export-2025-04-22-15-54.csv',
-        intermediate_file_path='/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/iterm_schools_20250331.csv'
+        existing_db_df_path=export_file,
+        intermediate_file_path=intermediate_file
     )
 
-    renamed["MASTERPROPERTIES_NCESDATASET"] = "STATIC_NCES_DOWNLOAD"
-    # renamed["MASTERPROPERTIES_ERSCODE"] = ""
-    renamed["MASTERPROPERTIES_ADDRESS_TYPE"] = "Location"
-    renamed["MASTERPROPERTIES_ADDRESS_COUNTRY"] = "USA"
+    if existing_ids is None:
+        existing_ids = load_existing_ids(export_file)
+    # schools with a master record keep its ID; only creates get a new one
+    earlier_ids = renamed["MASTERPROPERTIES_ID_1"] if "MASTERPROPERTIES_ID_1" in renamed.columns else pd.Series(
+        np.nan, index=renamed.index, dtype=object)
+    earlier_ids = earlier_ids.where(earlier_ids.notna(), renamed["MASTERPROPERTIES_ID"])
+    renamed["MASTERPROPERTIES_ID_1"] = keep_or_allocate_ids(earlier_ids, existing_ids,
+                                                            keys=renamed["FOCUS_ID"] if deterministic_ids else None)
 
-    renamed["MASTERPROPERTIES_ADDRESS_POSTALCODE"] = renamed.apply(
-            lambda row: row["NCES_ZIP"].zfill(5), axis=1)
-    
-    renamed["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"] = renamed.apply(
-            lambda row: row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"] if is_nan(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"]) else str(int(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"])), axis=1)
-
-    renamed["MASTERPROPERTIES_ID_1"] = renamed.apply(
-            lambda row: f"{get_random_four_digits()}-{get_random_four_digits()}-{get_random_four_digits()}", axis=1)
-
-    renamed["MASTERPROPERTIES_ID_2"] = renamed.apply(
-        lambda row: f"US{school_type_to_code[row['MASTERPROPERTIES_SCHOOLTYPE']]}-{row['MASTERPROPERTIES_ID_1'][5:9]}-{row['MASTERPROPERTIES_ID_1'][10:14]}", axis=1)
-
-    renamed["XREF_SOURCESYSTEM1"] = "nces"
-    renamed["XREF_KEYNAME1"] = "schid"
-    renamed["XREF_VALUE1"] = renamed.apply(
-            lambda row: row["NCES_SCHID"], axis=1)
-
-    renamed["XREF_SOURCESYSTEM2"] = "nces"
-    renamed["XREF_KEYNAME2"] = "ncessch"
-    renamed["XREF_VALUE2"] = renamed.apply(
-            lambda row: row["MASTERPROPERTIES_NCESSCHOOLID"], axis=1)
-
-    renamed["RELATION_ENTITY1"] = "customer"
-    renamed["RELATION_TYPE1"] = renamed.apply(
-            lambda row: "child" if not is_nan(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"]) else "projection", axis=1)
-    renamed["RELATION_ID1"] = renamed.apply(
-            lambda row: row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"] if not is_nan(row["MASTERPROPERTIES_NCESSCHOOLDISTRICTID"]) else row["NCES_SCHID"], axis=1)
-
-
-    for blank_column in [
-        "TECHNICALPROPERTIES_CREATESYSTEM",
-        "TECHNICALPROPERTIES_CREATETIMESTAMP",
-        "TECHNICALPROPERTIES_UPDATESYSTEM",
-        "TECHNICALPROPERTIES_UPDATETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETESYSTEM",
-        "TECHNICALPROPERTIES_DELETETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETEFLAG",
-        "TECHNICALPROPERTIES_VERSION",
-        ]:
-
-        renamed[blank_column] = ""
-
-
-
-
-    reordered = renamed.filter(items=[
-        "TECHNICALPROPERTIES_CREATESYSTEM",
-        "TECHNICALPROPERTIES_CREATETIMESTAMP",
-        "TECHNICALPROPERTIES_UPDATESYSTEM",
-        "TECHNICALPROPERTIES_UPDATETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETESYSTEM",
-        "TECHNICALPROPERTIES_DELETETIMESTAMP",
-        "TECHNICALPROPERTIES_DELETEFLAG",
-        "TECHNICALPROPERTIES_VERSION",
-        "MASTERPROPERTIES_ID_1",
-        "MASTERPROPERTIES_ID_2",
-        "FOCUS_ID",
-        "MASTERPROPERTIES_ID",
-        "MASTERPROPERTIES_NCESSCHOOLID",
-        "MASTERPROPERTIES_NCESSCHOOLDISTRICTID",
-        "MASTERPROPERTIES_SCHOOLNAME",
-        "MASTERPROPERTIES_SCHOOLDISTRICTNAME",
-        "MASTERPROPERTIES_SCHOOLTYPE",
-        "MASTERPROPERTIES_SCHOOLLEVEL",
-        "MASTERPROPERTIES_NCESDATASET",
-        "MASTERPROPERTIES_STARTYEARSTATUSCODE",
-        "MASTERPROPERTIES_SCHOOLYEAR",
-        "MASTERPROPERTIES_ERSCODE",
-        "MASTERPROPERTIES_ADDRESS_TYPE",
-        "MASTERPROPERTIES_ADDRESS_POSTALCODE",
-        "MASTERPROPERTIES_ADDRESS_COUNTRY",
-        "MASTERPROPERTIES_ADDRESS_STATEPROVINCE",
-        "MASTERPROPERTIES_ADDRESS_CITY",
-        "MASTERPROPERTIES_ADDRESS_ADDRESSLINE1",
-        "MASTERPROPERTIES_ADDRESS_ADDRESSLINE2",
-        "MASTERPROPERTIES_ADDRESS_LATITUDE",
-        "MASTERPROPERTIES_ADDRESS_LONGITUDE",
-        "XREF_SOURCESYSTEM1",
-        "XREF_KEYNAME1",
-        "XREF_VALUE1",
-        "XREF_SOURCESYSTEM2",
-        "XREF_KEYNAME2",
-        "XREF_VALUE2",
-        "XREF_SOURCESYSTEM3",
-        "XREF_KEYNAME3",
-        "XREF_VALUE3",
-        "RELATION_ENTITY1",
-        "RELATION_TYPE1",
-        "RELATION_ID1"
-    ], axis=1)
-
-    # print(reordered.head(10))
-    return reordered
-    # reordered.to_csv('20250410_tw_schools.csv')
-
-school_prettifier(f'outputs/schools/schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv') \
-    .to_csv(f'outputs/schools/pretty_schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
\ No newline at end of file
+    spec = SCHOOL_OUTPUT_SPEC + [(DELTA_ACTION_COL, DELTA_ACTION_COL)] if with_delta_action else SCHOOL_OUTPUT_SPEC
+    return build_records(renamed, spec)
+
+
+if __name__ == "__main__":
+    school_prettifier(f'outputs/schools/schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv',
+                      deterministic_ids=os.environ.get("DETERMINISTIC_IDS", "") == "1") \
+        .to_csv(f'outputs/schools/pretty_schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
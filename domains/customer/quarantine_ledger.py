@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+FLAGS_COL = 'quarantine_flags'
+REASON_COL = 'quarantine_reason'
+
+
+def start_ledger(df):
+    """
+    Returns a copy of df with an empty quarantine bitmask column, one bit per reason.
+    """
+    return df.assign(**{FLAGS_COL: np.zeros(len(df), dtype=np.int64)})
+
+
+def flag(ledger, mask, reason_bit):
+    """
+    Sets reason_bit on the rows of the ledger where mask is True, in place.
+    Rows keep the bits of every reason they were flagged for.
+
+    Args:
+        ledger (pd.DataFrame): A frame from start_ledger.
+        mask (pd.Series | np.ndarray): Rows to flag; NA counts as not flagged.
+        reason_bit (int): The reason's bit, a power of two.
+    """
+    mask = pd.Series(mask, index=ledger.index).fillna(False).to_numpy(dtype=bool)
+    ledger[FLAGS_COL] = ledger[FLAGS_COL].to_numpy() | np.where(mask, reason_bit, 0)
+
+
+def clean_rows(ledger, id_col):
+    """
+    Boolean mask of the rows whose entity (id_col) has no flagged row at all.
+    """
+    flagged_ids = ledger[id_col][ledger[FLAGS_COL].to_numpy() != 0].unique()
+    return ~ledger[id_col].isin(flagged_ids).to_numpy()
+
+
+def describe_flags(flags, reasons):
+    """
+    Turns bitmasks into reason texts, joined with '; ' in reason order.
+
+    Args:
+        flags (array-like): Bitmasks.
+        reasons (dict): Reason bit -> reason text.
+
+    Returns:
+        np.ndarray: The reason text of every bitmask ('' when none is set).
+    """
+    flags = np.asarray(flags, dtype=np.int64)
+    texts = np.full(flags.shape, '', dtype=object)
+    for reason_bit, reason in reasons.items():
+        has_reason = (flags & reason_bit) != 0
+        texts[has_reason] = np.where(texts[has_reason] == '', reason, texts[has_reason] + '; ' + reason)
+    return texts
+
+
+def count_flags(ledger, reasons):
+    """
+    Returns the number of flagged rows per reason text.
+    """
+    flags = ledger[FLAGS_COL].to_numpy()
+    return {reason: int(((flags & reason_bit) != 0).sum()) for reason_bit, reason in reasons.items()}
+
+
+def quarantined_rows(ledger, reasons):
+    """
+    Materializes the flagged rows of the ledger, with a readable reason column.
+
+    Args:
+        ledger (pd.DataFrame): A frame from start_ledger.
+        reasons (dict): Reason bit -> reason text.
+
+    Returns:
+        pd.DataFrame: The flagged rows.
+    """
+    quarantined = ledger.loc[ledger[FLAGS_COL].to_numpy() != 0]
+    return quarantined.assign(**{REASON_COL: describe_flags(quarantined[FLAGS_COL], reasons)})
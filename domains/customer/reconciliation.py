@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# how the NCES school of a Focus school compares between two match outputs
+AGREE = 'agree'
+CONFLICT = 'conflict'
+LEFT_ONLY = 'left_only'
+RIGHT_ONLY = 'right_only'
+NEITHER = 'neither'
+CATEGORIES = [AGREE, CONFLICT, LEFT_ONLY, RIGHT_ONLY, NEITHER]
+# category by 2 * (left has a match) + (right has a match) + (they are the same)
+_CATEGORY_BY_CODE = np.array([NEITHER, RIGHT_ONLY, LEFT_ONLY, CONFLICT, AGREE], dtype=object)
+
+CATEGORY_COL = 'category'
+LEFT_ID_COL = 'left_id'
+RIGHT_ID_COL = 'right_id'
+
+# rates are reported over all Focus schools and per value of each of these
+BREAKDOWNS = ['FOCUS_STATE', 'NCES_SCH_TYPE_TEXT']
+
+
+def _id_text(values):
+    # IDs read as numbers (or as floats, for columns with gaps) back as text
+    texts = pd.Series(np.asarray(values, dtype=object)).astype('string').str.strip()
+    return texts.str.replace(r'\.0+$', '', regex=True)
+
+
+def normalize_ids(values):
+    """
+    NCES IDs as comparable text: numbers read as floats lose their '.0', and
+    leading zeros are dropped, so '010000500870', 10000500870 and 10000500870.0
+    are the same ID. Missing and blank values become missing.
+    """
+    texts = _id_text(values).str.lstrip('0')
+    return texts.mask(texts == '').to_numpy(dtype=object, na_value=np.nan)
+
+
+def reconcile(left, right, key='FOCUS_SCHOOL_ID', left_col='NCES_NCESSCH', right_col='NCES_NCESSCH',
+              carry=BREAKDOWNS):
+    """
+    Compares two match outputs keyed by Focus school, e.g. two runs, or a run and
+    a vendor's file, and puts every Focus school in one category, in one
+    vectorized pass: AGREE (same NCES school), CONFLICT (different ones),
+    LEFT_ONLY / RIGHT_ONLY (only one output matched it) or NEITHER.
+
+    Args:
+        left (pd.DataFrame): One match output, one row per key.
+        right (pd.DataFrame): The other match output, one row per key.
+        key (str): The Focus school ID column of both outputs.
+        left_col (str): The NCES ID column of left.
+        right_col (str): The NCES ID column of right.
+        carry (list): Columns to keep for breakdowns, from left where it has
+                      them, else from right; missing ones are skipped.
+
+    Returns:
+        pd.DataFrame: key, left_id, right_id, category and the carried columns,
+                      one row per key of either output.
+    """
+    left_carry = [col for col in carry if col in left.columns]
+    right_carry = [col for col in carry if col in right.columns]
+    left = left[[key, left_col] + left_carry].rename(columns={left_col: LEFT_ID_COL})
+    right = right[[key, right_col] + right_carry].rename(columns={right_col: RIGHT_ID_COL})
+    # either output may have been read back from CSV with numeric keys
+    left[key], right[key] = _id_text(left[key]).to_numpy(), _id_text(right[key]).to_numpy()
+    merged = left.merge(right, on=key, how='outer', suffixes=('', '_right'))
+    for col in right_carry:
+        if col in left_carry:
+            merged[col] = merged[col].fillna(merged.pop(col + '_right'))
+
+    left_ids, right_ids = normalize_ids(merged[LEFT_ID_COL]), normalize_ids(merged[RIGHT_ID_COL])
+    left_has, right_has = pd.notna(left_ids), pd.notna(right_ids)
+    same = left_has & right_has & (left_ids == right_ids)
+    merged[CATEGORY_COL] = _CATEGORY_BY_CODE[2 * left_has + right_has + same]
+    return merged[[key, LEFT_ID_COL, RIGHT_ID_COL, CATEGORY_COL] +
+                  [col for col in carry if col in merged.columns]]
+
+
+def reconciliation_rates(reconciled, by=None):
+    """
+    Category counts and rates, taking right as the reference:
+    precision = agree / matched in left, recall = agree / matched in right and
+    conflict_rate = conflict / matched in both. Rates are NaN where nothing is
+    matched.
+
+    Args:
+        reconciled (pd.DataFrame): From reconcile.
+        by (str): Column to break the rates down by; None for all rows at once.
+
+    Returns:
+        pd.DataFrame: One row per value of by (missing values included), with a
+                      count column per category and the three rates.
+    """
+    groups = reconciled[by].fillna('Unknown') if by is not None else pd.Series('all', index=reconciled.index)
+    counts = pd.crosstab(groups, reconciled[CATEGORY_COL]).reindex(columns=CATEGORIES, fill_value=0)
+    counts.columns.name = None
+    counts.index.name = 'group'
+
+    agree, conflict = counts[AGREE], counts[CONFLICT]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        counts['precision'] = agree / (agree + conflict + counts[LEFT_ONLY]).replace(0, np.nan)
+        counts['recall'] = agree / (agree + conflict + counts[RIGHT_ONLY]).replace(0, np.nan)
+        counts['conflict_rate'] = conflict / (agree + conflict).replace(0, np.nan)
+    return counts
+
+
+def reconciliation_report(reconciled, breakdowns=BREAKDOWNS):
+    """
+    reconciliation_rates over all Focus schools and per value of every breakdown
+    column reconciled has, in one frame with 'breakdown' and 'group' columns.
+    """
+    reports = [reconciliation_rates(reconciled).assign(breakdown='all')]
+    reports += [reconciliation_rates(reconciled, by=col).assign(breakdown=col)
+                for col in breakdowns if col in reconciled.columns]
+    report = pd.concat(reports).reset_index()
+    return report[['breakdown'] + [col for col in report.columns if col != 'breakdown']]
@@ -1,16 +1,32 @@
+import functools
+import hashlib
 import sys
 sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
 
 from domains.customer.normalize_names import normalize_dataframe_columns
-from domains.customer.standardize_district_terms import standardize_terms_in_school_district
+from domains.customer.standardize_district_terms import DISTRICT_ABBREVIATION_MAP, DISTRICT_COMMON_TERMS, \
+    standardize_terms_in_school_district
 
+import numpy as np
 import pandas as pd
-
-from domains.customer.Reader import read_data
-from domains.customer.geo_matching import create_geodataframe_from_lat_lon, join_geodataframes_by_lat_lon_columns
-from domains.customer.name_similarity_scoring import add_similarity_score
-from domains.customer.fuzzy_name_merge import compare_distinct_sd_series_focus_sf
-from domains.customer.standardize_school_terms import standardize_school_names
+from rapidfuzz import fuzz
+
+from domains.customer.Reader import read_data, read_in_chunks
+from domains.customer.assignment import assign_one_to_one
+from domains.customer.source_schemas import FOCUS_SCHEMA, MASTERED_SCHOOLS_SCHEMA, NCES_SCHEMA, SF_SCHEMA
+from domains.customer.geo_matching import find_candidate_pairs, materialize_pairs
+from domains.customer.name_similarity_scoring import add_similarity_scores
+from domains.customer.spatial_index import load_or_build_spatial_index
+from domains.customer.candidate_ranking import DEFAULT_WEIGHTS, composite_match_score, top_candidates
+from domains.customer.entity_clustering import QUARANTINE_CLUSTER, RESOLUTIONS, cluster_rows, conflicting_rows
+from domains.customer.fuzzy_name_merge import match_distinct_sd_series_focus_sf
+from domains.customer.incremental import match_incrementally
+from domains.customer.instrumentation import record_count
+from domains.customer.partitioned_matching import match_partitioned
+from domains.customer.quarantine_ledger import FLAGS_COL, REASON_COL, clean_rows, count_flags, describe_flags, flag, \
+    quarantined_rows, start_ledger
+from domains.customer.standardize_school_terms import SCHOOL_ABBREVIATION_MAP, SCHOOL_TERMS_TO_REMOVE, \
+    standardize_school_names
 
 import os
 
@@ -34,174 +50,677 @@ def filter_sf_data(sf_data):
     filtered_sf_data = sf_data[sf_data['TYPE'].isin(sf_customer_type)]
     return filtered_sf_data
 
-def setsubtract(df1, df2):
-    outer_joined_df = df1.merge(df2, how="outer", indicator=True, on="FOCUS_SCHOOL_ID", suffixes=[None, '_to_drop'])
-    return outer_joined_df[(outer_joined_df._merge == 'left_only')] \
-        .drop('_merge', axis = 1) \
-        .drop([column + "_to_drop" for column in df2.columns if "FOCUS_SCHOOL_ID" not in column + ""], axis=1)
+BASE_PATH = '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/'
+FOCUS_FILE = BASE_PATH + 'DataFiles/FOCUS_SCHOOLS_DISTRICTS.csv'
+SF_FILE = BASE_PATH + 'DataFiles/SF_ACCOUNTS.csv'
+NCES_FILE = BASE_PATH + 'DataFiles/NCES_PUBL_PRIV_POSTSEC_SCHOOL_LOCATIONS.csv'
 
-def quarantine(df, df_to_quarantine, quarantine_df, quarantine_reason):
+canada_state_abbvs = ['AB', 'BC', 'MB', 'NB', 'NL', 'NT', 'NS', 'NU', 'ON', 'PE', 'QC', 'SK', 'YT']
+DISTANCE = 100
+# school and district names scoring below this (0-100) disagree
+NAME_SIMILARITY_THRESHOLD = 60
+# nearest NCES school only; the quarantine steps below assume one candidate per Focus school
+CANDIDATES_PER_SCHOOL = 1
+# nearest NCES schools per Focus school when resolving duplicates by assignment (see assign_matches)
+ASSIGNMENT_CANDIDATES = 3
+
+# quarantine reasons, one bit each; a school is quarantined if any of its rows has any bit set
+CANADA = 1 << 0
+NO_NEARBY_CANDIDATE = 1 << 1
+SCHOOL_NAMES_DISAGREE = 1 << 2
+DISTRICT_NAMES_DISAGREE = 1 << 3
+DUPLICATE_NCES_MATCH = 1 << 4
+QUARANTINE_REASONS = {
+    CANADA: "Canada",
+    NO_NEARBY_CANDIDATE: "No nearby candidate schools",
+    SCHOOL_NAMES_DISAGREE: "School names disagree",
+    DISTRICT_NAMES_DISAGREE: "District names disagree",
+    DUPLICATE_NCES_MATCH: "Suspected duplicate Focus school (multiple schools matched with this NCES id)",
+}
+# reasons that rule out every candidate of a Focus school, not just the flagged one
+SCHOOL_REASONS = CANADA | NO_NEARBY_CANDIDATE
+
+# duplicate NCES matches: an entity_clustering resolution, or a one-to-one assignment
+ASSIGNMENT = 'assignment'
+DUPLICATE_RESOLUTIONS = RESOLUTIONS + (ASSIGNMENT,)
+
+# the only Focus and NCES columns match_focus_to_nces scores and flags on
+FOCUS_MATCH_COLUMNS = ['FOCUS_SCHOOL_ID', 'FOCUS_SCHOOL_NAME', 'FOCUS_SCHOOL_DISTRICT_NAME', 'FOCUS_CITY', 'FOCUS_STATE',
+                       'FOCUS_POSTAL_CODE']
+NCES_MATCH_COLUMNS = ['NCES_NCESSCH', 'NCES_LEAID', 'NCES_SCH_NAME', 'NCES_NAME', 'NCES_CITY', 'NCES_STATE', 'NCES_ZIP']
+
+# Focus rows matched at a time by master_schools_streaming
+STREAM_CHUNK_ROWS = 50_000
+# what master_schools_streaming keeps of every best match for the duplicate check
+BEST_ID_COLUMNS = ['FOCUS_SCHOOL_ID', 'NCES_NCESSCH', 'match_score']
+
+
+def load_focus_data(focus_file=FOCUS_FILE):
+    focus_data = read_data(focus_file, schema=FOCUS_SCHEMA)
+    return focus_data.add_prefix('FOCUS_')
+
+
+def _not_yielded_before(schools, yielded_ids, focus_file):
+    # a school whose rows are split over two chunks would be matched (and deduplicated) twice
+    ids = schools['FOCUS_SCHOOL_ID'].dropna().unique()
+    repeated = yielded_ids.intersection(ids)
+    if repeated:
+        raise ValueError(f"Rows of Focus schools {sorted(repeated)[:5]} are not adjacent in {focus_file}; "
+                         f"sort the export by SCHOOL_ID or load it whole with load_focus_data.")
+    yielded_ids.update(ids)
+    return schools
+
+
+def read_focus_chunks(chunk_rows, focus_file=FOCUS_FILE):
+    """
+    Reads the Focus export chunk by chunk, like load_focus_data. Rows of the same
+    Focus school ID are expected to be adjacent, as in the export; a chunk never
+    ends part-way through a school's rows.
 
-    subtracted_df = setsubtract(df, df_to_quarantine)
+    Args:
+        chunk_rows (int): Focus rows per chunk (a chunk can be longer, to keep a
+                          school's rows together).
+        focus_file (str): The Focus export.
 
-    df_to_quarantine["quarantine_reason"] = quarantine_reason
+    Yields:
+        pd.DataFrame: Focus schools, columns prefixed 'FOCUS_'.
 
-    quarantine_df = pd.concat([quarantine_df, df_to_quarantine])
+    Raises:
+        ValueError: If a school's rows turn up again after its chunk was yielded.
+    """
+    yielded_ids = set()
+    carried = None
+    for chunk in read_in_chunks(focus_file, FOCUS_SCHEMA, chunk_rows):
+        chunk = chunk.add_prefix('FOCUS_')
+        if carried is not None:
+            chunk = pd.concat([carried, chunk], ignore_index=True)
+        # the last school may continue in the next chunk
+        last_school = chunk['FOCUS_SCHOOL_ID'].eq(chunk['FOCUS_SCHOOL_ID'].iloc[-1]).to_numpy()
+        carried = chunk[last_school]
+        if not last_school.all():
+            yield _not_yielded_before(chunk[~last_school], yielded_ids, focus_file)
+    if carried is not None:
+        yield _not_yielded_before(carried, yielded_ids, focus_file)
+
+
+def load_sf_data(sf_file=SF_FILE):
+    sf_file_data = read_data(sf_file, schema=SF_SCHEMA)
+    sf_data = filter_sf_data(sf_file_data)
+    return sf_data.add_prefix('SF_')
+
+
+def repair_ncessch(nces_data):
+    """
+    Repairs NCESSCHs written as the LEAID and a 6-digit school number (and
+    possibly without their leading zero) back into the LEAID and the 5-digit
+    school number. An ID is only repaired when the 7 characters before its
+    last 6 digits are its LEAID (and, for 12 digits, it does not start with
+    it already), so well-formed IDs and IDs without a LEAID (e.g. private
+    schools) stay as they are.
 
-    return subtracted_df, quarantine_df
+    Args:
+        nces_data (pd.DataFrame): NCES locations, before their columns are prefixed.
 
-BASE_PATH = '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/'
+    Returns:
+        pd.DataFrame: nces_data, with the NCESSCHs repaired.
+    """
+    ids, leaids = nces_data['NCESSCH'], nces_data['LEAID']
+    padded = ids.str.zfill(13)
+    # a well-formed 12-digit ID starts with its LEAID too
+    bad = ids.str.fullmatch(r'\d{12,13}') & (padded.str[:7] == leaids) & \
+        ((ids.str.len() == 13) | (ids.str[:7] != leaids))
+    bad = bad.fillna(False).astype(bool)
+    if bad.any():
+        print(f"Repairing {bad.sum()} NCESSCHs with a 6-digit school number")
+        nces_data['NCESSCH'] = ids.mask(bad, leaids + ids.str[-5:])
+    return nces_data
+
+
+def load_nces_data(nces_file=NCES_FILE):
+    """
+    Returns the NCES locations (columns prefixed 'NCES_', NCESSCHs repaired, see
+    repair_ncessch) and their spatial index.
+    """
+    nces_data = repair_ncessch(read_data(nces_file, schema=NCES_SCHEMA))
+    nces_index = load_or_build_spatial_index(nces_file, lat_col='LAT', lon_col='LON')
+    return nces_data.add_prefix('NCES_'), nces_index
 
-focus_data = read_data(BASE_PATH +
-    'DataFiles/FOCUS_SCHOOLS_DISTRICTS.csv')
-focus_data = focus_data.add_prefix('FOCUS_')
 
-# sf_file_data = read_data('/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/SF_ACCOUNTS.csv')
-# sf_data = filter_sf_data(sf_file_data)
-# sf_data = sf_data.add_prefix('SF_')
+# 1 ============= focus sf merge ===========
 
-nces_data = read_data(
-    BASE_PATH +'DataFiles/NCES_PUBL_PRIV_POSTSEC_SCHOOL_LOCATIONS.csv')
-nces_data = nces_data.add_prefix('NCES_')
+def merge_focus_with_sf(focus_data, sf_data):
+    focus_series = focus_data['FOCUS_SCHOOL_DISTRICT_NAME']
+    focus_series.name = 'FOCUS_DISTRICT'
+    sf_series = sf_data['SF_NAME']
+    sf_series.name = 'SF_DISTRICT'
+    focus_sf_mapped_df = match_distinct_sd_series_focus_sf(focus_series, sf_series,
+                                                           states1=focus_data['FOCUS_STATE'],
+                                                           states2=sf_data['SF_BILLINGSTATE'],
+                                                           threshold=75, method=fuzz.ratio)
+
+    focus_with_mapping = pd.merge(focus_data.assign(focus_temp_district_name=focus_data['FOCUS_SCHOOL_DISTRICT_NAME'].astype(str).str.lower().str.strip()),
+                                  focus_sf_mapped_df,
+                                  left_on='focus_temp_district_name',
+                                  right_on='FOCUS_DISTRICT',
+                                  how='left')
+    print("focus matches found with sf" + str(len(focus_with_mapping['FOCUS_DISTRICT'].unique())))
+
+    sf_data = sf_data.assign(sf_temp_district_name=sf_data['SF_NAME'].astype(str).str.lower().str.strip())
+    focus_sf_merge = pd.merge(focus_with_mapping, sf_data,
+                              left_on='FOCUS_DISTRICT',
+                              right_on='sf_temp_district_name',
+                              how='left')
+    focus_sf_merge['is_focus_sf_merge'] = focus_sf_merge['sf_temp_district_name'].notna()
+    return focus_sf_merge
 
-# TODO: remove when bad data is fixed
-nces_data["NCES_NCESSCH"] = nces_data.apply(
-            lambda row: (row["NCES_NCESSCH"].zfill(13)[0:7] + row["NCES_NCESSCH"][-5:]) if len(row["NCES_NCESSCH"])>=12 else row["NCES_NCESSCH"], axis=1
-        )
+# 2 ====== focus + nces on geo match
 
+def pair_focus_with_nces(focus_data, nces_data, nces_index=None, k=CANDIDATES_PER_SCHOOL):
+    """
+    Finds up to k NCES schools within DISTANCE of every Focus school.
 
-# 1 ============= focus sf merge ===========
+    Returns:
+        tuple: (pairs, joined): the candidate pairs (see geo_matching.find_candidate_pairs)
+               and their FOCUS_MATCH_COLUMNS and NCES_MATCH_COLUMNS, side by side.
+    """
+    # focus_data_no_nces_id = focus_sf_merge[focus_sf_merge['SF_NCES_ID__C'].isna()]
+    pairs = find_candidate_pairs(focus_data, nces_data,
+                                 left_lat='FOCUS_ADDRESS_LATITUDE',
+                                 left_lon='FOCUS_ADDRESS_LONGITUDE',
+                                 right_lat='NCES_LAT',
+                                 right_lon='NCES_LON', how='left', distance=DISTANCE,
+                                 k=k, right_index=nces_index)
+
+    # focus_with_nces_id = focus_sf_merge[focus_sf_merge['SF_NCES_ID__C'].notna()]
+    # complete_focus_df  = pd.concat([focus_with_nces_id,joined_gdf_no_nces_id],ignore_index=True)
+
+    pairs = pairs.loc[~(pairs['actual_distance_m'] > DISTANCE)].reset_index(drop=True)
+    # the chain below only carries the columns it scores; the full rows are joined back once, at the end
+    joined_gdf = materialize_pairs(focus_data[FOCUS_MATCH_COLUMNS], nces_data[NCES_MATCH_COLUMNS], pairs) \
+        .reset_index(drop=True)
+    return pairs, joined_gdf
+
+
+def normalize_pair_names(joined_gdf):
+    columns_to_process = [
+        'FOCUS_SCHOOL_DISTRICT_NAME',
+        'NCES_NAME',
+        'FOCUS_SCHOOL_NAME', # Add based on your actual columns
+        'NCES_SCH_NAME'      # Add based on your actual columns
+    ]
+    return normalize_dataframe_columns(joined_gdf, columns_to_process)
+
+
+def standardize_pair_names(normalized_df):
+    columns_to_standardize = ['FOCUS_SCHOOL_DISTRICT_NAME_standardized', 'NCES_NAME_standardized']
+    standardized_names_df = standardize_terms_in_school_district(normalized_df, columns_to_standardize)
+    school_columns_to_standardize = ['FOCUS_SCHOOL_NAME_standardized','NCES_SCH_NAME_standardized']
+    standardized_names_df = standardize_school_names(standardized_names_df, school_columns_to_standardize)
+    # standardized_names_df = standardize_school_names(joined_gdf, ["FOCUS_SCHOOL_NAME", "NCES_SCH_NAME"])
+    return standardized_names_df
+
+
+def score_pairs(standardized_names_df):
+    final_focus_df = add_similarity_scores(standardized_names_df, [
+        ('FOCUS_SCHOOL_NAME_standardized', 'NCES_SCH_NAME_standardized', 'focus_nces_school_name_similarity'),
+        ('FOCUS_SCHOOL_DISTRICT_NAME', 'NCES_NAME', 'focus_nces_district_name_similarity'),
+        ('FOCUS_CITY', 'NCES_CITY', 'focus_nces_city_name_similarity'),
+        # FOCUS_STATE NCES_STATE
+        ('FOCUS_STATE', 'NCES_STATE', 'focus_nces_state_name_similarity'),
+    ])
+    final_focus_df['zip_code_match'] = final_focus_df['FOCUS_POSTAL_CODE'].eq(final_focus_df['NCES_ZIP'])
+    final_focus_df['match_score'] = composite_match_score(final_focus_df, max_distance=DISTANCE)
+    return final_focus_df
+
+
+def quarantine_canadian_schools(focus_data):
+    """
+    Splits off the Focus rows in Canadian provinces, before they are paired with
+    NCES schools: there is no NCES school for them to match, and as candidates
+    they could only take NCES schools from US Focus schools.
 
-# focus_series = focus_data['FOCUS_SCHOOL_DISTRICT_NAME']
-# focus_series.name = 'FOCUS_DISTRICT'
-# sf_series = sf_data['SF_NAME']
-# sf_series.name = 'SF_DISTRICT'
-# focus_sf_mapped_df = compare_distinct_sd_series_focus_sf(focus_series, sf_series, threshold=75,
-#                                                          method=fuzz.ratio)
-
-# focus_data['focus_temp_district_name'] = focus_data['FOCUS_SCHOOL_DISTRICT_NAME'].astype(str).str.lower().str.strip()
-# focus_with_mapping = pd.merge(focus_data, focus_sf_mapped_df,
-#                               left_on='focus_temp_district_name',
-#                               right_on='FOCUS_DISTRICT',
-#                               how='left')
-# print("focus matches found with sf" + str(len(focus_with_mapping['FOCUS_DISTRICT'].unique())))
-
-# sf_data['sf_temp_district_name'] = sf_data['SF_NAME'].astype(str).str.lower().str.strip()
-# focus_sf_merge = pd.merge(focus_with_mapping, sf_data,
-#                           left_on='FOCUS_DISTRICT',
-#                           right_on='sf_temp_district_name',
-#                           how='left')
-# focus_sf_merge['is_focus_sf_merge'] = focus_sf_merge['sf_temp_district_name'].notna()
+    Args:
+        focus_data (pd.DataFrame): Focus schools, columns prefixed 'FOCUS_'.
 
-# 2 ====== focus + nces on geo match
+    Returns:
+        tuple: (focus_data without the Canadian rows, the quarantine ledger of the
+               Canadian rows, flagged CANADA).
+    """
+    canadian = focus_data['FOCUS_STATE'].isin(canada_state_abbvs).to_numpy()
+    canada_ledger = start_ledger(focus_data[canadian])
+    flag(canada_ledger, np.ones(len(canada_ledger), dtype=bool), CANADA)
+    return focus_data[~canadian], canada_ledger
 
-canada_state_abbvs = ['AB', 'BC', 'MB', 'NB', 'NL', 'NT', 'NS', 'NU', 'ON', 'PE', 'QC', 'SK', 'YT']
-canada_records = focus_data.loc[(focus_data['FOCUS_STATE'].isin(canada_state_abbvs))]
-focus_data, quarantined_df = quarantine(focus_data, canada_records, pd.DataFrame(), "Canada")
 
-# focus_data_no_nces_id = focus_sf_merge[focus_sf_merge['SF_NCES_ID__C'].isna()]
-focus_geodf = create_geodataframe_from_lat_lon(focus_data, lat_col='FOCUS_ADDRESS_LATITUDE',
-                                               lon_col='FOCUS_ADDRESS_LONGITUDE')
-nces_geodf = create_geodataframe_from_lat_lon(nces_data, lat_col='NCES_LAT', lon_col='NCES_LON')
+def flag_pairs(final_focus_df):
+    """
+    Starts the quarantine ledger of scored pairs, with every reason that only
+    depends on the pair itself.
+    """
+    ledger = start_ledger(final_focus_df)
+    has_candidate = ledger['actual_distance_m'].notna()
 
-DISTANCE = 100
+    flag(ledger, ~has_candidate, NO_NEARBY_CANDIDATE)
+    flag(ledger, has_candidate & (ledger['focus_nces_school_name_similarity'] < NAME_SIMILARITY_THRESHOLD), SCHOOL_NAMES_DISAGREE)
+    #flag where school district names don't match (provided there is a school district in nces; second conditional is a null-check)
+    flag(ledger, has_candidate & (ledger['focus_nces_district_name_similarity'] < NAME_SIMILARITY_THRESHOLD)
+         & (ledger['NCES_LEAID'] == ledger['NCES_LEAID']), DISTRICT_NAMES_DISAGREE)
+    return ledger
+
+
+def match_rules_fingerprint():
+    """
+    Hash of the rules match_focus_to_nces decides with: the search distance, the
+    name similarity threshold, the Canadian provinces, the standardizers' rule
+    tables and the match score weights. Saved incremental decisions made under
+    other rules are not reused (see incremental.match_incrementally).
+    """
+    rules = (DISTANCE, NAME_SIMILARITY_THRESHOLD, canada_state_abbvs, SCHOOL_ABBREVIATION_MAP, SCHOOL_TERMS_TO_REMOVE,
+             DISTRICT_ABBREVIATION_MAP, DISTRICT_COMMON_TERMS, DEFAULT_WEIGHTS)
+    return hashlib.sha256(repr(rules).encode('utf-8')).hexdigest()[:16]
+
+
+def match_focus_to_nces(focus_data, nces_data, nces_index=None, k=CANDIDATES_PER_SCHOOL):
+    """
+    Pairs every Focus school with its nearby NCES schools, scores the pairs and
+    flags them with every quarantine reason that applies. Canadian rows are
+    quarantined without being paired (see quarantine_canadian_schools).
+    Decisions only depend on the Focus school's own rows, so any subset of
+    Focus schools can be matched on its own.
+
+    Args:
+        focus_data (pd.DataFrame): Focus schools, columns prefixed 'FOCUS_'.
+        nces_data (pd.DataFrame): NCES locations, columns prefixed 'NCES_'.
+        nces_index (SpatialIndex): Optional prebuilt index over nces_data.
+        k (int): Nearest NCES schools to pair every Focus school with.
+
+    Returns:
+        pd.DataFrame: The quarantine ledger: one row per candidate pair (or per
+                      Focus school without one), with a 'quarantine_flags' bitmask
+                      and, for k > 1, a 'candidate_rank' (1 for the nearest).
+    """
+    focus_data, canada_ledger = quarantine_canadian_schools(focus_data)
+    pairs, joined_gdf = pair_focus_with_nces(focus_data, nces_data, nces_index, k)
+    ledger = flag_pairs(score_pairs(standardize_pair_names(normalize_pair_names(joined_gdf))))
+
+    # MULTIPLE FOCUS ID TO SINGLE NCES MATCH
+    # focus_to_nces_multiple_matches_df = final_focus_df.groupby('nces_id').filter(lambda x: x['FOCUS_SCHOOL_ID'].nunique() > 1)
+    ledger = with_focus_rows(focus_data, nces_data, pairs, joined_gdf, ledger)
+    if k > 1:
+        # 1 for the nearest candidate of every Focus row, the one a k=1 run would decide on
+        ledger['candidate_rank'] = pairs.groupby('left_idx').cumcount().to_numpy() + 1
+    if len(canada_ledger):
+        # first, as they were quarantined before the geo join
+        ledger = pd.concat([canada_ledger, ledger], ignore_index=True)[ledger.columns]
+    return ledger
+
+
+def with_focus_rows(focus_data, nces_data, pairs, joined_gdf, ledger):
+    """
+    Swaps the match columns the ledger was scored on for the full Focus rows of
+    its pairs, keeping the columns the stages added. Of the NCES rows only the
+    NCES_MATCH_COLUMNS and 'index_right' are kept; the rest is only joined onto
+    the rows that are written out (see with_nces_rows), so it is not copied for
+    every candidate pair.
+    """
+    scored_columns = ledger.columns.difference(joined_gdf.columns, sort=False)
+    full_rows = materialize_pairs(focus_data, nces_data[NCES_MATCH_COLUMNS], pairs).reset_index(drop=True)
+    return pd.concat([full_rows, ledger[scored_columns]], axis=1)
+
+
+def with_nces_rows(rows, nces_data):
+    """
+    Joins the NCES columns the ledger does not carry onto ledger rows, by their
+    'index_right' (the NCES row), in the NCES file's column order after it.
+
+    Args:
+        rows (pd.DataFrame): Ledger rows, e.g. the best matches or quarantined rows.
+        nces_data (pd.DataFrame): The NCES locations the ledger was matched with.
+
+    Returns:
+        pd.DataFrame: rows with the full NCES rows; empty for rows without a candidate.
+    """
+    missing = nces_data.columns.difference(rows.columns, sort=False)
+    nces_rows = nces_data[missing].reindex(rows['index_right'].to_numpy())
+    nces_rows.index = rows.index
+    columns = list(rows.columns)
+    before = columns[:columns.index('index_right') + 1]
+    after = [col for col in columns[len(before):] if col not in nces_data.columns]
+    return pd.concat([rows, nces_rows], axis=1)[before + list(nces_data.columns) + after]
+
+
+def best_matches(ledger, k=1):
+    """
+    Picks the "best guess" NCES school(s) of every Focus school without
+    quarantined rows, by composite match score (see candidate_ranking).
 
-joined_gdf = join_geodataframes_by_lat_lon_columns(focus_geodf, nces_geodf,
-                                                   left_lat='FOCUS_ADDRESS_LATITUDE',
-                                                   left_lon='FOCUS_ADDRESS_LONGITUDE',
-                                                   right_lat='NCES_LAT',
-                                                   right_lon='NCES_LON', how='left', distance=DISTANCE)
-lonely_schools = joined_gdf.loc[(joined_gdf["actual_distance_m"] != joined_gdf["actual_distance_m"])]
-joined_gdf, quarantined_df = quarantine(joined_gdf, lonely_schools, quarantined_df, "No nearby candidate schools")
-
-# focus_with_nces_id = focus_sf_merge[focus_sf_merge['SF_NCES_ID__C'].notna()]
-# complete_focus_df  = pd.concat([focus_with_nces_id,joined_gdf_no_nces_id],ignore_index=True)
-
-joined_gdf = joined_gdf.loc[(joined_gdf['actual_distance_m'] <= DISTANCE)]
-columns_to_process = [
-    'FOCUS_SCHOOL_DISTRICT_NAME',
-    'NCES_NAME',
-    'FOCUS_SCHOOL_NAME', # Add based on your actual columns
-    'NCES_SCH_NAME'      # Add based on your actual columns
-]
-normalized_df = normalize_dataframe_columns(joined_gdf, columns_to_process)
-columns_to_standardize = ['FOCUS_SCHOOL_DISTRICT_NAME_standardized', 'NCES_NAME_standardized']
-standardized_names_df = standardize_terms_in_school_district(normalized_df, columns_to_standardize)
-school_columns_to_standardize = ['FOCUS_SCHOOL_NAME_standardized','NCES_SCH_NAME_standardized']
-standardized_names_df = standardize_school_names(standardized_names_df, school_columns_to_standardize)
-# standardized_names_df = standardize_school_names(joined_gdf, ["FOCUS_SCHOOL_NAME", "NCES_SCH_NAME"])
-
-
-sim_sn_focus_df = add_similarity_score(standardized_names_df, 'FOCUS_SCHOOL_NAME_standardized', 'NCES_SCH_NAME_standardized',
-                                       'focus_nces_school_name_similarity')
-final_focus_df = add_similarity_score(sim_sn_focus_df, 'FOCUS_SCHOOL_DISTRICT_NAME', 'NCES_NAME',
-                                      'focus_nces_district_name_similarity')
-final_focus_df = add_similarity_score(final_focus_df, 'FOCUS_CITY', 'NCES_CITY',
-                                      'focus_nces_city_name_similarity')
-# FOCUS_STATE NCES_STATE
-final_focus_df = add_similarity_score(final_focus_df, 'FOCUS_STATE', 'NCES_STATE',
-                                      'focus_nces_state_name_similarity')
-final_focus_df['zip_code_match'] = final_focus_df['FOCUS_POSTAL_CODE'].eq(final_focus_df['NCES_ZIP'])
-
-names_disagree_df = final_focus_df.loc[(final_focus_df['focus_nces_school_name_similarity'] < 60)]
-final_focus_df, quarantined_df = quarantine(final_focus_df, names_disagree_df, quarantined_df, "School names disagree")
-
-#filter out where school district names don't match (provided there is a school district in nces; second conditional is a null-check)
-districts_disagree_df = final_focus_df.loc[(final_focus_df['focus_nces_district_name_similarity'] < 60) & (final_focus_df['NCES_LEAID'] == final_focus_df['NCES_LEAID'])]
-final_focus_df, quarantined_df = quarantine(final_focus_df, districts_disagree_df, quarantined_df, "District names disagree")
-
-
-# MULTIPLE FOCUS ID TO SINGLE NCES MATCH
-# focus_to_nces_multiple_matches_df = final_focus_df.groupby('nces_id').filter(lambda x: x['FOCUS_SCHOOL_ID'].nunique() > 1)
-# final_focus_df, quarantined_df = quarantine(final_focus_df, focus_to_nces_multiple_matches_df, quarantined_df, "Multiple Focus Schools matched with single NCES school")
-
-
-# Pick "best guess" school
-final_focus_df = \
-    final_focus_df.sort_values(
-        by=['FOCUS_SCHOOL_ID','focus_nces_school_name_similarity'],
-        ascending=False
-    ).groupby('FOCUS_SCHOOL_ID', as_index=False).first()
-
-nces_count_df = final_focus_df.filter(items=["NCES_NCESSCH", "FOCUS_SCHOOL_ID"], axis=1) \
-    .groupby("NCES_NCESSCH", as_index=False) \
-    .nunique() \
-
-nces_count_df = nces_count_df.loc[(nces_count_df["FOCUS_SCHOOL_ID"] > 1)]
-
-records_to_quarantine = final_focus_df.merge(
-    nces_count_df, on="NCES_NCESSCH", how="inner", suffixes=["", "_y"]
-)
-
-final_focus_df, quarantined_df = quarantine(
-    df=final_focus_df,
-    df_to_quarantine=records_to_quarantine,
-    quarantine_df=quarantined_df,
-    quarantine_reason="Suspected duplicate Focus school (multiple schools matched with this NCES id)"
-)
-
-# reorder to push all sf columns at the end
-all_columns = final_focus_df.columns.tolist()
-
-sf_cols = [col for col in all_columns if col.startswith('SF_')]
-other_cols = [col for col in all_columns if not col.startswith('SF_')]
-
-new_column_order = other_cols + sf_cols
-
-final_focus_df = final_focus_df[new_column_order]
-
-print(f"Matched {final_focus_df.shape[0]} records!")
-
-try:
-    test_non_null_columns(final_focus_df)
-except AssertionError as e:
-    print(f"Test failed: {e}")
-
-actual_distance_average = final_focus_df['actual_distance_m'].mean()
-school_sim_average = final_focus_df['focus_nces_school_name_similarity'].mean()
-sd_sim_average = final_focus_df['focus_nces_district_name_similarity'][final_focus_df['NCES_NAME'].notnull()].mean()
-print("Distance average " + str(actual_distance_average))
-print("focus_nces_school_name_similarity average " + str(school_sim_average))
-print("focus_nces_district_name_similarity average " + str(sd_sim_average))
-final_focus_df.to_csv(f'outputs/schools/schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
-quarantined_df.to_csv(f'outputs/schools/quarantined_schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
+    Args:
+        ledger (pd.DataFrame): The quarantine ledger from match_focus_to_nces.
+        k (int): How many candidates to keep per Focus school.
+
+    Returns:
+        pd.DataFrame: Up to k ledger rows per clean Focus school, by FOCUS_SCHOOL_ID
+                      and then rank.
+    """
+    clean = ledger.loc[clean_rows(ledger, 'FOCUS_SCHOOL_ID')]
+    return clean.iloc[top_candidates(clean['FOCUS_SCHOOL_ID'], clean['match_score'], k=k)]
+
+
+def duplicate_match_rows(best, resolution=QUARANTINE_CLUSTER):
+    """
+    Clusters best matches into connected Focus/NCES groups (see
+    entity_clustering) and picks the ones to quarantine: every match in a cluster
+    with more than one Focus school, or, resolving by best score, every match
+    but those of the cluster's best scoring Focus school.
+
+    Args:
+        best (pd.DataFrame): Best matches, from best_matches.
+        resolution (str): entity_clustering.QUARANTINE_CLUSTER or BEST_SCORE.
+
+    Returns:
+        np.ndarray: True for the best matches to quarantine.
+    """
+    clusters = cluster_rows(best, ['FOCUS_SCHOOL_ID', 'NCES_NCESSCH'])
+    return conflicting_rows(best, clusters, 'FOCUS_SCHOOL_ID', resolution, score_col='match_score')
+
+
+def quarantine_duplicate_matches(ledger, resolution=QUARANTINE_CLUSTER):
+    """
+    Flags, in place, the best matches whose NCES school is also the best match of
+    another clean Focus school. Needs the ledger of all Focus schools at once.
+
+    Args:
+        ledger (pd.DataFrame): The quarantine ledger from match_focus_to_nces.
+        resolution (str): As for duplicate_match_rows.
+    """
+    best = best_matches(ledger)
+    duplicate = duplicate_match_rows(best, resolution)
+    flag(ledger, pd.Series(duplicate, index=best.index).reindex(ledger.index, fill_value=False), DUPLICATE_NCES_MATCH)
+
+
+def assign_matches(ledger):
+    """
+    Resolves duplicate NCES matches with a one-to-one assignment instead of a
+    bulk quarantine: every clean candidate pair of the ledger (matched with
+    ASSIGNMENT_CANDIDATES candidates per Focus school) is an edge, and
+    assignment.assign_one_to_one picks as many Focus/NCES pairs as it can, best
+    total match score first. A Focus school that loses its nearest NCES school
+    to a better match can so still get its second or third one.
+
+    Only Focus schools whose nearest candidates are all clean take part, i.e. the
+    ones a default run would match or quarantine as duplicates only. A school
+    whose nearest NCES school was flagged for any other reason (e.g. its name
+    disagrees) stays quarantined, rather than falling back on a farther one.
+
+    Args:
+        ledger (pd.DataFrame): The quarantine ledger from match_focus_to_nces.
+
+    Returns:
+        pd.DataFrame: The ledger with only the assigned row of every assigned Focus
+                      school; Focus schools left without an NCES school keep all
+                      their rows, the clean ones flagged DUPLICATE_NCES_MATCH.
+    """
+    flags = ledger[FLAGS_COL].to_numpy()
+    focus_ids = ledger['FOCUS_SCHOOL_ID']
+    nearest_flagged = (ledger['candidate_rank'].to_numpy() == 1) & (flags != 0)
+    ruled_out = focus_ids.isin(focus_ids[((flags & SCHOOL_REASONS) != 0) | nearest_flagged].unique()).to_numpy()
+    eligible = np.flatnonzero((flags == 0) & ~ruled_out)
+
+    assigned = np.zeros(len(ledger), dtype=bool)
+    assigned[eligible] = assign_one_to_one(focus_ids.to_numpy()[eligible],
+                                           ledger['NCES_NCESSCH'].to_numpy()[eligible],
+                                           ledger['match_score'].to_numpy()[eligible])
+    has_assignment = focus_ids.isin(focus_ids[assigned].unique()).to_numpy()
+    lost = np.zeros(len(ledger), dtype=bool)
+    lost[eligible] = ~has_assignment[eligible]
+
+    keep = assigned | ~has_assignment
+    ledger = ledger.loc[keep].copy()
+    flag(ledger, lost[keep], DUPLICATE_NCES_MATCH)
+    return ledger
+
+
+def report_matches(final_focus_df):
+    print(f"Matched {final_focus_df.shape[0]} records!")
+    record_count("matched", final_focus_df.shape[0])
+
+    try:
+        test_non_null_columns(final_focus_df)
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+
+    actual_distance_average = final_focus_df['actual_distance_m'].mean()
+    school_sim_average = final_focus_df['focus_nces_school_name_similarity'].mean()
+    sd_sim_average = final_focus_df['focus_nces_district_name_similarity'][final_focus_df['NCES_NAME'].notnull()].mean()
+    print("Distance average " + str(actual_distance_average))
+    print("focus_nces_school_name_similarity average " + str(school_sim_average))
+    print("focus_nces_district_name_similarity average " + str(sd_sim_average))
+
+
+def _matcher(workers, border_buffer_m, k=CANDIDATES_PER_SCHOOL):
+    # match_focus_to_nces, run in state partitions when given workers
+    match_func = functools.partial(match_focus_to_nces, k=k)
+
+    def match(focus_part, nces_part, index):
+        if workers is None:
+            return match_func(focus_part, nces_part, index)
+        return match_partitioned(focus_part, nces_part, match_func, workers=workers,
+                                 border_buffer_m=border_buffer_m, nces_index=index)
+    return match
+
+
+def master_schools(focus_data, nces_data, nces_index=None, state_path=None, workers=None, border_buffer_m=DISTANCE,
+                   duplicate_resolution=QUARANTINE_CLUSTER):
+    """
+    Runs school mastering on already loaded sources.
+
+    Args:
+        focus_data (pd.DataFrame): Focus schools, from load_focus_data.
+        nces_data (pd.DataFrame): NCES locations, from load_nces_data.
+        nces_index (SpatialIndex): Optional prebuilt index over nces_data.
+        state_path (str): Optional incremental state file. With it, only Focus
+                          schools that changed since the last run are matched
+                          again (see incremental.match_incrementally).
+        workers (int): Match state partitions in this many processes (see
+                       partitioned_matching.match_partitioned); None matches
+                       everything in this process.
+        border_buffer_m (float): With workers, how far (in meters) past its own
+                                 schools a state partition looks for NCES schools.
+                                 The default, DISTANCE, finds the same candidates
+                                 as an unpartitioned run (see match_partitioned);
+                                 None keeps each state to its own NCES schools.
+        duplicate_resolution (str): What to do with Focus schools matched to the
+                                    same NCES school: quarantine them all
+                                    (entity_clustering.QUARANTINE_CLUSTER), keep
+                                    the best scoring one (BEST_SCORE), or assign
+                                    Focus and NCES schools one to one over several
+                                    candidates each (ASSIGNMENT, see assign_matches).
+
+    Returns:
+        tuple: (schools, quarantined) DataFrames.
+    """
+    if duplicate_resolution not in DUPLICATE_RESOLUTIONS:
+        raise ValueError(f"Unknown duplicate resolution {duplicate_resolution!r}, "
+                         f"expected one of {DUPLICATE_RESOLUTIONS}.")
+    k = ASSIGNMENT_CANDIDATES if duplicate_resolution == ASSIGNMENT else CANDIDATES_PER_SCHOOL
+    match = _matcher(workers, border_buffer_m, k)
+    if state_path is None:
+        ledger = match(focus_data, nces_data, nces_index)
+    else:
+        ledger = match_incrementally(focus_data, nces_data, nces_index, state_path, match,
+                                     match_settings={'k': k, 'rules': match_rules_fingerprint()})
+    if duplicate_resolution == ASSIGNMENT:
+        ledger = assign_matches(ledger)
+    else:
+        quarantine_duplicate_matches(ledger, duplicate_resolution)
+
+    for reason, count in count_flags(ledger, QUARANTINE_REASONS).items():
+        print(f"Quarantine '{reason}': {count} records")
+        record_count(f"quarantine: {reason}", count)
+    # materialize the outputs from the ledger
+    quarantined_df = with_nces_rows(quarantined_rows(ledger, QUARANTINE_REASONS), nces_data)
+    final_focus_df = with_nces_rows(best_matches(ledger), nces_data).drop(columns=['quarantine_flags']) \
+        .reset_index(drop=True)
+
+    final_focus_df = sf_columns_last(final_focus_df)
+
+    report_matches(final_focus_df)
+    return final_focus_df, quarantined_df
+
+
+def sf_columns_last(final_focus_df):
+    # reorder to push all sf columns at the end
+    all_columns = final_focus_df.columns.tolist()
+
+    sf_cols = [col for col in all_columns if col.startswith('SF_')]
+    other_cols = [col for col in all_columns if not col.startswith('SF_')]
+
+    new_column_order = other_cols + sf_cols
+
+    return final_focus_df[new_column_order]
+
+
+def load_mastered_schools(schools_path):
+    """
+    Reads a schools CSV written by master_schools or master_schools_streaming
+    back into the frame master_schools returns (Focus and NCES columns as strings).
+    """
+    schools = read_data(schools_path, schema=MASTERED_SCHOOLS_SCHEMA, use_cache=False)
+    # the row number written as the CSV's index
+    return schools.drop(columns=schools.columns[0])
+
+
+class _CsvAppender:
+    """
+    Writes frames to one CSV, chunk after chunk, with the header and columns of
+    the first frame and a running row number as index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.rows = 0
+
+    def append(self, df):
+        if df.empty and self.columns is not None:
+            return
+        if self.columns is None:
+            self.columns = df.columns.tolist()
+        df = df.reindex(columns=self.columns)
+        df.index = pd.RangeIndex(self.rows, self.rows + len(df))
+        df.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows)
+        self.rows += len(df)
+
+
+def master_schools_streaming(nces_data, nces_index, schools_path, quarantined_path, focus_file=FOCUS_FILE,
+                             chunk_rows=STREAM_CHUNK_ROWS, workers=None, border_buffer_m=DISTANCE,
+                             duplicate_resolution=QUARANTINE_CLUSTER):
+    """
+    Runs school mastering on the Focus export chunk by chunk, appending results
+    to the output CSVs, so memory stays flat however large the export is. Only
+    the NCES data and index stay loaded.
+
+    Every chunk goes through the whole match and quarantine chain. The duplicate
+    NCES check needs every school's best match, so best matches are held back in
+    a pending file (only their ids and scores stay in memory) and a last pass
+    over it quarantines the duplicates and writes the mastered schools. The rows
+    written are those of master_schools, in chunk order.
+
+    Args:
+        nces_data (pd.DataFrame): NCES locations, from load_nces_data.
+        nces_index (SpatialIndex): Optional prebuilt index over nces_data.
+        schools_path (str): Where to write the mastered schools.
+        quarantined_path (str): Where to write the quarantined schools.
+        focus_file (str): The Focus export.
+        chunk_rows (int): Focus rows matched at a time.
+        workers (int): As for master_schools.
+        border_buffer_m (float): As for master_schools.
+        duplicate_resolution (str): As for master_schools, but not ASSIGNMENT, which
+                                    needs every candidate of every Focus school
+                                    at once.
+
+    Returns:
+        dict: Number of quarantined records per reason.
+    """
+    if duplicate_resolution not in RESOLUTIONS:
+        raise ValueError(f"Streaming cannot resolve duplicates by {duplicate_resolution!r}, "
+                         f"expected one of {RESOLUTIONS}.")
+    match = _matcher(workers, border_buffer_m)
+    pending_path = schools_path + '.pending'
+    quarantined_out = _CsvAppender(quarantined_path)
+    pending_out = _CsvAppender(pending_path)
+    counts = dict.fromkeys(QUARANTINE_REASONS.values(), 0)
+    best_ids = []
+
+    for chunk_number, focus_chunk in enumerate(read_focus_chunks(chunk_rows, focus_file), start=1):
+        ledger = match(focus_chunk, nces_data, nces_index)
+        for reason, count in count_flags(ledger, QUARANTINE_REASONS).items():
+            counts[reason] += count
+        quarantined_out.append(with_nces_rows(quarantined_rows(ledger, QUARANTINE_REASONS), nces_data))
+        best = best_matches(ledger)
+        pending_out.append(with_nces_rows(best, nces_data))
+        best_ids.append(best[BEST_ID_COLUMNS])
+        print(f"Chunk {chunk_number}: matched {len(focus_chunk)} Focus rows")
+
+    # MULTIPLE FOCUS ID TO SINGLE NCES MATCH, across all chunks
+    best_ids = pd.concat(best_ids, ignore_index=True) if best_ids else pd.DataFrame(columns=BEST_ID_COLUMNS)
+    # pending rows are in the same order as best_ids
+    duplicate_rows = duplicate_match_rows(best_ids, duplicate_resolution)
+    del best_ids
+
+    schools_out = _CsvAppender(schools_path)
+    if pending_out.rows:
+        # read back as text, so values are written out exactly as they were
+        for pending in pd.read_csv(pending_path, index_col=0, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            duplicate = duplicate_rows[pending.index.astype(np.int64)]
+            flags = pending.loc[duplicate, FLAGS_COL].astype('int64').to_numpy() | DUPLICATE_NCES_MATCH
+            quarantined_out.append(pending[duplicate].assign(**{
+                FLAGS_COL: flags,
+                REASON_COL: describe_flags(flags, QUARANTINE_REASONS),
+            }))
+            schools_out.append(sf_columns_last(pending[~duplicate].drop(columns=[FLAGS_COL])))
+            counts[QUARANTINE_REASONS[DUPLICATE_NCES_MATCH]] += int(duplicate.sum())
+    if os.path.exists(pending_path):
+        os.remove(pending_path)
+    for out in (schools_out, quarantined_out):
+        if out.columns is None:
+            # nothing to write
+            open(out.path, 'w').close()
+
+    for reason, count in counts.items():
+        print(f"Quarantine '{reason}': {count} records")
+        record_count(f"quarantine: {reason}", count)
+    print(f"Matched {schools_out.rows} records!")
+    record_count("matched", schools_out.rows)
+    return counts
+
+
+if __name__ == "__main__":
+    RUN_FOCUS_SF_MERGE = os.environ.get("FOCUS_SF_MERGE", "") == "1"
+    # e.g. DUPLICATE_RESOLUTION=best_score to keep the best of several Focus schools matched to one NCES school
+    DUPLICATE_RESOLUTION = os.environ.get("DUPLICATE_RESOLUTION") or QUARANTINE_CLUSTER
+
+    nces_data, nces_index = load_nces_data()
+
+    # e.g. STREAM_CHUNK_ROWS=50000 to match the Focus export in chunks of that many rows
+    if os.environ.get("STREAM_CHUNK_ROWS"):
+        master_schools_streaming(nces_data, nces_index,
+                                 f'outputs/schools/schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv',
+                                 f'outputs/schools/quarantined_schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv',
+                                 chunk_rows=int(os.environ["STREAM_CHUNK_ROWS"]),
+                                 duplicate_resolution=DUPLICATE_RESOLUTION)
+        sys.exit(0)
+
+    focus_data = load_focus_data()
+    if RUN_FOCUS_SF_MERGE:
+        focus_sf_merge = merge_focus_with_sf(focus_data, load_sf_data())
+        focus_sf_merge.to_csv(f'outputs/schools/focus_sf_merge_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
+
+    # e.g. INCREMENTAL_STATE_FILE=outputs/schools/.incremental/school_matches.pkl
+    # e.g. SCHOOL_MASTERING_WORKERS=8 to match states in parallel
+    workers = int(os.environ["SCHOOL_MASTERING_WORKERS"]) if os.environ.get("SCHOOL_MASTERING_WORKERS") else None
+    final_focus_df, quarantined_df = master_schools(focus_data, nces_data, nces_index,
+                                                    state_path=os.environ.get("INCREMENTAL_STATE_FILE") or None,
+                                                    workers=workers, duplicate_resolution=DUPLICATE_RESOLUTION)
+    final_focus_df.to_csv(f'outputs/schools/schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
+    quarantined_df.to_csv(f'outputs/schools/quarantined_schools_{os.environ.get("FILE_DATE_SUFFIX")}.csv')
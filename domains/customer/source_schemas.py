@@ -0,0 +1,122 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Arrow-backed strings with NaN for missing values (pandas' default 'str' dtype from 3.0)
+STRING = pd.StringDtype('pyarrow', na_value=np.nan)
+FLOAT = 'float64'
+
+# columns: column -> dtype, in the names pandas gives them (duplicate headers become NAME.1, ...)
+# id_widths: column -> width, all-digit values left-padded with zeros after reading (codes that lost leading zeros)
+# all_columns: also read the undeclared columns, with inferred types
+SourceSchema = namedtuple('SourceSchema', ['name', 'columns', 'id_widths', 'na_values', 'encoding', 'all_columns'],
+                          defaults=({}, (), 'utf-8', False))
+
+FOCUS_SCHEMA = SourceSchema(
+    name='Focus schools and districts',
+    columns={
+        'SCHOOL_ID': STRING,
+        'SCHOOL_CODE': STRING,
+        'SCHOOL_NAME': STRING,
+        'SCHOOL_DISTRICT_ID': STRING,
+        'SCHOOL_DISTRICT_NAME': STRING,
+        'CITY': STRING,
+        'STATE': STRING,
+        'POSTAL_CODE': STRING,
+        'ADDRESS_LATITUDE': FLOAT,
+        'ADDRESS_LONGITUDE': FLOAT,
+    },
+    id_widths={'POSTAL_CODE': 5},
+)
+
+# The school address columns come first in the locations file and the district (LEA)
+# address columns repeat the same headers
+NCES_SCHEMA = SourceSchema(
+    name='NCES school locations',
+    columns={
+        'NCESSCH': STRING,
+        'SCHID': STRING,
+        'LEAID': STRING,
+        'NAME': STRING,
+        'SCH_NAME': STRING,
+        'SCH_TYPE_TEXT': STRING,
+        'LEVEL': STRING,
+        'SY_STATUS_TEXT': STRING,
+        'SCHOOL_YEAR': STRING,
+        'STREET': STRING,
+        'CITY': STRING,
+        'STATE': STRING,
+        'ZIP': STRING,
+        'STREET.1': STRING,
+        'CITY.1': STRING,
+        'STATE.1': STRING,
+        'ZIP.1': STRING,
+        'LAT': FLOAT,
+        'LON': FLOAT,
+    },
+    id_widths={'NCESSCH': 12, 'LEAID': 7, 'ZIP': 5, 'ZIP.1': 5},
+)
+
+SF_SCHEMA = SourceSchema(
+    name='Salesforce accounts',
+    columns={
+        'NAME': STRING,
+        'TYPE': STRING,
+        'BILLINGSTATE': STRING,
+        'NCES_ID__C': STRING,
+    },
+)
+
+ODEF_SCHEMA = SourceSchema(
+    name='ODEF facilities',
+    columns={
+        'facility_name': STRING,
+        'authority_id': STRING,
+        'authority_name': STRING,
+        'province_code': STRING,
+        'geometry': STRING,
+    },
+    na_values=('..',),
+    all_columns=True,
+)
+
+CUSTOMER_EXPORT_SCHEMA = SourceSchema(
+    name='DB customer export',
+    columns={
+        'MASTERPROPERTIES_ID': STRING,
+        'XREF_VALUE1': STRING,
+    },
+    all_columns=True,
+)
+
+SCHOOL_EXPORT_SCHEMA = SourceSchema(
+    name='DB school export',
+    columns={
+        'MASTERPROPERTIES_ID': STRING,
+        'MASTERPROPERTIES_NCESSCHOOLID': STRING,
+        'XREF_VALUE2': STRING,
+    },
+    id_widths={'MASTERPROPERTIES_NCESSCHOOLID': 12},
+    all_columns=True,
+)
+
+# school_mastering's own output: the prefixed Focus and NCES columns, then the scores
+MASTERED_SCHOOLS_SCHEMA = SourceSchema(
+    name='Mastered schools',
+    columns={
+        **{'FOCUS_' + col: dtype for col, dtype in FOCUS_SCHEMA.columns.items()},
+        **{'NCES_' + col: dtype for col, dtype in NCES_SCHEMA.columns.items()},
+    },
+    all_columns=True,
+)
+
+INTERMEDIATE_SCHOOLS_SCHEMA = SourceSchema(
+    name='Intermediate schools',
+    columns={
+        'MASTERPROPERTIES_NCESSCHOOLID': STRING,
+        'XREF_VALUE2': STRING,
+    },
+    id_widths={'MASTERPROPERTIES_NCESSCHOOLID': 12},
+    all_columns=True,
+)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import pickle
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from domains.customer.geo_matching import build_haversine_index
+
+SpatialIndex = namedtuple('SpatialIndex', ['tree', 'row_ids', 'coords', 'source_hash'])
+
+INDEX_FORMAT_VERSION = 1
+
+
+def file_content_hash(file_path, block_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's contents, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_lat_lon_columns(file_path, lat_col, lon_col):
+    coords = pd.read_csv(file_path, usecols=[lat_col, lon_col], low_memory=False)
+    return coords[lat_col], coords[lon_col]
+
+
+def load_or_build_spatial_index(file_path, lat_col='LAT', lon_col='LON', cache_dir=None, read_coordinates=None):
+    """
+    Loads the haversine spatial index for a reference file (e.g. the NCES locations
+    file) from disk, building and saving it first if this version of the file has
+    not been indexed yet. The artifact is keyed by the file's content hash, so a new
+    yearly file gets a new index and an unchanged one is never rebuilt.
+
+    Args:
+        file_path (str): The reference CSV file.
+        lat_col (str): The latitude column name in the file.
+        lon_col (str): The longitude column name in the file.
+        cache_dir (str): Where to keep index artifacts. Defaults to a '.cache'
+                         directory next to the file.
+        read_coordinates (callable): Optional function(file_path) -> (lat, lon) for
+                                     files whose coordinates are not plain columns.
+
+    Returns:
+        SpatialIndex: The BallTree, the file row position of every indexed point,
+                      the (lat, lon) array of every file row and the content hash.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), '.cache')
+
+    source_hash = file_content_hash(file_path)
+    index_path = os.path.join(
+        cache_dir,
+        f"{os.path.basename(file_path)}.{lat_col}_{lon_col}.{source_hash[:16]}.v{INDEX_FORMAT_VERSION}.spatial_index.pkl")
+
+    if os.path.exists(index_path):
+        with open(index_path, 'rb') as f:
+            return pickle.load(f)
+
+    if read_coordinates is None:
+        lat, lon = _read_lat_lon_columns(file_path, lat_col, lon_col)
+    else:
+        lat, lon = read_coordinates(file_path)
+    coords = np.column_stack([np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)])
+    tree, row_ids = build_haversine_index(coords[:, 0], coords[:, 1])
+    index = SpatialIndex(tree=tree, row_ids=row_ids, coords=coords, source_hash=source_hash)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, index_path)
+    print(f"Built spatial index for {os.path.basename(file_path)} ({len(row_ids)} points)")
+
+    return index
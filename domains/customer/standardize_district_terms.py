@@ -1,5 +1,84 @@
 import pandas as pd
-import re
+
+from domains.customer.distinct_values import apply_to_distinct
+from domains.customer.term_rules import compile_term_rules
+
+# Define mappings for abbreviations to full terms.
+# Added: RUSD, PSD, HTS, CS, CES, PS, PBLC, COOP, SAU, BORO
+DISTRICT_ABBREVIATION_MAP = {
+    r"\bsd\b": "school district",
+    r"\bcsd\b": "central school district",
+    r"\busd\b": "unified school district",
+    r"\bcusd\b": "consolidated unified school district",
+    r"\bccsd\b": "consolidated community school district",
+    r"\bisd\b": "independent school district",
+    r"\bhsd\b": "high school district",
+    r"\bco\b": "county",
+    r"\btwp\b": "township",
+    r"\belem\b": "elementary",
+    r"\bdist\b": "district",
+    r"\bpub\b": "public",
+    r"\bpblc\b": "public",
+    r"\breg\b": "regional",
+    r"\bsch\b": "school",
+    r"\bschl\b": "school",
+    r"\bschls\b": "schools",
+    r"\bschs\b": "schools",
+    r"\bspec ed\b": "special education",
+    r"\brusd\b": "unified school district",
+    r"\bpsd\b": "public school district",
+    r"\bhts\b": "heights",
+    r"\bcs\b": "charter school",
+    r"\bces\b": "charter school",
+    r"\bps\b": "public schools",
+    r"\bcoop\b": "cooperative",
+    r"\bsau\b": "school administrative unit",
+    r"\bboro\b": "borough",
+}
+
+# Define common terms to remove in LOWERCASE.
+DISTRICT_COMMON_TERMS = [
+    # Core terms
+    r"\bschool district\b",
+    r"\bpublic schools\b",
+    r"\bunified\b",
+    r"\bcounty\b",
+    r"\btownship\b",
+    r"\bschools\b",
+    r"\bpublic\b",
+    r"\bdistrict\b",
+    r"\bcentral\b",
+    r"\bconsolidated\b",
+    r"\bcommunity\b",
+    r"\bindependent\b",
+    #r"\bhigh school\b",
+    r"\bregional\b",
+    #r"\belementary\b",
+    #r"\bspecial education\b",
+    #r"\bcharter school\b",
+    #r"\bcooperative\b",
+    #r"\bschool administrative unit\b",
+    #r"\bborough\b",
+    #r"\bheights\b",
+    r"\bcity\b",
+    r"\bmetropolitan\b",
+    r"\barea\b",
+    #r"\bcharter\b",
+    r"\bof the city of\b"
+]
+
+
+# Compiled once: abbreviations are expanded once, then the removal list is applied twice
+_standardize_district_name = compile_term_rules(DISTRICT_ABBREVIATION_MAP, DISTRICT_COMMON_TERMS, removal_passes=2)
+
+
+def standardize_district_name(value):
+    """
+    Standardizes a single school district name; NaN becomes ''.
+    """
+    if pd.isna(value):
+        return ''
+    return _standardize_district_name(str(value))
 
 
 def standardize_terms_in_school_district(df, cols_to_standardize):
@@ -7,6 +86,10 @@ def standardize_terms_in_school_district(df, cols_to_standardize):
     Standardizes terms in specified columns of a Pandas DataFrame,
     addressing abbreviations and common terms with a more comprehensive map.
 
+    The rule tables are compiled once by term_rules.compile_term_rules, which
+    gives the same output as applying them one regex at a time. Each distinct
+    value is standardized once per run.
+
     Args:
         df (pd.DataFrame): The input DataFrame.
         cols_to_standardize (list): A list of column names (strings) to be standardized.
@@ -18,99 +101,14 @@ def standardize_terms_in_school_district(df, cols_to_standardize):
 
     df_standardized = df.copy()  # Work on a copy
 
-    # Check if the input columns exist
     for col in cols_to_standardize:
+        # Check if the input column exists
         if col not in df_standardized.columns:
             print(f"Warning: Column '{col}' not found in DataFrame. Skipping.")
             continue
 
-    # Define mappings for abbreviations to full terms.
-    # Added: RUSD, PSD, HTS, CS, CES, PS, PBLC, COOP, SAU, BORO
-    abbreviation_map = {
-        r"\bsd\b": "school district",
-        r"\bcsd\b": "central school district",
-        r"\busd\b": "unified school district",
-        r"\bcusd\b": "consolidated unified school district",
-        r"\bccsd\b": "consolidated community school district",
-        r"\bisd\b": "independent school district",
-        r"\bhsd\b": "high school district",
-        r"\bco\b": "county",
-        r"\btwp\b": "township",
-        r"\belem\b": "elementary",
-        r"\bdist\b": "district",
-        r"\bpub\b": "public",
-        r"\bpblc\b": "public",
-        r"\breg\b": "regional",
-        r"\bsch\b": "school",
-        r"\bschl\b": "school",
-        r"\bschls\b": "schools",
-        r"\bschs\b": "schools",
-        r"\bspec ed\b": "special education",
-        r"\brusd\b": "unified school district",
-        r"\bpsd\b": "public school district",
-        r"\bhts\b": "heights",
-        r"\bcs\b": "charter school",
-        r"\bces\b": "charter school",
-        r"\bps\b": "public schools",
-        r"\bcoop\b": "cooperative",
-        r"\bsau\b": "school administrative unit",
-        r"\bboro\b": "borough",
-    }
-
-    # Define common terms to remove in LOWERCASE.
-    common_terms = [
-        # Core terms
-        r"\bschool district\b",
-        r"\bpublic schools\b",
-        r"\bunified\b",
-        r"\bcounty\b",
-        r"\btownship\b",
-        r"\bschools\b",
-        r"\bpublic\b",
-        r"\bdistrict\b",
-        r"\bcentral\b",
-        r"\bconsolidated\b",
-        r"\bcommunity\b",
-        r"\bindependent\b",
-        #r"\bhigh school\b",
-        r"\bregional\b",
-        #r"\belementary\b",
-        #r"\bspecial education\b",
-        #r"\bcharter school\b",
-        #r"\bcooperative\b",
-        #r"\bschool administrative unit\b",
-        #r"\bborough\b",
-        #r"\bheights\b",
-        r"\bcity\b",
-        r"\bmetropolitan\b",
-        r"\barea\b",
-        #r"\bcharter\b",
-        r"\bof the city of\b"
-    ]
-
-    for col in cols_to_standardize:
-        # Ensure we are working with strings, and convert NaNs to empty string ''
-        df_standardized[col] = df_standardized[col].fillna('').astype(str)
-
-        # Apply the abbreviation mapping (Iterate multiple times for chained cases like CUSD -> CONSOLIDATED UNIFIED SD -> CONSOLIDATED UNIFIED SCHOOL DISTRICT)
-        # A simple loop might be sufficient for common cases, but complex chains might need more sophisticated handling. Let's add a simple loop (e.g., twice)
-        for _ in range(1):  # Apply mapping twice to handle potential chained replacements
-            for abbr, full_term in abbreviation_map.items():
-                df_standardized[col] = df_standardized[col].str.replace(abbr, full_term, regex=True)
-
-        # Remove common terms (Iterate multiple times as term removal might expose new terms to remove)
-        for _ in range(2):  # Apply removal twice
-            for term in common_terms:
-                # Add space padding to ensure we remove terms correctly even after previous removals
-                df_standardized[col] = df_standardized[col].str.replace(f' {term} ', ' ', regex=True)
-                # Handle terms at the start/end of the string
-                df_standardized[col] = df_standardized[col].str.replace(fr'^{term}\s+', '', regex=True)
-                df_standardized[col] = df_standardized[col].str.replace(fr'\s+{term}$', '', regex=True)
-                # Handle cases where the term is the entire string
-                df_standardized[col] = df_standardized[col].str.replace(fr'^{term}$', '', regex=True)
-
-        # Final cleanup: Trim leading/trailing whitespace and collapse multiple spaces
-        df_standardized[col] = df_standardized[col].str.strip().str.replace(r'\s+', ' ', regex=True)
+        # NaNs become '', then abbreviations are expanded, common terms removed and whitespace collapsed
+        df_standardized[col] = apply_to_distinct(df_standardized[col], standardize_district_name, cache_name='standardize_district_name')
 
     return df_standardized
 
@@ -0,0 +1,463 @@
+import sys
+sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from domains.customer.customer_mastering import CUSTOMER_EXPORT_FILE
+from domains.customer.id_allocator import ID_SPACE, format_ids
+from domains.customer.prettify_schools import INTERMEDIATE_SCHOOLS_FILE, SCHOOL_EXPORT_FILE
+from domains.customer.school_mastering import FOCUS_FILE, NCES_FILE, SF_FILE
+
+# Source-shaped files with made-up schools, for measuring the pipeline without
+# the client's files. NCES is the ground truth; Focus, Salesforce and the DB
+# exports are derived from it with the kinds of noise the matching steps handle:
+# abbreviations from the standardizers' tables, case and punctuation changes,
+# typos, geocoding jitter, Focus schools entered twice and schools sharing a campus.
+
+ODEF_FILE = os.path.join(os.path.dirname(FOCUS_FILE), 'odef_v3.csv')
+# NCES schools generated and written at a time; a multiple of SCHOOLS_PER_TOWN
+CHUNK_ROWS = 240_000
+
+# state -> (FIPS code, centroid lat, centroid lon)
+STATES = {
+    'AL': ('01', 32.8, -86.8), 'AZ': ('04', 34.2, -111.7), 'CA': ('06', 37.2, -119.5), 'CO': ('08', 39.0, -105.5),
+    'FL': ('12', 28.6, -82.4), 'GA': ('13', 32.7, -83.4), 'IL': ('17', 40.0, -89.2), 'MI': ('26', 43.6, -84.7),
+    'MN': ('27', 46.3, -94.3), 'NJ': ('34', 40.2, -74.7), 'NY': ('36', 42.9, -75.5), 'OH': ('39', 40.3, -82.8),
+    'PA': ('42', 40.9, -77.8), 'TX': ('48', 31.5, -99.3), 'WA': ('53', 47.4, -120.5),
+}
+# province -> (centroid lat, centroid lon), for the Canadian Focus schools and ODEF facilities
+PROVINCES = {'AB': (53.9, -116.6), 'BC': (53.7, -127.6), 'ON': (44.5, -79.5), 'QC': (46.8, -71.2)}
+
+PLACES = np.array([
+    'Lincoln', 'Washington', 'Jefferson', 'Franklin', 'Madison', 'Oak Grove', 'Maple Valley', 'Pine Ridge',
+    'Cedar Creek', 'Riverside', 'Lakeview', 'Hillcrest', 'Fairview', 'Greenwood', 'Springfield', 'Clinton',
+    'Saint Mary', 'Saint Joseph', 'Mount Vernon', 'Mount Pleasant', 'Highland', 'Westwood', 'Eastside',
+    'North Valley', 'Sunset', 'Meadowbrook', 'Brookside', 'Summit', 'Jackson', 'Roosevelt', 'Kennedy', 'Harmony',
+], dtype=object)
+# spellings the Focus export uses for place names the NCES spells out
+PLACE_VARIANTS = {'Saint ': ['St ', 'St. '], 'Mount ': ['Mt ', 'Mt. ']}
+
+# (NCES spelling, Focus spellings, the NCES one first); the others are expanded back by standardize_school_terms
+SCHOOL_KINDS = [
+    ('Elementary School', ['Elementary School', 'Elem', 'Elem School', 'ES', 'El Sch', 'Elmentary School']),
+    ('Middle School', ['Middle School', 'MS', 'Middle']),
+    ('High School', ['High School', 'HS', 'High']),
+    ('Senior High School', ['Senior High School', 'SHS', 'Sr High School']),
+    ('Junior Senior High School', ['Junior Senior High School', 'JSHS', 'Jr Sr High School']),
+    ('Charter School', ['Charter School', 'CS']),
+    ('Academy', ['Academy', 'Acad']),
+    ('Preparatory Academy', ['Preparatory Academy', 'Prep Academy', 'Prep Acad']),
+    ('Technical Center', ['Technical Center', 'Tech Ctr']),
+    ('Lutheran School', ['Lutheran School', 'Luth Sch', 'Lutheran Schl']),
+]
+# (NCES spelling, Focus spellings, the NCES one first); the others are expanded back by standardize_district_terms
+DISTRICT_KINDS = [
+    ('School District', ['School District', 'SD', 'Sch Dist']),
+    ('Unified School District', ['Unified School District', 'USD', 'RUSD']),
+    ('Independent School District', ['Independent School District', 'ISD']),
+    ('Consolidated Unified School District', ['Consolidated Unified School District', 'CUSD', 'Consolidated USD']),
+    ('Central School District', ['Central School District', 'CSD']),
+    ('Public Schools', ['Public Schools', 'PS', 'Pub Schools']),
+    ('County Schools', ['County Schools', 'Co Schools']),
+    ('Township Schools', ['Township Schools', 'Twp Schls']),
+]
+SCHOOL_TYPES = np.array(['Regular School', 'Private', 'Special Education School', 'Career and Technical School',
+                         'Alternative School'], dtype=object)
+SCHOOL_TYPE_WEIGHTS = [0.7, 0.2, 0.03, 0.03, 0.04]
+SF_TYPES = np.array(['Customer', 'Former Customer', 'Prospect', 'Partner'], dtype=object)
+
+# nces_chunk columns that are not NCES columns
+GENERATOR_COLUMNS = ['district', 'kind', 'name_stem']
+
+SCHOOLS_PER_DISTRICT = 8
+# a multiple of SCHOOLS_PER_DISTRICT, so every district is within one town
+SCHOOLS_PER_TOWN = 24
+# degrees; about 100 km between towns of a state and 1 km between schools of a town
+TOWN_SPREAD = 1.0
+SCHOOL_SPREAD = 0.01
+METERS_PER_DEGREE = 111_000
+
+
+def _pick(rng, choices, n, p=None):
+    return np.asarray(choices, dtype=object)[rng.choice(len(choices), size=n, p=p)]
+
+
+def _spell(rng, kinds, kind_codes, focus, full_rate=0.5):
+    # the NCES spelling of every kind, or a Focus spelling: the NCES one for
+    # full_rate of them and an abbreviation for the others
+    if not focus:
+        return np.array([full for full, _ in kinds], dtype=object)[kind_codes]
+    spellings = np.empty(len(kind_codes), dtype=object)
+    for code, (_, variants) in enumerate(kinds):
+        rows = np.flatnonzero(kind_codes == code)
+        abbreviated = rows[rng.random(len(rows)) >= full_rate]
+        spellings[rows] = variants[0]
+        spellings[abbreviated] = _pick(rng, variants[1:], len(abbreviated))
+    return spellings
+
+
+def _vary_places(rng, names):
+    # 'Saint Mary' -> 'St Mary' / 'St. Mary', and so on
+    names = pd.Series(names, dtype=object)
+    for full, variants in PLACE_VARIANTS.items():
+        rows = np.flatnonzero(names.str.contains(full, regex=False).to_numpy() & (rng.random(len(names)) < 0.7))
+        names.iloc[rows] = [name.replace(full, variant, 1) for name, variant in
+                            zip(names.iloc[rows], _pick(rng, variants, len(rows)))]
+    return names.to_numpy()
+
+
+def _add_typos(rng, names, rate):
+    # one character dropped or two swapped
+    names = names.copy()
+    for row in np.flatnonzero(rng.random(len(names)) < rate):
+        name = names[row]
+        if len(name) < 4:
+            continue
+        at = rng.integers(1, len(name) - 2)
+        names[row] = name[:at] + name[at + 1:] if rng.random() < 0.5 else \
+            name[:at] + name[at + 1] + name[at] + name[at + 2:]
+    return names
+
+
+def _vary_case(rng, names, upper_rate):
+    names = pd.Series(names, dtype=object)
+    draw = rng.random(len(names))
+    names[draw < upper_rate] = names[draw < upper_rate].str.upper()
+    names[draw > 1 - upper_rate / 4] = names[draw > 1 - upper_rate / 4].str.lower()
+    return names.to_numpy()
+
+
+def _digits(values, width):
+    return pd.Series(values).astype(str).str.zfill(width).to_numpy(dtype=object)
+
+
+def nces_chunk(rng, start, n):
+    """
+    Generates n NCES school locations, numbered from start. Schools come in
+    districts of SCHOOLS_PER_DISTRICT within towns of SCHOOLS_PER_TOWN (start
+    must be a multiple of it, so no town spans two chunks); some share a campus
+    with the school before them. Private schools have no district (LEAID).
+
+    LEAIDs are the state's FIPS code and the district number, NCESSCHs the LEAID
+    and the school number (5 digits each), so both are unique at any scale and
+    12 characters long up to 100,000 districts, longer past that.
+
+    Returns:
+        pd.DataFrame: The NCES_SCHEMA columns, plus the district number, the
+                      school kind code and the school name without its kind,
+                      in GENERATOR_COLUMNS.
+    """
+    if start % SCHOOLS_PER_TOWN:
+        raise ValueError(f"Chunks must start at a multiple of {SCHOOLS_PER_TOWN} schools, not at {start}.")
+    states = list(STATES)
+    number = start + np.arange(n)
+    # towns of the chunk, from 0
+    town = np.arange(n) // SCHOOLS_PER_TOWN
+    town_state = rng.integers(0, len(states), town.max() + 1)
+    state = np.asarray(states, dtype=object)[town_state[town]]
+    centroid = np.array([STATES[code][1:] for code in states])[town_state]
+    town_center = centroid + rng.normal(0, TOWN_SPREAD, centroid.shape)
+    lat = town_center[town, 0] + rng.normal(0, SCHOOL_SPREAD, n)
+    lon = town_center[town, 1] + rng.normal(0, SCHOOL_SPREAD, n)
+    shared_campus = np.flatnonzero(rng.random(n) < 0.03)
+    shared_campus = shared_campus[shared_campus > 0]
+    lat[shared_campus] = lat[shared_campus - 1] + rng.normal(0, 5 / METERS_PER_DEGREE, len(shared_campus))
+    lon[shared_campus] = lon[shared_campus - 1] + rng.normal(0, 5 / METERS_PER_DEGREE, len(shared_campus))
+
+    # districts stay within a town, so they stay within a state
+    district = number // SCHOOLS_PER_DISTRICT
+    fips = np.array([STATES[code][0] for code in state], dtype=object)
+    leaid = fips + _digits(district, 5)
+    # a district's school numbers are consecutive, so the last 5 digits tell them apart
+    ncessch = leaid + _digits(number % 100_000, 5)
+    school_type = _pick(rng, SCHOOL_TYPES, n, p=SCHOOL_TYPE_WEIGHTS)
+    private = school_type == 'Private'
+
+    district_place = PLACES[district % len(PLACES)]
+    district_kind = district % len(DISTRICT_KINDS)
+    district_name = district_place + ' ' + _spell(rng, DISTRICT_KINDS, district_kind, focus=False)
+    kind = rng.integers(0, len(SCHOOL_KINDS), n)
+    name_stem = _pick(rng, PLACES, n) + ' ' + _digits(number % 1000, 1)
+    school_name = name_stem + ' ' + _spell(rng, SCHOOL_KINDS, kind, focus=False)
+    city = PLACES[(number // SCHOOLS_PER_TOWN) % len(PLACES)]
+    zip_code = _digits(rng.integers(1000, 99999, n), 5)
+    street = _digits(rng.integers(1, 9999, n), 1) + ' ' + _pick(rng, ['Main St', 'Oak Ave', 'School Rd', 'Elm St'], n)
+
+    return pd.DataFrame({
+        'NCESSCH': ncessch,
+        'SCHID': fips + _digits(number, 5),
+        'LEAID': np.where(private, '', leaid),
+        'NAME': np.where(private, '', district_name),
+        'SCH_NAME': school_name,
+        'SCH_TYPE_TEXT': school_type,
+        'LEVEL': _pick(rng, ['Elementary', 'Middle', 'High', 'Other'], n),
+        'SY_STATUS_TEXT': 'Open',
+        'SCHOOL_YEAR': '2023-2024',
+        'STREET': street,
+        'CITY': city,
+        'STATE': state,
+        'ZIP': zip_code,
+        'STREET.1': np.where(private, '', street),
+        'CITY.1': np.where(private, '', city),
+        'STATE.1': np.where(private, '', state),
+        'ZIP.1': np.where(private, '', zip_code),
+        'LAT': lat,
+        'LON': lon,
+        'district': district,
+        'kind': kind,
+        'name_stem': name_stem,
+    })
+
+
+def focus_chunk(rng, nces, first_id, coverage=0.9, duplicate_rate=0.02, repeated_row_rate=0.03,
+                far_rate=0.03, missing_coordinates_rate=0.01, typo_rate=0.05):
+    """
+    Derives Focus export rows from NCES schools: coverage of them, with Focus
+    spellings, case changes and typos, coordinates jittered by a few tens of
+    meters (far_rate of them geocoded hundreds of meters off, some missing),
+    duplicate_rate of them entered twice under two Focus IDs, and
+    repeated_row_rate of the Focus IDs on two adjacent rows.
+
+    Returns:
+        pd.DataFrame: The FOCUS_SCHEMA columns, plus 'OTHER' and the NCES school
+                      each row was made from, in 'NCESSCH'.
+    """
+    picked = np.flatnonzero(rng.random(len(nces)) < coverage)
+    twice = picked[rng.random(len(picked)) < duplicate_rate]
+    source = nces.iloc[np.sort(np.concatenate([picked, twice]))].reset_index(drop=True)
+    n = len(source)
+
+    kind_spelling = _spell(rng, SCHOOL_KINDS, source['kind'].to_numpy(), focus=True)
+    school_name = _vary_places(rng, source['name_stem'].to_numpy(dtype=object)) + ' ' + kind_spelling
+    school_name = _add_typos(rng, _vary_case(rng, school_name, 0.3), typo_rate)
+
+    district_kind = source['district'].to_numpy() % len(DISTRICT_KINDS)
+    district_name = PLACES[source['district'].to_numpy() % len(PLACES)] + ' ' + \
+        _spell(rng, DISTRICT_KINDS, district_kind, focus=True, full_rate=0.8)
+    district_name = _vary_case(rng, _vary_places(rng, district_name), 0.1)
+
+    jitter = rng.normal(0, 15 / METERS_PER_DEGREE, (n, 2))
+    far = rng.random(n) < far_rate
+    jitter[far] = rng.choice([-1, 1], (far.sum(), 2)) * rng.uniform(300, 3000, (far.sum(), 2)) / METERS_PER_DEGREE
+    lat = source['LAT'].to_numpy() + jitter[:, 0]
+    lon = source['LON'].to_numpy() + jitter[:, 1]
+    missing = rng.random(n) < missing_coordinates_rate
+    lat[missing], lon[missing] = 0.0, 0.0
+
+    focus = pd.DataFrame({
+        'SCHOOL_ID': first_id + np.arange(n),
+        'SCHOOL_CODE': 'C' + _digits(first_id + np.arange(n), 1),
+        'SCHOOL_NAME': school_name,
+        'SCHOOL_DISTRICT_ID': 5000 + source['district'].to_numpy(),
+        'SCHOOL_DISTRICT_NAME': district_name,
+        'CITY': _vary_case(rng, source['CITY'].to_numpy(dtype=object), 0.5),
+        'STATE': source['STATE'].to_numpy(dtype=object),
+        'POSTAL_CODE': np.where(rng.random(n) < 0.9, source['ZIP'].to_numpy(dtype=object),
+                                _digits(rng.integers(1000, 99999, n), 5)),
+        'ADDRESS_LATITUDE': lat,
+        'ADDRESS_LONGITUDE': lon,
+        'OTHER': 'y',
+        'NCESSCH': source['NCESSCH'].to_numpy(dtype=object),
+    })
+    repeated = np.flatnonzero(rng.random(n) < repeated_row_rate)
+    # the second row of a school differs in its code only and stays next to the first
+    extra = focus.iloc[repeated].assign(SCHOOL_CODE=lambda df: df['SCHOOL_CODE'] + 'B')
+    return pd.concat([focus, extra]).sort_values('SCHOOL_ID', kind='stable').reset_index(drop=True)
+
+
+def canada_chunk(rng, n, first_id):
+    """
+    Generates n Canadian Focus schools and their ODEF facilities (plus as many
+    ODEF facilities without a Focus school), the way canada_schools_odefv3 reads
+    them: 'POINT (lon lat)' geometries and '..' for missing values.
+
+    Returns:
+        tuple: (focus, odef) DataFrames.
+    """
+    provinces = list(PROVINCES)
+    province = _pick(rng, provinces, 2 * n)
+    centroid = np.array([PROVINCES[code] for code in province])
+    lat = centroid[:, 0] + rng.normal(0, TOWN_SPREAD, 2 * n)
+    lon = centroid[:, 1] + rng.normal(0, TOWN_SPREAD, 2 * n)
+    # numbered from first_id, so chunks never share an authority
+    authority = first_id + rng.integers(0, max(n // SCHOOLS_PER_DISTRICT, 1), 2 * n)
+    authority_name = PLACES[authority % len(PLACES)] + ' ' + _pick(rng, ['School Board', 'District School Board',
+                                                                         'Catholic School Board'], 2 * n)
+    kind = rng.integers(0, len(SCHOOL_KINDS), 2 * n)
+    name_stem = _pick(rng, PLACES, 2 * n) + ' ' + _digits(np.arange(2 * n) % 1000, 1)
+    odef = pd.DataFrame({
+        'facility_name': name_stem + ' ' + _spell(rng, SCHOOL_KINDS, kind, focus=False),
+        'authority_id': np.where(rng.random(2 * n) < 0.05, '..', 'A' + _digits(authority, 5)),
+        'authority_name': authority_name,
+        'province_code': province,
+        'geometry': 'POINT (' + pd.Series(lon).round(6).astype(str).to_numpy(dtype=object) + ' ' +
+                    pd.Series(lat).round(6).astype(str).to_numpy(dtype=object) + ')',
+    })
+    jitter = rng.normal(0, 15 / METERS_PER_DEGREE, (n, 2))
+    focus = pd.DataFrame({
+        'SCHOOL_ID': first_id + np.arange(n),
+        'SCHOOL_CODE': 'C' + _digits(first_id + np.arange(n), 1),
+        'SCHOOL_NAME': _vary_case(rng, name_stem[:n] + ' ' + _spell(rng, SCHOOL_KINDS, kind[:n], focus=True), 0.3),
+        'SCHOOL_DISTRICT_ID': 10_000_000 + authority[:n],
+        'SCHOOL_DISTRICT_NAME': _vary_case(rng, authority_name[:n], 0.1),
+        'CITY': _pick(rng, PLACES, n),
+        'STATE': province[:n],
+        'POSTAL_CODE': _pick(rng, ['K1A 0B1', 'M5V 2T6', 'H2Y 1C6', 'V6B 4Y8'], n),
+        'ADDRESS_LATITUDE': lat[:n] + jitter[:, 0],
+        'ADDRESS_LONGITUDE': lon[:n] + jitter[:, 1],
+        'OTHER': 'y',
+    })
+    return focus, odef
+
+
+def sf_chunk(rng, nces, account_rate=0.3, duplicate_rate=0.05):
+    """
+    Salesforce accounts for account_rate of the districts of the NCES schools,
+    named the Focus way, some entered twice, most with the district's LEAID.
+    """
+    districts = nces.loc[nces['LEAID'] != ''].drop_duplicates('district')
+    districts = districts[rng.random(len(districts)) < account_rate]
+    districts = pd.concat([districts, districts[rng.random(len(districts)) < duplicate_rate]])
+    n = len(districts)
+    district_kind = districts['district'].to_numpy() % len(DISTRICT_KINDS)
+    name = PLACES[districts['district'].to_numpy() % len(PLACES)] + ' ' + \
+        _spell(rng, DISTRICT_KINDS, district_kind, focus=True)
+    return pd.DataFrame({
+        'NAME': _vary_case(rng, _vary_places(rng, name), 0.2),
+        'TYPE': _pick(rng, SF_TYPES, n, p=[0.4, 0.2, 0.3, 0.1]),
+        'BILLINGSTATE': districts['STATE'].to_numpy(dtype=object),
+        'NCES_ID__C': np.where(rng.random(n) < 0.7, districts['LEAID'].to_numpy(dtype=object), ''),
+    })
+
+
+def _masterproperties_ids(numbers):
+    # distinct for distinct numbers, and spread over the whole ID space
+    return format_ids((np.asarray(numbers, dtype=np.int64) * 7_919_007_091 + 104_729) % ID_SPACE)
+
+
+def exports_chunk(rng, nces, focus, first_number, export_rate=0.5):
+    """
+    DB exports as of an earlier run: export_rate of the Focus schools already
+    mastered to their NCES school (in the school export and the intermediate
+    file), and a customer for each of their districts. IDs are numbered from
+    first_number, schools even and customers odd, so chunks never share one.
+
+    Returns:
+        tuple: (school_export, intermediate, customer_export) DataFrames.
+    """
+    # the DB holds one school per NCES school
+    exported = focus.drop_duplicates('SCHOOL_ID').drop_duplicates('NCESSCH')
+    exported = exported[rng.random(len(exported)) < export_rate]
+    source = nces.set_index('NCESSCH').loc[exported['NCESSCH'].to_numpy()].reset_index()
+    focus_ids = '[' + exported['SCHOOL_ID'].astype(str).to_numpy(dtype=object) + ']'
+    intermediate = pd.DataFrame({
+        'MASTERPROPERTIES_NCESSCHOOLID': source['NCESSCH'].to_numpy(dtype=object),
+        'XREF_SOURCESYSTEM2': 'focus',
+        'XREF_KEYNAME2': 'ids',
+        'XREF_VALUE2': focus_ids,
+    })
+    school_export = intermediate.assign(
+        MASTERPROPERTIES_ID=_masterproperties_ids(2 * (first_number + np.arange(len(intermediate)))),
+        MASTERPROPERTIES_SCHOOLNAME=source['SCH_NAME'].to_numpy(dtype=object),
+    )[['MASTERPROPERTIES_ID'] + list(intermediate.columns) + ['MASTERPROPERTIES_SCHOOLNAME']]
+    leaids = pd.unique(source.loc[source['LEAID'] != '', 'LEAID'])
+    customer_export = pd.DataFrame({
+        'MASTERPROPERTIES_ID': _masterproperties_ids(2 * (first_number + np.arange(len(leaids))) + 1),
+        'XREF_VALUE1': pd.Series(leaids, dtype=object).astype(np.int64).astype(str).to_numpy(dtype=object),
+    })
+    return school_export, intermediate, customer_export
+
+
+def source_paths(directory):
+    """
+    Where generate_sources writes each file: the repo's own file names, under directory.
+    """
+    return {
+        'focus': os.path.join(directory, os.path.basename(FOCUS_FILE)),
+        'nces': os.path.join(directory, os.path.basename(NCES_FILE)),
+        'sf': os.path.join(directory, os.path.basename(SF_FILE)),
+        'odef': os.path.join(directory, os.path.basename(ODEF_FILE)),
+        'school_export': os.path.join(directory, os.path.basename(SCHOOL_EXPORT_FILE)),
+        'intermediate': os.path.join(directory, os.path.basename(INTERMEDIATE_SCHOOLS_FILE)),
+        'customer_export': os.path.join(directory, os.path.basename(CUSTOMER_EXPORT_FILE)),
+    }
+
+
+def _append_csv(df, path, first, header=None):
+    df.to_csv(path, index=False, mode='w' if first else 'a', header=(header or True) if first else False)
+
+
+def generate_sources(rows, directory, seed=0, chunk_rows=CHUNK_ROWS, canada_rate=0.02):
+    """
+    Writes a full set of synthetic source files for rows NCES schools (about
+    0.9 * rows Focus rows), chunk by chunk, so memory stays flat at any scale.
+    The same rows, seed and chunk_rows give the same files.
+
+    Args:
+        rows (int): NCES schools, e.g. 10_000 to 5_000_000.
+        directory (str): Where to write the files (see source_paths).
+        seed (int): Random seed.
+        chunk_rows (int): NCES schools generated at a time, a multiple of
+                          SCHOOLS_PER_TOWN.
+        canada_rate (float): Canadian Focus schools, as a share of the NCES schools.
+
+    Returns:
+        dict: Source name -> path, plus 'manifest', a JSON file with the
+              generator settings, the file names and their row counts.
+    """
+    if chunk_rows % SCHOOLS_PER_TOWN:
+        raise ValueError(f"chunk_rows must be a multiple of {SCHOOLS_PER_TOWN}, not {chunk_rows}.")
+    os.makedirs(directory, exist_ok=True)
+    paths = source_paths(directory)
+    rng = np.random.default_rng(seed)
+    counts = dict.fromkeys(paths, 0)
+    nces_header = [col.split('.')[0] for col in nces_chunk(rng, 0, 1).columns if col not in GENERATOR_COLUMNS]
+    next_focus_id = 100_000
+
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        first = start == 0
+        nces = nces_chunk(rng, start, n)
+        focus = focus_chunk(rng, nces, next_focus_id)
+        next_focus_id += len(focus)
+        canada_focus, odef = canada_chunk(rng, int(n * canada_rate), next_focus_id)
+        next_focus_id += len(canada_focus)
+        school_export, intermediate, customer_export = exports_chunk(rng, nces, focus, start)
+
+        outputs = {
+            'nces': nces.drop(columns=GENERATOR_COLUMNS),
+            'focus': pd.concat([focus.drop(columns='NCESSCH'), canada_focus], ignore_index=True),
+            'sf': sf_chunk(rng, nces),
+            'odef': odef,
+            'school_export': school_export,
+            'intermediate': intermediate,
+            'customer_export': customer_export,
+        }
+        for name, df in outputs.items():
+            # the NCES file repeats the address headers for the district address
+            _append_csv(df, paths[name], first, header=nces_header if name == 'nces' else None)
+            counts[name] += len(df)
+        print(f"Generated {start + n} of {rows} NCES schools")
+
+    manifest = os.path.join(directory, 'synthetic_manifest.json')
+    with open(manifest, 'w') as f:
+        json.dump({'rows': rows, 'seed': seed, 'chunk_rows': chunk_rows, 'canada_rate': canada_rate,
+                   'files': {name: os.path.basename(path) for name, path in paths.items()}, 'counts': counts},
+                  f, indent=2)
+    return {**paths, 'manifest': manifest}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Focus/NCES/SF/ODEF-shaped source files.")
+    parser.add_argument('--rows', type=int, default=10_000, help="NCES schools to generate (10k to 5M).")
+    parser.add_argument('--output-dir', default='synthetic')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for name, path in generate_sources(args.rows, args.output_dir, seed=args.seed).items():
+        print(f"{name}: {path}")
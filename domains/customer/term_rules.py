@@ -0,0 +1,200 @@
+import re
+
+import pandas as pd
+
+
+def apply_term_rules_sequentially(series, abbreviation_map, terms_to_remove, removal_passes=2):
+    """
+    Reference implementation of the standardizers' rule tables: one full-column
+    regex pass per abbreviation, then four regex passes per removal term, repeated
+    `removal_passes` times. compile_term_rules must reproduce this exactly.
+
+    Args:
+        series (pd.Series): Strings to standardize (no NaNs).
+        abbreviation_map (dict): Regex pattern -> replacement, applied in order.
+        terms_to_remove (list): Regex patterns of whole terms to remove, in order.
+        removal_passes (int): How many times the removal list is applied.
+
+    Returns:
+        pd.Series: The standardized strings.
+    """
+    for abbr, full in abbreviation_map.items():
+        series = series.str.replace(abbr, full, regex=True)
+
+    for _ in range(removal_passes):
+        for term in terms_to_remove:
+            series = series.str.replace(f' {term} ', ' ', regex=True)
+            series = series.str.replace(fr'^{term}\s+', '', regex=True)
+            series = series.str.replace(fr'\s+{term}$', '', regex=True)
+            series = series.str.replace(fr'^{term}$', '', regex=True)
+
+    return series.str.strip().str.replace(r'\s+', ' ', regex=True)
+
+
+def _term_tokens(term):
+    words = re.fullmatch(r'\\b([\w ]+)\\b', term)
+    if words is None:
+        raise ValueError(f"Removal term {term!r} must be whole words wrapped in \\b.")
+    return tuple(words.group(1).split(' '))
+
+
+def _remove_term(tokens, term):
+    """
+    Token-level equivalent of the four regex passes for one removal term on a
+    single-spaced, stripped string.
+    """
+    m = len(term)
+
+    # ' term ' -> ' ': interior, non-overlapping, and a match consumes the space the
+    # next occurrence would need, so back-to-back repeats only lose the first one
+    kept = []
+    i, blocked = 0, -1
+    n = len(tokens)
+    while i < n:
+        if 1 <= i != blocked and i + m <= n - 1 and tuple(tokens[i:i + m]) == term:
+            blocked = i + m
+            i += m
+            continue
+        kept.append(tokens[i])
+        i += 1
+    tokens = kept
+
+    # '^term\s+', '\s+term$' and '^term$'
+    if len(tokens) > m and tuple(tokens[:m]) == term:
+        tokens = tokens[m:]
+    if len(tokens) > m and tuple(tokens[-m:]) == term:
+        tokens = tokens[:-m]
+    if tuple(tokens) == term:
+        tokens = []
+    return tokens
+
+
+def compile_term_rules(abbreviation_map, terms_to_remove, removal_passes=2):
+    """
+    Compiles a standardizer's rule tables once into a function that standardizes
+    a single string in one scan, with output identical to
+    apply_term_rules_sequentially.
+
+    Each abbreviation's replacement is precomputed with the later abbreviations
+    already applied, so the chained expansions of the sequential passes (e.g.
+    'ms' -> 'middle school' -> 'middle school school') come out of one lookup.
+    Plain-word strings are expanded token by token from a dict keyed on the first
+    word; anything else goes through a single alternation regex. Removal works on
+    tokens and only visits the terms whose words occur in the string. Strings that
+    are not single-spaced and stripped fall back to the sequential regexes.
+
+    Args:
+        abbreviation_map (dict): Regex pattern -> replacement, applied in order.
+        terms_to_remove (list): Regex patterns of whole terms to remove, in order.
+        removal_passes (int): How many times the removal list is applied.
+
+    Returns:
+        callable: A function str -> str.
+    """
+    abbreviations = list(abbreviation_map.items())
+    compiled_abbreviations = [(re.compile(abbr), full) for abbr, full in abbreviations]
+
+    expansions = []
+    for position, (_, full) in enumerate(abbreviations):
+        for pattern, later_full in compiled_abbreviations[position + 1:]:
+            full = pattern.sub(later_full, full)
+        expansions.append(full)
+    alternation = re.compile('|'.join(f"(?P<r{position}>{abbr})" for position, (abbr, _) in enumerate(abbreviations)))
+
+    # Abbreviations that are plain words can also be matched token by token, keyed on
+    # their first word; alternatives at the same position keep their table order
+    abbreviations_by_word = {}
+    for position, (abbr, _) in enumerate(abbreviations):
+        words = re.fullmatch(r'\\b([\w ]+)\\b', abbr)
+        if words is None:
+            abbreviations_by_word = None
+            break
+        words = tuple(words.group(1).split(' '))
+        abbreviations_by_word.setdefault(words[0], []).append((words, expansions[position].split(' ')))
+
+    removal_terms = [_term_tokens(term) for term in terms_to_remove]
+    compiled_removals = [
+        (re.compile(f' {term} '), re.compile(fr'^{term}\s+'), re.compile(fr'\s+{term}$'), re.compile(fr'^{term}$'))
+        for term in terms_to_remove
+    ]
+    removal_terms_by_word = {}
+    for position, term in enumerate(removal_terms):
+        for word in term:
+            removal_terms_by_word.setdefault(word, set()).add(position)
+    whitespace = re.compile(r'\s+')
+    plain_words = re.compile(r'[\w ]*')
+
+    def expand(match):
+        return expansions[int(match.lastgroup[1:])]
+
+    def expand_tokens(tokens):
+        expanded = []
+        i, n = 0, len(tokens)
+        while i < n:
+            for words, expansion in abbreviations_by_word.get(tokens[i], ()):
+                if tuple(tokens[i:i + len(words)]) == words:
+                    expanded.extend(expansion)
+                    i += len(words)
+                    break
+            else:
+                expanded.append(tokens[i])
+                i += 1
+        return expanded
+
+    def standardize_sequentially(text):
+        for pattern, full in compiled_abbreviations:
+            text = pattern.sub(full, text)
+        for _ in range(removal_passes):
+            for interior, leading, trailing, whole in compiled_removals:
+                text = whole.sub('', trailing.sub('', leading.sub('', interior.sub(' ', text))))
+        return whitespace.sub(' ', text.strip())
+
+    def standardize(text):
+        if ' '.join(text.split()) != text:
+            return standardize_sequentially(text)
+
+        if abbreviations_by_word is not None and plain_words.fullmatch(text):
+            tokens = expand_tokens(text.split(' ')) if text else []
+        else:
+            text = alternation.sub(expand, text) if abbreviations else text
+            tokens = text.split(' ') if text else []
+
+        for _ in range(removal_passes):
+            candidates = set()
+            for token in tokens:
+                candidates.update(removal_terms_by_word.get(token, ()))
+            if not candidates:
+                break
+            present = set(tokens)
+            for position in sorted(candidates):
+                if present.issuperset(removal_terms[position]):
+                    tokens = _remove_term(tokens, removal_terms[position])
+        return ' '.join(tokens)
+
+    return standardize
+
+
+def find_rule_mismatches(values, abbreviation_map, terms_to_remove, removal_passes=2):
+    """
+    Runs both the compiled and the sequential rule engines over `values` and
+    returns every value on which they disagree.
+
+    Args:
+        values (iterable): Strings to check, e.g. historical name columns.
+        abbreviation_map (dict): Regex pattern -> replacement, applied in order.
+        terms_to_remove (list): Regex patterns of whole terms to remove, in order.
+        removal_passes (int): How many times the removal list is applied.
+
+    Returns:
+        pd.DataFrame: Columns value, expected (sequential) and actual (compiled);
+                      empty when the engines agree.
+    """
+    values = pd.Series(pd.unique(pd.Series(list(values), dtype=object).fillna('').astype(str)), dtype=object)
+    expected = apply_term_rules_sequentially(values, abbreviation_map, terms_to_remove, removal_passes)
+    actual = values.map(compile_term_rules(abbreviation_map, terms_to_remove, removal_passes))
+    mismatches = expected.to_numpy() != actual.to_numpy()
+    return pd.DataFrame({
+        'value': values[mismatches],
+        'expected': expected[mismatches],
+        'actual': actual[mismatches],
+    })
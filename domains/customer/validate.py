@@ -2,50 +2,29 @@ import sys
 sys.path.insert(0, "/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/")
 
 from domains.customer.Reader import read_data
-import pandas as pd
-import numpy as np
-from math import isnan
+from domains.customer.reconciliation import AGREE, CATEGORY_COL, CONFLICT, LEFT_ID_COL, LEFT_ONLY, RIGHT_ID_COL, \
+    RIGHT_ONLY, reconcile, reconciliation_report
 
 
-def is_null(field):
-    return field != field
+if __name__ == "__main__":
+    tw_data = read_data(
+        '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/op_9.csv')
 
+    nix_data = read_data(
+        '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/n-ix2.csv')
 
-tw_data = read_data(
-    '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/op_9.csv')
+    merged = reconcile(tw_data, nix_data, right_col='nix_NCES_ID')
+    category = merged[CATEGORY_COL]
+    merged = merged.assign(agree=category == AGREE, nix_miss=category == LEFT_ONLY, tw_miss=category == RIGHT_ONLY,
+                           conflict=category == CONFLICT)
 
-nix_data = read_data(
-    '/Users/michaelbarnett/Desktop/clients/FirstStudent/fs-ssot-poc/domains/customer/DataFiles/n-ix2.csv')
+    print(f"Agreed: {merged['agree'].sum()}")
+    print(f"Nix Miss: {merged['nix_miss'].sum()}")
+    print(f"Tw Miss: {merged['tw_miss'].sum()}")
+    print(f"Conflicts: {merged['conflict'].sum()}")
+    print(reconciliation_report(merged).to_string(index=False))
 
-merged = tw_data.merge(nix_data, on="FOCUS_SCHOOL_ID", how="outer")
+    merged = merged.rename(columns={LEFT_ID_COL: "NCES_NCESSCH", RIGHT_ID_COL: "nix_NCES_ID"}) \
+        .filter(items=["FOCUS_SCHOOL_ID", "NCES_NCESSCH", "nix_NCES_ID", "agree", "nix_miss", "tw_miss", "conflict"])
 
-
-
-merged['agree'] = merged.apply(
-        lambda row: row['NCES_NCESSCH'] == row['nix_NCES_ID'], axis=1
-    )
-merged['nix_miss'] = merged.apply(
-    lambda row: (is_null(row['nix_NCES_ID'])) & (not is_null(row['NCES_NCESSCH'])), axis=1
-)
-
-merged['tw_miss'] = merged.apply(
-    lambda row: (is_null(row['NCES_NCESSCH'])) & (not is_null(row['nix_NCES_ID'])), axis=1
-)
-
-merged['conflict'] = merged.apply(
-    lambda row: (not is_null(row['nix_NCES_ID'])) & (not is_null(row['NCES_NCESSCH'])) & (row['NCES_NCESSCH'] != row['nix_NCES_ID']), axis=1
-)
-
-
-print(f"Agreed: {merged.loc[(merged['agree'])].shape[0]}")
-print(f"Nix Miss: {merged.loc[(merged['nix_miss'])].shape[0]}")
-print(f"Tw Miss: {merged.loc[(merged['tw_miss'])].shape[0]}")
-print(f"Conflicts: {merged.loc[(merged['conflict'])].shape[0]}")
-
-
-merged = merged.filter(items=["FOCUS_SCHOOL_ID", "NCES_NCESSCH", "nix_NCES_ID", "agree", "nix_miss", "tw_miss", "conflict"])
-
-# print(merged.head(50))
-# raise Exception()
-
-merged.to_csv('val_9.csv')
\ No newline at end of file
+    merged.to_csv('val_9.csv')